@@ -0,0 +1,144 @@
+import http.client
+import json
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.database import EXERCISES
+
+
+# shared by the benchmarks: a throwaway sqlite database, servers on it, plain http requests and the seeded workouts
+SERVER_TIMEOUT_SECONDS = 60
+POLL_INTERVAL_SECONDS = 0.01
+REQUEST_TIMEOUT_SECONDS = 60
+
+BENCHMARK_PASSWORD = "benchmark_password"
+# weight and reps, so every set adds volume
+BENCHMARK_EXERCISE_IDS: list[int] = [id for id,exercise in enumerate(EXERCISES, start=1) if exercise["weight"] and exercise["reps"]]
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def is_serving(port: int) -> bool:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+    try:
+        connection.request("GET", "/")
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+
+def get_server_env(database_url: str) -> dict:
+    env: dict = {**os.environ, "DATABASE_URL": database_url}
+    env.setdefault("SECRET_KEY", secrets.token_hex(32))
+    return env
+
+
+def migrate_database(env: dict) -> None:
+    subprocess.run([sys.executable, "-m", "src.migrations"], env=env, check=True, capture_output=True)
+
+
+@contextmanager
+def throwaway_database() -> Iterator[dict]:
+    """Yields the environment of a migrated sqlite database in a temporary directory."""
+    with tempfile.TemporaryDirectory() as directory:
+        env: dict = get_server_env(f"sqlite:///{directory}/database.db")
+        migrate_database(env)
+        yield env
+
+
+def start_server(env: dict) -> tuple[subprocess.Popen, int]:
+    """Starts the app as start_backend.sh does, returns once '/' answers 200."""
+    port: int = get_free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    start: float = time.perf_counter()
+    while not is_serving(port):
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode} before serving")
+        if time.perf_counter() - start > SERVER_TIMEOUT_SECONDS:
+            server.terminate()
+            raise RuntimeError(f"server didn't serve '/' within {SERVER_TIMEOUT_SECONDS}s")
+        time.sleep(POLL_INTERVAL_SECONDS)
+    return server, port
+
+
+@contextmanager
+def serving(env: dict, replicas: int = 1) -> Iterator[list[int]]:
+    """Yields the ports of replicas servers on env's database."""
+    servers: list[subprocess.Popen] = []
+    try:
+        for _ in range(replicas):
+            servers.append(start_server(env))
+        yield [port for _,port in servers]
+    finally:
+        for server,_ in servers:
+            server.terminate()
+            server.wait()
+
+
+def request(port: int, method: str, path: str, token: str = None, body=None, form: dict = None, content_type: str = "application/json") -> tuple[int, str]:
+    headers: dict[str, str] = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    payload: str = None
+    if form is not None:
+        payload = urllib.parse.urlencode(form)
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    elif body is not None:
+        payload = body if isinstance(body, str) else json.dumps(body)
+        headers["Content-Type"] = content_type
+
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT_SECONDS)
+    try:
+        connection.request(method, path, payload, headers)
+        response = connection.getresponse()
+        return response.status, response.read().decode()
+    finally:
+        connection.close()
+
+
+def sign_up(port: int, username: str, password: str = BENCHMARK_PASSWORD) -> str:
+    """Creates the user and returns an access token."""
+    request(port, "POST", "/users/", body={"username": username, "password": password})
+    status, body = request(port, "POST", "/users/token", form={"username": username, "password": password})
+    if status != 200:
+        raise RuntimeError(f"login as {username} returned {status}: {body}")
+    return json.loads(body)["access_token"]
+
+
+def get_benchmark_workout(i: int, entries: int, sets: int) -> dict:
+    """The i-th seeded workout's body, dated over three years, with entries exercises of sets sets each."""
+    return {
+        "name": "Benchmark",
+        "date": 20220101 + (i // 336 % 3) * 10000 + (i // 28 % 12) * 100 + i % 28,
+        "start_time": "10:00:00",
+        "duration": "01:00:00",
+        "exercise_entries": [
+            {
+                "exercise_id": BENCHMARK_EXERCISE_IDS[(i + j) % len(BENCHMARK_EXERCISE_IDS)],
+                "set_entries": [{"weight": 20.0 + k * 2.5, "reps": 5 + k} for k in range(sets)]
+            }
+            for j in range(entries)
+        ]
+    }
+
+
+def get_percentile(times: list[float], percentile: int) -> float:
+    return statistics.quantiles(times, n=100)[percentile - 1] if len(times) > 1 else times[0]
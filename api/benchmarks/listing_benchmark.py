@@ -0,0 +1,127 @@
+import statistics
+import sys
+import time
+from typing import Annotated
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import selectinload
+from sqlalchemy.pool import NullPool
+
+from src.models import *
+from src.schemas.workout import Workout_Create, Workout_Read
+from src.database import get_db, get_read_db
+from src.auth import get_current_active_user
+from src.exercises import resolve_exercises
+from src.routers.workouts import insert_workout
+from src.main import app
+from benchmarks.common import throwaway_database, get_benchmark_workout, BENCHMARK_EXERCISE_IDS
+
+
+# run as 'python -m benchmarks.listing_benchmark' from the api directory, exits 1 when the listings' bodies differ.
+# times the workout listings, built from column rows and serialized once, against the route they replaced,
+# which loaded ORM rows and let FastAPI validate every one against the response_model before serializing it
+BENCHMARK_WORKOUTS = 500
+ENTRIES_PER_WORKOUT = 5
+SETS_PER_ENTRY = 4
+BENCHMARK_RUNS = 7
+BENCHMARKED_ENDPOINTS: list[str] = [
+    "/workouts/me/",
+    "/workouts/me/?limit=100"
+]
+
+BENCHMARK_USERNAME = "listing_benchmark"
+
+validated_app: FastAPI = FastAPI()
+
+
+@validated_app.get("/workouts/me/", response_model=list[Workout_Read], response_model_exclude_none=True)
+async def get_user_workouts_validated(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    limit: Optional[int] = None
+) -> list[Workout_Read]:
+    """GET /workouts/me/ before it was built from column rows, without cursors and summaries."""
+    statement = (
+        select(Workout)
+        .where(Workout.username == current_user.username)
+        .options(
+            selectinload(Workout.exercise_entries)
+            .selectinload(Exercise_Entry.set_entries)
+        )
+    )
+    if limit is None:
+        statement = statement.order_by(Workout.id)
+    else:
+        statement = statement.order_by(Workout.date.desc(), Workout.id.desc()).limit(limit)
+    return (await session.exec(statement)).all()
+
+
+def add_benchmark_data(engine: Engine) -> None:
+    with Session(engine) as session:
+        session.add(UserInDB(username=BENCHMARK_USERNAME, hashed_password=""))
+        session.add(User_Data_Version(username=BENCHMARK_USERNAME))
+        exercises: dict[int, Exercise] = resolve_exercises(session, set(BENCHMARK_EXERCISE_IDS))
+        for i in range(BENCHMARK_WORKOUTS):
+            workout: Workout_Create = Workout_Create(**get_benchmark_workout(i, ENTRIES_PER_WORKOUT, SETS_PER_ENTRY))
+            insert_workout(session, workout, BENCHMARK_USERNAME, exercises)
+        session.commit()
+
+
+def time_endpoint(client: TestClient, endpoint: str) -> tuple[float, bytes]:
+    """Median milliseconds of BENCHMARK_RUNS requests, and the body they returned."""
+    times: list[float] = []
+    for _ in range(BENCHMARK_RUNS):
+        start: float = time.perf_counter()
+        response = client.get(endpoint)
+        times.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{endpoint} returned {response.status_code}: {response.text}")
+    return statistics.median(times), response.content
+
+
+def run_benchmark() -> list[str]:
+    """Returns a line for every endpoint whose two versions answered differently."""
+    mismatches: list[str] = []
+    with throwaway_database() as env:
+        benchmark_engine: Engine = create_engine(env["DATABASE_URL"])
+        add_benchmark_data(benchmark_engine)
+        benchmark_engine.dispose()
+
+        # unpooled, each request runs on its own event loop and a connection can't outlive it
+        benchmark_async_engine: AsyncEngine = create_async_engine(
+            make_url(env["DATABASE_URL"]).set(drivername="sqlite+aiosqlite"),
+            poolclass=NullPool
+        )
+
+        async def get_benchmark_db():
+            async with AsyncSession(benchmark_async_engine, expire_on_commit=False) as session:
+                yield session
+
+        for served_app in [app, validated_app]:
+            served_app.dependency_overrides[get_db] = get_benchmark_db
+            served_app.dependency_overrides[get_read_db] = get_benchmark_db
+            served_app.dependency_overrides[get_current_active_user] = lambda: User(username=BENCHMARK_USERNAME)
+        try:
+            client: TestClient = TestClient(app)
+            validated_client: TestClient = TestClient(validated_app)
+            for endpoint in BENCHMARKED_ENDPOINTS:
+                ms, body = time_endpoint(client, endpoint)
+                validated_ms, validated_body = time_endpoint(validated_client, endpoint)
+                print(f"GET {endpoint}: validated {validated_ms:.0f} ms, constructed {ms:.0f} ms, {len(body)} bytes")
+                if body != validated_body:
+                    mismatches.append(f"GET {endpoint}: bodies differ")
+        finally:
+            for served_app in [app, validated_app]:
+                served_app.dependency_overrides.clear()
+    return mismatches
+
+
+if __name__ == "__main__":
+    mismatches: list[str] = run_benchmark()
+    for mismatch in mismatches:
+        print(mismatch)
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,77 @@
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.common import throwaway_database, serving, request, sign_up, get_percentile, BENCHMARK_PASSWORD
+
+
+# run as 'python -m benchmarks.login_load' from the api directory, exits 1 when GET /users/me's p99 is over ME_P99_BUDGET_MS
+# or a login fails with anything but the pool's 503. LOGIN_CLIENTS clients log in over and over for LOAD_SECONDS,
+# so argon2 keeps every password hash worker busy, while one client times GET /users/me
+LOGIN_CLIENTS = 50
+LOAD_SECONDS = 20
+IDLE_SAMPLES = 200
+ME_P99_BUDGET_MS = 100
+
+LOAD_USERNAME = "login_load"
+
+
+def time_me(port: int, token: str) -> float:
+    """Milliseconds for one GET /users/me."""
+    start: float = time.perf_counter()
+    status, text = request(port, "GET", "/users/me", token)
+    if status != 200:
+        raise RuntimeError(f"/users/me returned {status}: {text}")
+    return (time.perf_counter() - start) * 1000
+
+
+def run_login_load(port: int) -> tuple[list[float], list[float], dict[int, int], list[str]]:
+    """Returns the GET /users/me times when idle and under the logins, the logins by status and a line per failed one."""
+    token: str = sign_up(port, LOAD_USERNAME)
+    idle: list[float] = [time_me(port, token) for _ in range(IDLE_SAMPLES)]
+
+    logins: dict[int, int] = {}
+    failures: list[str] = []
+    lock: threading.Lock = threading.Lock()
+    deadline: float = time.perf_counter() + LOAD_SECONDS
+
+    def log_in() -> None:
+        while time.perf_counter() < deadline:
+            status, text = request(port, "POST", "/users/token", form={"username": LOAD_USERNAME, "password": BENCHMARK_PASSWORD})
+            with lock:
+                logins[status] = logins.get(status, 0) + 1
+                # 503 is the pool turning away logins past its queue, as designed
+                if status not in [200, 503]:
+                    failures.append(f"login {status}: {text}")
+
+    threads: list[threading.Thread] = [threading.Thread(target=log_in) for _ in range(LOGIN_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    during: list[float] = []
+    while time.perf_counter() < deadline:
+        during.append(time_me(port, token))
+    for thread in threads:
+        thread.join()
+    return idle, during, logins, failures
+
+
+if __name__ == "__main__":
+    with throwaway_database() as env, serving(env) as ports:
+        idle, during, logins, failures = run_login_load(ports[0])
+
+    for failure in sorted(set(failures)):
+        print(failure)
+    print(
+        f"{LOGIN_CLIENTS} clients logging in for {LOAD_SECONDS}s: {logins.get(200, 0) / LOAD_SECONDS:.1f} logins/s, "
+        f"{logins.get(503, 0)} turned away (503), {len(failures)} errors"
+    )
+    for name,times in [("idle", idle), ("during logins", during)]:
+        print(
+            f"/users/me {name}: {len(times)} requests, p50 {statistics.median(times):.1f} ms, "
+            f"p99 {get_percentile(times, 99):.1f} ms, max {max(times):.1f} ms"
+        )
+    slow: bool = get_percentile(during, 99) > ME_P99_BUDGET_MS
+    if slow:
+        print(f"/users/me p99 is over the {ME_P99_BUDGET_MS} ms budget")
+    sys.exit(1 if slow or failures else 0)
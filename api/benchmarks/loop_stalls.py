@@ -0,0 +1,66 @@
+import json
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.common import throwaway_database, serving, request, sign_up, get_benchmark_workout, get_percentile
+
+
+# run as 'python -m benchmarks.loop_stalls' from the api directory, exits 1 when '/' takes longer than STALL_BUDGET_MS.
+# '/' does no work, so how long it takes while one client imports IMPORT_WORKOUTS workouts on a throwaway sqlite
+# database is how long the event loop was kept from serving every other request
+IMPORT_WORKOUTS = 4000
+IMPORT_ENTRIES_PER_WORKOUT = 2
+IMPORT_SETS_PER_ENTRY = 3
+STALL_BUDGET_MS = 100
+IDLE_SAMPLES = 200
+
+
+def time_root(port: int) -> float:
+    """Milliseconds for one GET '/'."""
+    start: float = time.perf_counter()
+    request(port, "GET", "/")
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_stalls(port: int) -> tuple[list[float], list[float], float, str]:
+    """Returns the GET '/' times when idle and during the import, the import's seconds and its response."""
+    idle: list[float] = [time_root(port) for _ in range(IDLE_SAMPLES)]
+
+    token: str = sign_up(port, "loop_stalls")
+    body: str = "\n".join(
+        json.dumps(get_benchmark_workout(i, IMPORT_ENTRIES_PER_WORKOUT, IMPORT_SETS_PER_ENTRY))
+        for i in range(IMPORT_WORKOUTS)
+    )
+    during: list[float] = []
+    done: threading.Event = threading.Event()
+
+    def sample() -> None:
+        while not done.is_set():
+            during.append(time_root(port))
+
+    sampler: threading.Thread = threading.Thread(target=sample)
+    start: float = time.perf_counter()
+    sampler.start()
+    status, text = request(port, "POST", "/workouts/me/import", token, body, content_type="application/x-ndjson")
+    seconds: float = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    return idle, during, seconds, f"{status} {text[:200]}"
+
+
+if __name__ == "__main__":
+    with throwaway_database() as env, serving(env) as ports:
+        idle, during, seconds, response = measure_stalls(ports[0])
+
+    print(f"import of {IMPORT_WORKOUTS} workouts: {seconds:.2f}s, {response}")
+    for name,times in [("idle", idle), ("during import", during)]:
+        print(
+            f"'/' {name}: {len(times)} requests, p50 {statistics.median(times):.1f} ms, "
+            f"p99 {get_percentile(times, 99):.1f} ms, max {max(times):.1f} ms"
+        )
+    stalled: bool = max(during) > STALL_BUDGET_MS
+    if stalled:
+        print(f"'/' took over the {STALL_BUDGET_MS} ms budget")
+    sys.exit(1 if stalled else 0)
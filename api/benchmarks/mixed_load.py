@@ -0,0 +1,105 @@
+import contextlib
+import random
+import sys
+import threading
+import time
+from typing import Iterator
+
+from benchmarks.common import (
+    throwaway_database, serving, request, sign_up, get_server_env, migrate_database, get_benchmark_workout, get_percentile
+)
+
+
+# run as 'python -m benchmarks.mixed_load [DATABASE_URL]' from the api directory, e.g. with an empty postgres database's URL,
+# exits 1 when any request fails. on a throwaway sqlite database without one. LOAD_USERS users get SEEDED_WORKOUTS each,
+# then LOAD_CONNECTIONS clients spread over LOAD_REPLICAS servers send LOAD_MIX requests back to back for LOAD_SECONDS
+LOAD_USERS = 20
+SEEDED_WORKOUTS = 500
+LOAD_CONNECTIONS = 500
+LOAD_REPLICAS = 2
+LOAD_SECONDS = 30
+LOAD_PAGE_LIMIT = 20
+ENTRIES_PER_WORKOUT = 2
+SETS_PER_ENTRY = 3
+LOAD_MIX: dict[str, int] = {"list": 40, "series": 20, "me": 20, "create": 20} # percent of requests
+LOAD_SEED = 7
+
+
+@contextlib.contextmanager
+def load_database(database_url: str = None) -> Iterator[dict]:
+    if database_url is None:
+        with throwaway_database() as env:
+            yield env
+        return
+    env: dict = get_server_env(database_url)
+    migrate_database(env)
+    yield env
+
+
+def seed_users(port: int) -> list[str]:
+    """Signs up LOAD_USERS users with SEEDED_WORKOUTS imported workouts each, returns their tokens."""
+    tokens: list[str] = []
+    for user in range(LOAD_USERS):
+        token: str = sign_up(port, f"mixed_load_{user}")
+        workouts: list[dict] = [get_benchmark_workout(i, ENTRIES_PER_WORKOUT, SETS_PER_ENTRY) for i in range(SEEDED_WORKOUTS)]
+        status, text = request(port, "POST", "/workouts/me/import", token, workouts)
+        if status != 200:
+            raise RuntimeError(f"seeding returned {status}: {text}")
+        tokens.append(token)
+    return tokens
+
+
+def run_mixed_load(ports: list[int], tokens: list[str]) -> tuple[dict[str, list[float]], list[str]]:
+    """Returns the milliseconds of every successful request by kind, and a line per failed one."""
+    times: dict[str, list[float]] = {kind: [] for kind in LOAD_MIX}
+    failures: list[str] = []
+    lock: threading.Lock = threading.Lock()
+    deadline: float = time.perf_counter() + LOAD_SECONDS
+
+    def load(client: int) -> None:
+        rng: random.Random = random.Random(LOAD_SEED + client)
+        token: str = tokens[client % len(tokens)]
+        port: int = ports[client % len(ports)]
+        i: int = SEEDED_WORKOUTS
+        while time.perf_counter() < deadline:
+            kind: str = rng.choices(list(LOAD_MIX), weights=list(LOAD_MIX.values()))[0]
+            start: float = time.perf_counter()
+            if kind == "list":
+                status, text = request(port, "GET", f"/workouts/me/?limit={LOAD_PAGE_LIMIT}", token)
+            elif kind == "series":
+                status, text = request(port, "GET", "/workouts/me/stats/series?start_date=20220101&end_date=20241231&bucket=month", token)
+            elif kind == "me":
+                status, text = request(port, "GET", "/users/me", token)
+            else:
+                status, text = request(port, "POST", "/workouts/me/", token, get_benchmark_workout(i, ENTRIES_PER_WORKOUT, SETS_PER_ENTRY))
+                i += 1
+            milliseconds: float = (time.perf_counter() - start) * 1000
+            with lock:
+                if status < 300:
+                    times[kind].append(milliseconds)
+                else:
+                    failures.append(f"{kind} {status}: {text}")
+
+    threads: list[threading.Thread] = [threading.Thread(target=load, args=(client,)) for client in range(LOAD_CONNECTIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return times, failures
+
+
+if __name__ == "__main__":
+    database_url: str = sys.argv[1] if len(sys.argv) > 1 else None
+    with load_database(database_url) as env, serving(env, LOAD_REPLICAS) as ports:
+        tokens: list[str] = seed_users(ports[0])
+        times, failures = run_mixed_load(ports, tokens)
+
+    for failure,count in sorted({failure: failures.count(failure) for failure in failures}.items()):
+        print(f"{count}x {failure}")
+    for kind,kind_times in times.items():
+        print(
+            f"{kind}: {len(kind_times) / LOAD_SECONDS:.1f}/s, p50 {get_percentile(kind_times, 50):.0f} ms, "
+            f"p99 {get_percentile(kind_times, 99):.0f} ms" if kind_times else f"{kind}: none succeeded"
+        )
+    print(f"{LOAD_CONNECTIONS} connections, {LOAD_REPLICAS} replicas: {len(failures)} errors")
+    sys.exit(1 if failures else 0)
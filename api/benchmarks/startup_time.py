@@ -0,0 +1,32 @@
+import statistics
+import sys
+import time
+
+from benchmarks.common import throwaway_database, start_server
+
+
+# run as 'python -m benchmarks.startup_time' from the api directory, exits 1 when the median cold start is over budget.
+# a cold start is a fresh server process, the way a scaled to zero container starts, until '/' first returns 200
+STARTUP_RUNS = 5
+STARTUP_BUDGET_SECONDS = 4.0 # generous, meant to catch an import that slows every start rather than noise
+
+
+def measure_startup(env: dict) -> float:
+    """Returns the seconds from starting a server until '/' answers 200."""
+    start: float = time.perf_counter()
+    server, _ = start_server(env)
+    startup_time: float = time.perf_counter() - start
+    server.terminate()
+    server.wait()
+    return startup_time
+
+
+if __name__ == "__main__":
+    startup_times: list[float] = []
+    with throwaway_database() as env:
+        for _ in range(STARTUP_RUNS):
+            startup_times.append(measure_startup(env))
+            print(f"{startup_times[-1]:.3f}s")
+    median: float = statistics.median(startup_times)
+    print(f"median cold start {median:.3f}s, budget {STARTUP_BUDGET_SECONDS}s")
+    sys.exit(1 if median > STARTUP_BUDGET_SECONDS else 0)
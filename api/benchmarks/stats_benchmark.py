@@ -0,0 +1,132 @@
+import statistics
+import sys
+import time
+
+from src.models import *
+from src.schemas.workout import Workout_Create, Workout_Stats
+from src.database import EXERCISES
+from src.stats import get_stats, get_distributions_by_exercise
+from benchmarks.common import get_benchmark_workout
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# run as 'python -m benchmarks.stats_benchmark' from the api directory, exits 1 when the versions disagree.
+# times get_stats' single pass over synthetic workouts against the multi pass version it replaced and, when numpy is
+# installed (it isn't a dependency), a columnar kernel that first copies the sets into arrays as it would have to
+BENCHMARK_SET_COUNTS: list[int] = [1_000, 10_000, 100_000]
+BENCHMARK_RUNS = 15
+ENTRIES_PER_WORKOUT = 5
+SETS_PER_ENTRY = 5
+
+
+def get_benchmark_exercises() -> dict[int, Exercise]:
+    return {id: Exercise(id=id, **exercise) for id,exercise in enumerate(EXERCISES, start=1)}
+
+
+def get_benchmark_workouts(set_count: int) -> list[Workout_Create]:
+    return [
+        Workout_Create(**get_benchmark_workout(i, ENTRIES_PER_WORKOUT, SETS_PER_ENTRY))
+        for i in range(set_count // (ENTRIES_PER_WORKOUT * SETS_PER_ENTRY))
+    ]
+
+
+def get_stats_multi_pass(workouts: list[Workout_Create], exercises: dict[int, Exercise]) -> Workout_Stats:
+    """get_stats before it was made a single pass: one walk over the sets per total, then one for the distributions."""
+    exercise_sets: dict[int, int] = {}
+    for workout in workouts:
+        for exercise_entry in workout.exercise_entries:
+            exercise_sets[exercise_entry.exercise_id] = exercise_sets.get(exercise_entry.exercise_id, 0) + len(exercise_entry.set_entries)
+
+    return Workout_Stats(
+        workout_count=len(workouts),
+        exercise_count=sum(len(workout.exercise_entries) for workout in workouts),
+        sets=sum(
+            len(exercise_entry.set_entries)
+            for workout in workouts
+            for exercise_entry in workout.exercise_entries
+        ),
+        reps=sum(
+            (set_entry.reps if set_entry.reps is not None else 0)
+            for workout in workouts
+            for exercise_entry in workout.exercise_entries
+            for set_entry in exercise_entry.set_entries
+        ),
+        volume=sum(
+            (set_entry.weight * set_entry.reps if set_entry.weight and set_entry.reps else 0)
+            for workout in workouts
+            for exercise_entry in workout.exercise_entries
+            for set_entry in exercise_entry.set_entries
+        ),
+        distributions=get_distributions_by_exercise(exercises, exercise_sets)
+    )
+
+
+def get_stats_columnar(workouts: list[Workout_Create], exercises: dict[int, Exercise]) -> Workout_Stats:
+    exercise_ids: list[int] = []
+    weights: list[float] = []
+    reps: list[int] = []
+    exercise_count: int = 0
+    for workout in workouts:
+        exercise_count += len(workout.exercise_entries)
+        for exercise_entry in workout.exercise_entries:
+            for set_entry in exercise_entry.set_entries:
+                exercise_ids.append(exercise_entry.exercise_id)
+                weights.append(set_entry.weight or 0.0)
+                reps.append(set_entry.reps or 0)
+
+    exercise_id_array = numpy.array(exercise_ids, dtype=numpy.int64)
+    weight_array = numpy.array(weights, dtype=numpy.float64)
+    rep_array = numpy.array(reps, dtype=numpy.int64)
+    set_counts = numpy.bincount(exercise_id_array)
+    return Workout_Stats(
+        workout_count=len(workouts),
+        exercise_count=exercise_count,
+        sets=len(exercise_ids),
+        reps=int(rep_array.sum()),
+        volume=float((weight_array * rep_array).sum()),
+        distributions=get_distributions_by_exercise(exercises, {
+            int(exercise_id): int(set_counts[exercise_id]) for exercise_id in numpy.flatnonzero(set_counts)
+        })
+    )
+
+
+def time_stats(stats_function, workouts: list[Workout_Create], exercises: dict[int, Exercise]) -> tuple[float, Workout_Stats]:
+    """Median milliseconds of BENCHMARK_RUNS calls, and the stats they returned."""
+    times: list[float] = []
+    for _ in range(BENCHMARK_RUNS):
+        start: float = time.perf_counter()
+        stats: Workout_Stats = stats_function(workouts, exercises)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), stats
+
+
+if __name__ == "__main__":
+    exercises: dict[int, Exercise] = get_benchmark_exercises()
+    versions: dict = {
+        "multi pass": get_stats_multi_pass,
+        "single pass": lambda workouts, exercises: get_stats(None, workouts, exercises=exercises)
+    }
+    if numpy is not None:
+        versions["numpy"] = get_stats_columnar
+    else:
+        print("numpy isn't installed, skipping the columnar kernel")
+
+    mismatches: int = 0
+    for set_count in BENCHMARK_SET_COUNTS:
+        workouts: list[Workout_Create] = get_benchmark_workouts(set_count)
+        results: dict[str, tuple[float, Workout_Stats]] = {
+            name: time_stats(stats_function, workouts, exercises)
+            for name,stats_function in versions.items()
+        }
+        print(f"{set_count} sets: " + ", ".join(f"{name} {ms:.2f} ms" for name,(ms,_) in results.items()))
+
+        expected: dict = results["single pass"][1].model_dump()
+        for name,(_,stats) in results.items():
+            if stats.model_dump() != expected:
+                print(f"{name} disagrees with the single pass at {set_count} sets")
+                mismatches += 1
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,134 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import throwaway_database, serving, request, sign_up, get_benchmark_workout, BENCHMARK_EXERCISE_IDS
+
+
+# run as 'python -m benchmarks.writer_load' from the api directory, exits 1 when a write or read fails.
+# on a throwaway sqlite database, first WRITER_TASKS coroutines submit workout inserts straight to a GroupCommitWriter,
+# reporting how many jobs shared each commit, then LOAD_CREATORS clients create workouts while LOAD_READERS list them
+# for LOAD_SECONDS against each count of LOAD_REPLICAS servers
+WRITER_TASKS = 32
+WRITER_JOBS_PER_TASK = 50
+LOAD_CREATORS = 16
+LOAD_READERS = 16
+LOAD_SECONDS = 20
+LOAD_REPLICAS: list[int] = [1, 2]
+LOAD_PAGE_LIMIT = 20
+ENTRIES_PER_WORKOUT = 2
+SETS_PER_ENTRY = 3
+
+
+def run_writer_load() -> tuple[int, float, list[int], list[str]]:
+    """Returns the jobs run, the seconds they took, the jobs in each commit and a line per failed job.
+    Runs in its own process: the engines are built from DATABASE_URL when src.database is imported."""
+    from sqlmodel import Session
+    from src.models import UserInDB, User_Data_Version, Exercise
+    from src.schemas.workout import Workout_Create
+    from src.database import engine
+    from src.exercises import resolve_exercises
+    from src.routers.workouts import insert_workout
+    from src.writer import GroupCommitWriter
+
+    usernames: list[str] = [f"writer_load_{task}" for task in range(WRITER_TASKS)]
+    # the exercises outlive the session, the jobs read them on the writer's
+    with Session(engine, expire_on_commit=False) as session:
+        for username in usernames:
+            session.add(UserInDB(username=username, hashed_password=""))
+            session.add(User_Data_Version(username=username))
+        exercises: dict[int, Exercise] = resolve_exercises(session, set(BENCHMARK_EXERCISE_IDS))
+        session.commit()
+
+    writer: GroupCommitWriter = GroupCommitWriter(engine)
+    batch_sizes: list[int] = []
+    failures: list[str] = []
+    run_batch = writer.run_batch
+
+    def counted_run_batch(batch: list) -> None:
+        batch_sizes.append(len(batch))
+        run_batch(batch)
+
+    writer.run_batch = counted_run_batch
+
+    async def write(username: str) -> None:
+        for i in range(WRITER_JOBS_PER_TASK):
+            workout: Workout_Create = Workout_Create(**get_benchmark_workout(i, ENTRIES_PER_WORKOUT, SETS_PER_ENTRY))
+            try:
+                await writer.submit(lambda write_session: insert_workout(write_session, workout, username, exercises))
+            except Exception as e:
+                failures.append(f"{username}: {e!r}")
+
+    async def run() -> float:
+        start: float = time.perf_counter()
+        await asyncio.gather(*(write(username) for username in usernames))
+        return time.perf_counter() - start
+
+    seconds: float = asyncio.run(run())
+    return WRITER_TASKS * WRITER_JOBS_PER_TASK, seconds, batch_sizes, failures
+
+
+def run_http_load(ports: list[int], run: int) -> tuple[int, int, list[str]]:
+    """Creates workouts from LOAD_CREATORS clients while LOAD_READERS list them, spread over the servers,
+    returns the writes and reads that succeeded and a line per failed request."""
+    tokens: list[str] = [sign_up(ports[0], f"writer_load_{run}_{i}") for i in range(LOAD_CREATORS)]
+    counts: dict[str, int] = {"writes": 0, "reads": 0}
+    failures: list[str] = []
+    lock: threading.Lock = threading.Lock()
+    deadline: float = time.perf_counter() + LOAD_SECONDS
+
+    def load(kind: str, token: str, port: int) -> None:
+        i: int = 0
+        while time.perf_counter() < deadline:
+            if kind == "writes":
+                status, text = request(port, "POST", "/workouts/me/", token, get_benchmark_workout(i, ENTRIES_PER_WORKOUT, SETS_PER_ENTRY))
+            else:
+                status, text = request(port, "GET", f"/workouts/me/?limit={LOAD_PAGE_LIMIT}", token)
+            with lock:
+                if status < 300:
+                    counts[kind] += 1
+                else:
+                    failures.append(f"{kind} {status}: {text}")
+            i += 1
+
+    threads: list[threading.Thread] = [
+        threading.Thread(target=load, args=(kind, tokens[i % LOAD_CREATORS], ports[i % len(ports)]))
+        for kind,clients in [("writes", LOAD_CREATORS), ("reads", LOAD_READERS)]
+        for i in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["writes"], counts["reads"], failures
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--writer"]:
+        jobs, seconds, batch_sizes, failures = run_writer_load()
+        for failure in failures:
+            print(failure)
+        print(
+            f"writer: {jobs} jobs from {WRITER_TASKS} tasks in {seconds:.2f}s, {jobs / seconds:.0f} jobs/s, "
+            f"{len(batch_sizes)} commits, {jobs / len(batch_sizes):.1f} jobs per commit (max {max(batch_sizes)}), {len(failures)} errors"
+        )
+        sys.exit(1 if failures else 0)
+
+    failed: bool = False
+    with throwaway_database() as env:
+        writer_load = subprocess.run([sys.executable, "-m", "benchmarks.writer_load", "--writer"], env=env)
+        failed = writer_load.returncode != 0
+
+        for run,replicas in enumerate(LOAD_REPLICAS):
+            with serving(env, replicas) as ports:
+                writes, reads, failures = run_http_load(ports, run)
+            for failure in sorted(set(failures)):
+                print(failure)
+            print(
+                f"http, {replicas} replicas: {LOAD_CREATORS} creators {writes / LOAD_SECONDS:.1f} writes/s, "
+                f"{LOAD_READERS} readers {reads / LOAD_SECONDS:.1f} reads/s, {len(failures)} errors"
+            )
+            failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
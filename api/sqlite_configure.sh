@@ -10,13 +10,17 @@ else
 fi
 
 echo "Checking for database..."
-if [ ! -f ./database/database.db ];
+if [ -n "$DATABASE_URL" ];
+then
+	echo "Using DATABASE_URL"
+elif [ ! -f ./database/database.db ];
 then
 	echo "No database found, generating new one..."
-	python3 -m src.database
 else
 	echo "Database found!"
 fi
+echo "Applying migrations and seeding defaults..."
+python3 -m src.migrations
 
 echo "Configuration complete, starting app"
 exec "$@"
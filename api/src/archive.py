@@ -0,0 +1,298 @@
+import datetime
+import os
+import sys
+from typing import Any, Iterator, Optional
+from sqlmodel import Session, select, create_engine
+from sqlalchemy import Column, Index, MetaData, Table, bindparam, exists, text
+
+from src.models import *
+from src.database import (
+    engine, IS_SQLITE, MAX_ARCHIVES,
+    get_archive_schema, get_archive_path, get_archive_file_years, attach_archive
+)
+from src.time import get_date_today, get_year, to_datetime_date, from_datetime_date
+from src.pagination import decode_cursor
+
+
+# run as 'python -m src.archive' (e.g. nightly) to move workouts older than ARCHIVE_AFTER_DAYS into per-year sqlite files
+ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", 365))
+ARCHIVE_BATCH_SIZE = 500 # workouts moved per transaction
+ARCHIVED_TABLES: list[Table] = [Workout.__table__, Exercise_Entry.__table__, Set_Entry.__table__]
+# which rows of each archived table belong to the workouts in :workout_ids, within one schema
+WORKOUT_ROWS: dict[str, str] = {
+    Workout.__tablename__: "id IN :workout_ids",
+    Exercise_Entry.__tablename__: "workout_id IN :workout_ids",
+    Set_Entry.__tablename__: "exercise_entry_id IN (SELECT id FROM {schema}.exercise_entry WHERE workout_id IN :workout_ids)"
+}
+# the hot database's workout table under its attached name, schema_translate_map leaves it where it is
+HOT_WORKOUT: Table = Workout.__table__.to_metadata(MetaData(), schema="main")
+
+
+def get_archive_years(session: Session, username: str, start_date: int = None, end_date: int = None, since_version: int = None) -> list[int]:
+    """Years of the user's history that were archived and that the date range (or a sync since since_version) reaches, newest first."""
+    if not IS_SQLITE:
+        return []
+
+    statement = select(Workout_Archive.year).where(Workout_Archive.username == username)
+    if start_date:
+        statement = statement.where(Workout_Archive.year >= get_year(start_date))
+    if end_date:
+        statement = statement.where(Workout_Archive.year <= get_year(end_date))
+    if since_version is not None:
+        statement = statement.where(Workout_Archive.modified_version > since_version)
+    return session.exec(statement.order_by(Workout_Archive.year.desc())).all()
+
+
+def get_archive_options(session: Session, year: int) -> dict:
+    """Attaches a year's archive and returns execution options running a workout, entry or set query against it."""
+    attach_archive(session.connection(), year)
+    return {"schema_translate_map": {None: get_archive_schema(year)}}
+
+
+def get_workout_sources(session: Session, username: str, start_date: int = None, end_date: int = None, since_version: int = None) -> Iterator[dict]:
+    """Execution options for the hot database, then each archive holding the user's workouts in the range, attached lazily."""
+    yield {}
+    for year in get_archive_years(session, username, start_date, end_date, since_version):
+        yield get_archive_options(session, year)
+
+
+def get_source_filters(execution_options: dict) -> list:
+    """Filters leaving out an archive's leftover copies of workouts that are in the hot database."""
+    if not execution_options:
+        return []
+    return [~exists().where(HOT_WORKOUT.c.id == Workout.id)]
+
+
+def get_workouts_page(session: Session, statement, username: str, limit: Optional[int], cursor: Optional[str]) -> list[tuple[Optional[int], Any]]:
+    """Merges a newest first keyset page from the hot database and the archives it reaches, as (archive year or None, row) pairs."""
+    page: list[tuple[Optional[int], Any]] = [(None, row) for row in session.exec(statement).all()]
+    # a workout is only in an archive as well when a move or restore was interrupted, the hot copy is current
+    hot_ids: set[int] = {row.id for _,row in page}
+
+    for year in get_archive_years(session, username, end_date=decode_cursor(cursor)[0] if cursor else None):
+        # newest year first, once the page is full with workouts dated after the year no older archive can change it
+        if limit is not None and len(page) > limit and get_year(page[-1][1].date) > year:
+            break
+        page.extend(
+            (year, row)
+            for row in session.exec(statement, execution_options=get_archive_options(session, year)).all()
+            if row.id not in hot_ids
+        )
+        page.sort(key=lambda source_row: (source_row[1].date, source_row[1].id), reverse=True)
+        if limit is not None:
+            page = page[:limit + 1]
+    return page
+
+
+def get_page_sources(session: Session, page: list[tuple[Optional[int], Any]]) -> Iterator[tuple[dict, list]]:
+    """Execution options and rows for each database the rows of a get_workouts_page page came from."""
+    rows_by_year: dict[Optional[int], list] = {}
+    for year,row in page:
+        rows_by_year.setdefault(year, []).append(row)
+    for year,rows in rows_by_year.items():
+        yield (get_archive_options(session, year) if year is not None else {}), rows
+
+
+def copy_workouts(session: Session, workout_ids: list[int], source: str, target: str) -> None:
+    """Copies workouts with their exercise and set entries, ids included, between attached schemas ('main' is the hot database)."""
+    for table in ARCHIVED_TABLES:
+        columns: str = ", ".join(column.name for column in table.columns)
+        session.exec(
+            text(
+                f"INSERT INTO {target}.{table.name} ({columns}) "
+                f"SELECT {columns} FROM {source}.{table.name} WHERE {WORKOUT_ROWS[table.name].format(schema=source)}"
+            ).bindparams(bindparam("workout_ids", expanding=True)),
+            params={"workout_ids": workout_ids}
+        )
+
+
+def delete_workouts(session: Session, workout_ids: list[int], schema: str) -> None:
+    # sets first, they're found through their entries
+    for table in reversed(ARCHIVED_TABLES):
+        session.exec(
+            text(f"DELETE FROM {schema}.{table.name} WHERE {WORKOUT_ROWS[table.name].format(schema=schema)}")
+            .bindparams(bindparam("workout_ids", expanding=True)),
+            params={"workout_ids": workout_ids}
+        )
+
+
+def delete_archived_copies(session: Session, workout_id: int, username: str) -> None:
+    """Deletes the archived copies of a workout that's in the hot database, commits when there are any."""
+    for year in get_archive_years(session, username):
+        archived_id: int = session.exec(
+            select(Workout.id).where(Workout.id == workout_id),
+            execution_options=get_archive_options(session, year)
+        ).first()
+        if archived_id is not None:
+            delete_workouts(session, [workout_id], get_archive_schema(year))
+            session.commit()
+
+
+def restore_workout(session: Session, workout_id: int, username: str) -> None:
+    """Moves an archived workout back into the hot database before a write, on a writer session. Commits when it moves it."""
+    if session.exec(select(Workout.id).where(Workout.id == workout_id)).first() is not None:
+        # a copy left by an interrupted move or restore would come back as a duplicate once this write changes the workout
+        delete_archived_copies(session, workout_id, username)
+        return
+
+    for year in get_archive_years(session, username):
+        archived_id: int = session.exec(
+            select(Workout.id)
+            .where(
+                Workout.id == workout_id,
+                Workout.username == username
+            ),
+            execution_options=get_archive_options(session, year)
+        ).first()
+        if archived_id is None:
+            continue
+
+        # separate commits, a crash in between leaves a stale archived copy for the next run to clear, never no workout
+        copy_workouts(session, [workout_id], get_archive_schema(year), "main")
+        session.commit()
+        delete_archived_copies(session, workout_id, username)
+        return
+
+
+def has_archived_exercise_entries(session: Session, username: str, exercise_id: int) -> bool:
+    for year in get_archive_years(session, username):
+        exercise_entry_id: int = session.exec(
+            select(Exercise_Entry.id)
+            .where(Exercise_Entry.exercise_id == exercise_id)
+            .limit(1),
+            execution_options=get_archive_options(session, year)
+        ).first()
+        if exercise_entry_id is not None:
+            return True
+    return False
+
+
+def create_archive(year: int) -> None:
+    """Creates a year's archive file with the archived tables and indexes, without foreign keys."""
+    metadata: MetaData = MetaData()
+    for table in ARCHIVED_TABLES:
+        archive_table: Table = Table(
+            table.name,
+            metadata,
+            *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable) for column in table.columns]
+        )
+        for index in table.indexes:
+            Index(index.name, *[archive_table.c[column.name] for column in index.columns])
+
+    archive_engine = create_engine(f"sqlite:///{get_archive_path(year)}")
+    with archive_engine.connect() as connection:
+        # readers keep reading while a run or a restore writes to it
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    metadata.create_all(archive_engine)
+    archive_engine.dispose()
+
+
+def clear_restored_copies() -> None:
+    """Removes archived copies of workouts that are in the hot database, left by an interrupted run or restore."""
+    with Session(engine) as session:
+        for year in get_archive_file_years():
+            schema: str = get_archive_schema(year)
+            workout_ids: list[int] = session.exec(
+                text(f"SELECT id FROM {schema}.workout WHERE id IN (SELECT id FROM main.workout)")
+            ).scalars().all()
+            if workout_ids:
+                delete_workouts(session, workout_ids, schema)
+        session.commit()
+
+
+def move_workouts(year: int, workout_ids: list[int], before_date: int) -> int:
+    """Moves workouts into a year's archive, skipping any that changed since they were picked. Returns how many moved."""
+    schema: str = get_archive_schema(year)
+    with Session(engine) as session:
+        workout_ids = session.exec(
+            select(Workout.id)
+            .where(
+                Workout.id.in_(workout_ids),
+                Workout.date < before_date
+            )
+        ).all()
+        if not workout_ids:
+            return 0
+        copy_workouts(session, workout_ids, "main", schema)
+        session.commit()
+
+        # separate commits, see restore_workout. a workout written meanwhile stays hot and its copy is dropped
+        moved = session.exec(
+            text(
+                f"SELECT hot.id, hot.username, hot.modified_version FROM main.workout hot "
+                f"JOIN {schema}.workout archived ON archived.id = hot.id "
+                f"WHERE hot.id IN :workout_ids AND hot.modified_version = archived.modified_version"
+            ).bindparams(bindparam("workout_ids", expanding=True)),
+            params={"workout_ids": workout_ids}
+        ).all()
+        moved_ids: set[int] = {workout_id for workout_id,_,_ in moved}
+        delete_workouts(session, [workout_id for workout_id in workout_ids if workout_id not in moved_ids], schema)
+        delete_workouts(session, list(moved_ids), "main")
+
+        for workout_id,username,modified_version in moved:
+            workout_archive: Workout_Archive = session.get(Workout_Archive, {"username": username, "year": year})
+            if not workout_archive:
+                workout_archive = Workout_Archive(username=username, year=year, modified_version=modified_version)
+            workout_archive.modified_version = max(workout_archive.modified_version, modified_version)
+            session.add(workout_archive)
+        session.commit()
+    return len(moved_ids)
+
+
+def prune_archive_catalog() -> None:
+    """Drops catalog rows of users with nothing left in an archive, their workouts were all restored."""
+    with Session(engine) as session:
+        for year in session.exec(select(Workout_Archive.year).distinct()).all():
+            session.exec(
+                text(
+                    f"DELETE FROM workout_archive WHERE year = :year "
+                    f"AND username NOT IN (SELECT username FROM {get_archive_schema(year)}.workout)"
+                ),
+                params={"year": year}
+            )
+        session.commit()
+
+
+def archive_workouts(before_date: int, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Moves every workout dated before before_date into its year's archive, returns how many moved."""
+    if not IS_SQLITE:
+        raise RuntimeError("Archives are sqlite databases, postgres keeps all workouts in one database")
+
+    clear_restored_copies()
+
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Workout.id, Workout.date)
+            .where(
+                Workout.date < before_date,
+                Workout.username != None
+            )
+            .order_by(Workout.id)
+        ).all()
+    workout_ids_by_year: dict[int, list[int]] = {}
+    for workout_id,date in rows:
+        workout_ids_by_year.setdefault(get_year(date), []).append(workout_id)
+
+    archive_years: list[int] = get_archive_file_years()
+    moved: int = 0
+    for year,workout_ids in sorted(workout_ids_by_year.items()):
+        if year not in archive_years:
+            if len(archive_years) >= MAX_ARCHIVES:
+                print(f"Keeping {year} in the hot database, there are already {MAX_ARCHIVES} archives")
+                continue
+            create_archive(year)
+            archive_years.append(year)
+
+        for start in range(0, len(workout_ids), batch_size):
+            moved += move_workouts(year, workout_ids[start:start + batch_size], before_date)
+
+    prune_archive_catalog()
+    return moved
+
+
+if __name__ == "__main__":
+    if not IS_SQLITE:
+        print("Archiving only applies to sqlite databases")
+        sys.exit(1)
+    before_date: int = from_datetime_date(to_datetime_date(get_date_today()) - datetime.timedelta(days=ARCHIVE_AFTER_DAYS))
+    print(f"Archived {archive_workouts(before_date)} workouts dated before {before_date}")
@@ -1,37 +1,94 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Annotated, Optional, List
-from datetime import datetime, timedelta, timezone
-from dotenv import load_dotenv
+from typing import Annotated, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
 import os
+import secrets
+import threading
+import time
 import jwt
 from jwt.exceptions import InvalidTokenError
-from pwdlib import PasswordHash
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.models import *
-from src.database import engine
+from src.database import get_read_db, read_session
+from src import passwords
 
 
-load_dotenv()
-
+# src.database has loaded the .env file already
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     raise RuntimeError("SECRET_KEY not found. Ensure a .env file with SECRET KEY exists")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
-
-password_hash = PasswordHash.recommended()
+PRINCIPAL_CACHE_TTL_SECONDS = 60 # bounds how long another worker process can serve a deleted or disabled user
+PRINCIPAL_CACHE_MAX_SIZE = 1024
+PASSWORD_HASH_WORKERS = 2 # argon2 uses ~64MB per hash in flight
+PASSWORD_HASH_MAX_QUEUE = 32 # hashes waiting for a worker before logins get a 503
+PASSWORD_HASH_NICENESS = 10
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/token") # needs to be the same as 'token' api name found in backend/routers/users.py
 
 
 def verify_password(plain_password: str, hashed_password: str):
-    return password_hash.verify(plain_password, hashed_password)
+    return passwords.verify_password(plain_password, hashed_password)
 
 
 def get_password_hash(password: str):
-    return password_hash.hash(password)
+    return passwords.get_password_hash(password)
+
+
+# argon2 is slow by design, a login burst hashing on the request threadpool stalls every other endpoint,
+# so hashing runs on its own processes and is only awaited by the (async) auth routes
+password_hash_pool: ProcessPoolExecutor = None
+password_hash_pending: int = 0 # only touched from the event loop
+
+
+def get_password_hash_pool() -> ProcessPoolExecutor:
+    global password_hash_pool
+    if password_hash_pool is None:
+        password_hash_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"), # forking a process with running threads isn't safe
+            initializer=passwords.init_worker,
+            initargs=(PASSWORD_HASH_NICENESS,)
+        )
+    return password_hash_pool
+
+
+def shutdown_password_hash_pool() -> None:
+    global password_hash_pool
+    if password_hash_pool is not None:
+        password_hash_pool.shutdown(cancel_futures=True)
+        password_hash_pool = None
+
+
+async def run_password_hash(function, *args):
+    global password_hash_pending
+    if password_hash_pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    password_hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_password_hash_pool(), function, *args)
+    finally:
+        password_hash_pending -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_password_hash(passwords.verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await run_password_hash(passwords.get_password_hash, password)
 
 
 def create_access_token(data: dict) -> str:
@@ -41,7 +98,8 @@ def create_access_token(data: dict) -> str:
 
 
 def create_refresh_token(data: dict) -> str:
-    to_encode: dict = data.copy() # just carries username
+    to_encode: dict = data.copy() # carries username
+    to_encode["jti"] = secrets.token_urlsafe(16) # keeps two logins within the same second from getting the same token
     encoded_jwt: str = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -64,28 +122,74 @@ def verify_refresh_token(token: str):
         raise HTTPException(status_code=401, detail="Could not validate credentials")
 
 
-def get_user(username: str):
-    with Session(engine) as session:
-        statement = (
-            select(UserInDB)
-            .where(UserInDB.username == username)
-        )
-        user: UserInDB = session.exec(statement).first()
-        if user:
-            return user
-        return None
+async def get_user(username: str, session: AsyncSession = None):
+    if session is None:
+        async with read_session() as session:
+            return await get_user(username, session)
+
+    statement = (
+        select(UserInDB)
+        .where(UserInDB.username == username)
+    )
+    user: UserInDB = (await session.exec(statement)).first()
+    if user:
+        return user
+    return None
+
+
+# validated principals by username, least recently used first
+principal_cache: OrderedDict[str, tuple[float, User]] = OrderedDict() # username -> (expires at, principal)
+principal_cache_lock: threading.Lock = threading.Lock()
+principal_cache_epoch: int = 0 # bumped by every invalidation, so a lookup racing one doesn't store what it read
+
+
+def get_cached_principal(username: str) -> tuple[Optional[User], int]:
+    """Returns the cached principal (None on a miss) and the epoch to pass to cache_principal."""
+    with principal_cache_lock:
+        entry: tuple[float, User] = principal_cache.get(username)
+        if entry is None:
+            return None, principal_cache_epoch
 
+        expires_at, principal = entry
+        if expires_at <= time.monotonic():
+            del principal_cache[username]
+            return None, principal_cache_epoch
 
-def authenticate_user(username: str, password: str):
-    user = get_user(username)
+        principal_cache.move_to_end(username)
+        return principal, principal_cache_epoch
+
+
+def cache_principal(username: str, principal: User, epoch: int) -> None:
+    with principal_cache_lock:
+        if epoch != principal_cache_epoch:
+            return
+        principal_cache[username] = (time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS, principal)
+        principal_cache.move_to_end(username)
+        while len(principal_cache) > PRINCIPAL_CACHE_MAX_SIZE:
+            principal_cache.popitem(last=False)
+
+
+def invalidate_principal(username: str) -> None:
+    """Call after committing a delete, disable or any other change to a user."""
+    global principal_cache_epoch
+    with principal_cache_lock:
+        principal_cache_epoch += 1
+        principal_cache.pop(username, None)
+
+
+async def authenticate_user(username: str, password: str, session: AsyncSession = None):
+    user = await get_user(username, session)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    session: Annotated[AsyncSession, Depends(get_read_db)]
+) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -99,13 +203,21 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(username=token_data.username)
+
+    principal, epoch = get_cached_principal(token_data.username)
+    if principal is not None:
+        return principal
+
+    # the request's read session, so a miss on a read route doesn't open a second connection
+    user = await get_user(username=token_data.username, session=session)
     if user is None:
         raise credentials_exception
-    return user
+    principal = User.model_validate(user.model_dump(exclude={"hashed_password"}))
+    cache_principal(token_data.username, principal, epoch)
+    return principal
 
 
-def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]):
+async def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]):
     if current_user.disabled:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
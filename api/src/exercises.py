@@ -0,0 +1,15 @@
+from sqlmodel import Session, select
+
+from src.models import *
+
+
+def resolve_exercises(session: Session, exercise_ids: set[int], defaults_only: bool = False) -> dict[int, Exercise]:
+    """Loads every exercise a request references with one IN query, so validation and insertion share it.
+    Ids that don't resolve are left out of the map, callers decide how to report them."""
+    if not exercise_ids:
+        return {}
+
+    statement = select(Exercise).where(Exercise.id.in_(exercise_ids))
+    if defaults_only:
+        statement = statement.where(Exercise.username == None)
+    return {exercise.id: exercise for exercise in session.exec(statement).all()}
@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+from typing import Optional
+from pydantic import ValidationError
+
+from src.schemas.workout import Workout_Create, Workout_Import_Rejection
+
+
+# one row per set, consecutive rows of the same workout (name, date, start_time, duration, description)
+# form a workout and consecutive rows of the same exercise_id within it form an exercise entry
+CSV_REQUIRED_COLUMNS: list[str] = ["name", "date", "start_time", "duration", "exercise_id"]
+
+
+def parse_workout(row: int, data: dict, rejected: list[Workout_Import_Rejection]) -> Optional[tuple[int, Workout_Create]]:
+    try:
+        return row, Workout_Create.model_validate(data)
+    except ValidationError as e:
+        error: dict = e.errors()[0]
+        location: str = ".".join(str(part) for part in error["loc"])
+        rejected.append(Workout_Import_Rejection(row=row, detail=f"{location}: {error['msg']}" if location else error["msg"]))
+        return None
+
+
+def parse_json(body: str, rejected: list[Workout_Import_Rejection]) -> list[tuple[int, Workout_Create]]:
+    data = json.loads(body)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of workouts")
+
+    workouts: list[tuple[int, Workout_Create]] = []
+    for row,workout_data in enumerate(data, start=1):
+        workout = parse_workout(row, workout_data, rejected)
+        if workout:
+            workouts.append(workout)
+    return workouts
+
+
+def parse_ndjson(body: str, rejected: list[Workout_Import_Rejection]) -> list[tuple[int, Workout_Create]]:
+    workouts: list[tuple[int, Workout_Create]] = []
+    for row,line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            workout_data = json.loads(line)
+        except json.JSONDecodeError:
+            rejected.append(Workout_Import_Rejection(row=row, detail="Invalid JSON"))
+            continue
+
+        workout = parse_workout(row, workout_data, rejected)
+        if workout:
+            workouts.append(workout)
+    return workouts
+
+
+def get_csv_value(row: dict, column: str, to_type: type):
+    value: str = (row.get(column) or "").strip()
+    if value == "":
+        return None
+    return to_type(value)
+
+
+def parse_csv(body: str, rejected: list[Workout_Import_Rejection]) -> list[tuple[int, Workout_Create]]:
+    reader = csv.DictReader(io.StringIO(body))
+    missing: list[str] = [column for column in CSV_REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    # group set rows into workout dicts, remembering the first row of each workout for rejections
+    grouped: list[tuple[int, dict]] = []
+    bad_rows: dict[int, str] = {}
+    workout_key: tuple = None
+    for row_number,row in enumerate(reader, start=2): # row 1 is the header
+        key: tuple = (row["name"], row["date"], row["start_time"], row["duration"], row.get("description") or "")
+        if key != workout_key:
+            workout_key = key
+            grouped.append((row_number, {
+                "name": row["name"],
+                "date": row["date"],
+                "start_time": row["start_time"],
+                "duration": row["duration"],
+                "description": row.get("description") or "",
+                "exercise_entries": []
+            }))
+        first_row, workout_data = grouped[-1]
+
+        try:
+            exercise_id: int = int(row["exercise_id"])
+            set_entry: dict = {
+                "weight": get_csv_value(row, "weight", float),
+                "reps": get_csv_value(row, "reps", int),
+                "time": get_csv_value(row, "time", str)
+            }
+        except ValueError:
+            bad_rows.setdefault(first_row, f"Invalid value on row {row_number}")
+            continue
+
+        exercise_entries: list[dict] = workout_data["exercise_entries"]
+        if not exercise_entries or exercise_entries[-1]["exercise_id"] != exercise_id:
+            exercise_entries.append({
+                "exercise_id": exercise_id,
+                "description": row.get("exercise_description") or "",
+                "set_entries": []
+            })
+        exercise_entries[-1]["set_entries"].append(set_entry)
+
+    workouts: list[tuple[int, Workout_Create]] = []
+    for row,workout_data in grouped:
+        if row in bad_rows:
+            rejected.append(Workout_Import_Rejection(row=row, detail=bad_rows[row]))
+            continue
+        workout = parse_workout(row, workout_data, rejected)
+        if workout:
+            workouts.append(workout)
+    return workouts
+
+
+def parse_workouts(body: str, content_type: str, rejected: list[Workout_Import_Rejection]) -> list[tuple[int, Workout_Create]]:
+    """Parses an import body into (row, workout) pairs, appending anything unparseable to rejected.
+    Raises ValueError when the body as a whole can't be read."""
+    if "ndjson" in content_type:
+        return parse_ndjson(body, rejected)
+    if "csv" in content_type:
+        return parse_csv(body, rejected)
+    if "json" in content_type:
+        return parse_json(body, rejected)
+    raise ValueError("Content-Type must be application/json, application/x-ndjson or text/csv")
@@ -1,15 +1,33 @@
+from contextlib import asynccontextmanager
+import asyncio
+import gc
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
-from src.routers import muscles, users, exercises, workouts, templates
+from src.auth import shutdown_password_hash_pool
+from src.refresh_tokens import sweep_refresh_tokens
+from src.routers import muscles, users, exercises, workouts, templates, sync
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the modules and app loaded so far live as long as the process. a full collection would walk them all again,
+    # and every thread, the event loop's included, waits for it
+    gc.freeze()
+    refresh_sweeper = asyncio.create_task(sweep_refresh_tokens())
+    yield
+    refresh_sweeper.cancel()
+    shutdown_password_hash_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(users.router)
 app.include_router(exercises.router)
 app.include_router(muscles.router)
 app.include_router(workouts.router)
 app.include_router(templates.router)
+app.include_router(sync.router)
 
 origins = [
     "http://localhost:3000",
@@ -22,14 +40,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
 @app.get("/")
-def root_message() -> dict:
+async def root_message() -> dict:
     return {"message": "Hello World!"}
 
 
 @app.get("/favicon.ico")
-def root_icon() -> FileResponse:
+async def root_icon() -> FileResponse:
     return FileResponse("backend/favicon.ico")
\ No newline at end of file
@@ -0,0 +1,136 @@
+from typing import Callable
+from sqlmodel import Session, SQLModel, select
+from sqlalchemy import inspect, insert
+
+from src.models import *
+from src.database import engine, init_database, IS_SQLITE
+
+
+def upgrade_untracked_database() -> None:
+    """Runs whichever of the older backfills a database from before migrations were tracked still needs."""
+    # imported here, only old databases need them and they pull in fastapi, which a container's start runs this without
+    from src.sync import add_sync_columns
+    from src.refresh_tokens import migrate_refresh_store
+    from src.rollups import rebuild_rollups
+    from src.records import rebuild_records
+
+    inspector = inspect(engine)
+    tables: list[str] = inspector.get_table_names()
+    # decided up front, the first backfill's create_all adds every missing table
+    needs_sync: bool = Tombstone.__tablename__ not in tables
+    needs_refresh_store: bool = (
+        RefreshStore.__tablename__ in tables
+        and "token_digest" not in [column["name"] for column in inspector.get_columns(RefreshStore.__tablename__)]
+    )
+    needs_rollups: bool = Stats_Rollup.__tablename__ not in tables
+    needs_records: bool = Personal_Record.__tablename__ not in tables
+
+    if needs_sync:
+        add_sync_columns()
+    if needs_refresh_store:
+        migrate_refresh_store()
+    SQLModel.metadata.create_all(engine)
+    if needs_rollups:
+        rebuild_rollups()
+    if needs_records:
+        rebuild_records()
+
+
+def create_model_indexes() -> None:
+    # create_all only builds indexes along with new tables
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def use_autoincrement_ids() -> None:
+    """Rebuilds the workout, exercise entry and set entry tables with AUTOINCREMENT ids. Otherwise sqlite hands out
+    the highest id again once its row is gone, and an archived row's id must stay its own (see src/archive.py)."""
+    if not IS_SQLITE:
+        return # postgres sequences never go back
+
+    with engine.connect() as connection:
+        # dropping the old tables would cascade into their entries, and the pragma can't change inside a transaction
+        connection.connection.dbapi_connection.execute("PRAGMA foreign_keys=OFF")
+        with connection.begin():
+            # parents first, a rename repoints the child's foreign key at the old table until the child is rebuilt too
+            for table in [Workout.__table__, Exercise_Entry.__table__, Set_Entry.__table__]:
+                columns: str = ", ".join(column.name for column in table.columns)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {table.name}_old")
+                # the old table's indexes keep their names
+                index_names: list[str] = connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (f"{table.name}_old",)
+                ).scalars().all()
+                for index_name in index_names:
+                    connection.exec_driver_sql(f"DROP INDEX {index_name}")
+                table.create(connection)
+                connection.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old")
+                connection.exec_driver_sql(f"DROP TABLE {table.name}_old")
+        connection.connection.dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+def create_archive_catalog() -> None:
+    Workout_Archive.__table__.create(engine, checkfirst=True)
+
+
+def add_user_data_versions() -> None:
+    """Gives users from before signup added their User_Data_Version row one, bump_data_version only updates it."""
+    with Session(engine) as session:
+        session.exec(
+            insert(User_Data_Version)
+            .from_select(
+                ["username"],
+                select(UserInDB.username)
+                .where(UserInDB.username.not_in(select(User_Data_Version.username)))
+            )
+        )
+        session.commit()
+
+
+# append only, a migration runs once per database and must also cope with a schema create_all already built
+MIGRATIONS: list[tuple[int, str, Callable[[], None]]] = [
+    (1, "backfills from before migrations were tracked", upgrade_untracked_database),
+    (2, "indexes on (username, date), user columns and foreign keys", create_model_indexes),
+    (3, "AUTOINCREMENT ids for workouts, exercise entries and set entries", use_autoincrement_ids),
+    (4, "workout archive catalog", create_archive_catalog),
+    (5, "data version rows for users from before signup added them", add_user_data_versions),
+]
+
+
+def get_schema_version(session: Session) -> int:
+    versions: list[int] = session.exec(select(Schema_Migration.version)).all()
+    return max(versions, default=0)
+
+
+def apply_migrations() -> list[int]:
+    """Brings the database up to the latest migration, returns the versions applied.
+    A new database gets the current schema from create_all and is marked as fully migrated."""
+    new_database: bool = not inspect(engine).get_table_names()
+    if new_database:
+        SQLModel.metadata.create_all(engine)
+    else:
+        Schema_Migration.__table__.create(engine, checkfirst=True)
+
+    with Session(engine) as session:
+        schema_version: int = get_schema_version(session)
+
+    applied: list[int] = []
+    for version,name,migrate in MIGRATIONS:
+        if version <= schema_version:
+            continue
+        # migrations open their own connections, no session may be held meanwhile (the writer pool has one)
+        if not new_database:
+            print(f"Applying migration {version}: {name}")
+            migrate()
+        with Session(engine) as session:
+            session.add(Schema_Migration(version=version, name=name))
+            session.commit()
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    apply_migrations()
+    # seeded here too, so a starting container runs one interpreter before the app instead of two
+    init_database()
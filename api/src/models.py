@@ -1,5 +1,5 @@
 from typing import List, Optional
-from sqlmodel import SQLModel, Field, Relationship, Column, JSON
+from sqlmodel import SQLModel, Field, Relationship, Column, JSON, Index
 
 
 class AccessToken(SQLModel):
@@ -13,8 +13,10 @@ class RefreshToken(SQLModel):
 
 
 class RefreshStore(SQLModel, table=True):
-    refresh_token: str = Field(primary_key=True)
-    exp: int
+    __table_args__ = (Index("ix_refreshstore_username_exp", "username", "exp"),)
+
+    token_digest: bytes = Field(primary_key=True) # sha256 of the refresh token, the token itself isn't stored
+    exp: int = Field(index=True) # unix seconds, for the expired token sweep
     username: str
 
 
@@ -54,6 +56,26 @@ class UsernameResponse(SQLModel):
     username: str
 
 
+class User_Data_Version(SQLModel, table=True):
+    username: str = Field(primary_key=True)
+    version: int = Field(default=0) # bumped by every change to the user's workouts, templates or exercises
+
+
+class Schema_Migration(SQLModel, table=True):
+    version: int = Field(primary_key=True) # see MIGRATIONS in src/migrations.py
+    name: str
+
+
+class Tombstone(SQLModel, table=True):
+    # left behind by deleted workouts, templates and exercises so sync can report the deletion
+    __table_args__ = (Index("ix_tombstone_username_version", "username", "version"),)
+
+    username: str = Field(primary_key=True)
+    kind: str = Field(primary_key=True) # 'workout', 'template' or 'exercise'
+    row_id: int = Field(primary_key=True)
+    version: int # owner's data version when the row was deleted
+
+
 class Muscle(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
@@ -63,7 +85,7 @@ class Exercise(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
 
     name: str
-    username: Optional[str] = Field(default=None)
+    username: Optional[str] = Field(default=None, index=True)
     primary_muscles: List[str] = Field(sa_column=Column(JSON))
     secondary_muscles: Optional[List[str]] = Field(default=[], sa_column=Column(JSON))
     description: Optional[str] = ""
@@ -72,11 +94,21 @@ class Exercise(SQLModel, table=True):
     reps: bool = Field(default=False)
     time: bool = Field(default=False)
 
+    modified_version: int = Field(default=0) # owner's data version at the last change, for sync
+
     exercise_entries: list["Exercise_Entry"] = Relationship(back_populates="exercise")
     exercise_templates: list["Exercise_Template"] =Relationship(back_populates="exercise")
 
 
 class Workout(SQLModel, table=True):
+    # (username, date) serves listings, date ranges and stats, (username, modified_version) serves sync.
+    # sqlite's AUTOINCREMENT never hands out an id again, not even one that was archived (see src/archive.py)
+    __table_args__ = (
+        Index("ix_workout_username_date", "username", "date"),
+        Index("ix_workout_username_modified_version", "username", "modified_version"),
+        {"sqlite_autoincrement": True}
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     username: Optional[str] = Field(default=None)
@@ -86,6 +118,7 @@ class Workout(SQLModel, table=True):
     duration: str # 'HH:MM:SS', duration of workout
     
     stats: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    modified_version: int = Field(default=0) # owner's data version at the last change, for sync
     
     exercise_entries: List["Exercise_Entry"] = Relationship(
         back_populates="workout",
@@ -94,8 +127,11 @@ class Workout(SQLModel, table=True):
 
 
 class Exercise_Entry(SQLModel, table=True):
+    # serves per exercise history: find the workouts an exercise was logged in without scanning every entry
+    __table_args__ = (Index("ix_exercise_entry_exercise_id_workout_id", "exercise_id", "workout_id"), {"sqlite_autoincrement": True})
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    workout_id: int = Field(foreign_key="workout.id", ondelete="CASCADE")
+    workout_id: int = Field(foreign_key="workout.id", ondelete="CASCADE", index=True)
     exercise_id: int = Field(foreign_key="exercise.id")
 
     exercise_name: Optional[str] = Field(default=None) # todo: how to put name in here (maybe replace with Exercise element instead)
@@ -110,8 +146,10 @@ class Exercise_Entry(SQLModel, table=True):
 
 
 class Set_Entry(SQLModel, table=True):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    exercise_entry_id: int = Field(foreign_key="exercise_entry.id", ondelete="CASCADE")
+    exercise_entry_id: int = Field(foreign_key="exercise_entry.id", ondelete="CASCADE", index=True)
 
     weight: Optional[float] = Field(default=None)
     reps: Optional[int] = Field(default=None)
@@ -123,7 +161,8 @@ class Set_Entry(SQLModel, table=True):
 class Workout_Template(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    username: Optional[str] = Field(default=None)
+    username: Optional[str] = Field(default=None, index=True)
+    modified_version: int = Field(default=0) # owner's data version at the last change, for sync
 
     exercise_templates: List["Exercise_Template"] = Relationship(
         back_populates="workout_template",
@@ -133,8 +172,8 @@ class Workout_Template(SQLModel, table=True):
 
 class Exercise_Template(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    workout_template_id: int = Field(foreign_key="workout_template.id", ondelete="CASCADE")
-    exercise_id: int = Field(foreign_key="exercise.id")
+    workout_template_id: int = Field(foreign_key="workout_template.id", ondelete="CASCADE", index=True)
+    exercise_id: int = Field(foreign_key="exercise.id", index=True)
 
     exercise_name: Optional[str] = Field(default="") # todo: how to put name in here (maybe replace with Exercise element instead)
     routine_note: Optional[str] = Field(default="")
@@ -149,11 +188,49 @@ class Exercise_Template(SQLModel, table=True):
 
 class Set_Template(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    exercise_template_id: int = Field(foreign_key="exercise_template.id", ondelete="CASCADE")
+    exercise_template_id: int = Field(foreign_key="exercise_template.id", ondelete="CASCADE", index=True)
 
     reps: Optional[int] = Field(default=None)
     rep_range_start: Optional[int] = Field(default=None)
     rep_range_end: Optional[int] = Field(default=None)
     time: Optional[str] = Field(default=None) # 'HH:MM:SS'
 
-    exercise_template: Exercise_Template = Relationship(back_populates="set_templates")
\ No newline at end of file
+    exercise_template: Exercise_Template = Relationship(back_populates="set_templates")
+
+
+class Stats_Rollup(SQLModel, table=True):
+    username: str = Field(primary_key=True)
+    period: str = Field(primary_key=True) # 'day', 'week', 'month' or 'year'
+    bucket: int = Field(primary_key=True) # 'YYYYMMDD', first day of the period
+
+    workout_count: int = Field(default=0)
+    exercise_count: int = Field(default=0)
+    sets: int = Field(default=0)
+    reps: int = Field(default=0)
+    volume: float = Field(default=0.0)
+    set_distribution: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+
+
+class Personal_Record(SQLModel, table=True):
+    username: str = Field(primary_key=True)
+    exercise_id: int = Field(primary_key=True, foreign_key="exercise.id")
+
+    # each record keeps the id of the set holding it, so removing that set knows to recompute the record
+    weight: Optional[float] = Field(default=None)
+    weight_set_id: Optional[int] = Field(default=None)
+    reps: Optional[int] = Field(default=None)
+    reps_set_id: Optional[int] = Field(default=None)
+    estimated_1rm: Optional[float] = Field(default=None)
+    estimated_1rm_set_id: Optional[int] = Field(default=None)
+    volume: Optional[float] = Field(default=None)
+    volume_set_id: Optional[int] = Field(default=None)
+    time: Optional[str] = Field(default=None) # 'HH:MM:SS'
+    time_set_id: Optional[int] = Field(default=None)
+
+
+class Workout_Archive(SQLModel, table=True):
+    # one row per year of a user's history that src/archive.py moved out of the hot database,
+    # so a read only attaches the archives its range reaches into
+    username: str = Field(primary_key=True)
+    year: int = Field(primary_key=True) # the workouts dated in it are in 'archive_YYYY.db'
+    modified_version: int = Field(default=0) # highest modified_version among them, for sync
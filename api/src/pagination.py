@@ -0,0 +1,29 @@
+from fastapi import HTTPException
+
+from src.models import Workout
+
+
+def encode_cursor(date: int, id: int) -> str:
+    return f"{date}:{id}"
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        date, id = cursor.split(":")
+        return int(date), int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def validate_limit(limit: int, max_limit: int = 100) -> None:
+    if limit <= 0 or limit > max_limit:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {max_limit}")
+
+
+def get_workouts_before_cursor(cursor: str):
+    """Keyset filter for workouts ordered newest first by (date, id)."""
+    cursor_date, cursor_id = decode_cursor(cursor)
+    return (
+        (Workout.date < cursor_date) |
+        ((Workout.date == cursor_date) & (Workout.id < cursor_id))
+    )
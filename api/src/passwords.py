@@ -0,0 +1,28 @@
+import os
+
+
+# kept apart from src.auth so the hashing worker processes only import pwdlib.
+# the app process only hands these functions to the workers, so pwdlib (and argon2 with it)
+# is imported and the hasher built on first use, in a worker
+password_hash = None
+
+
+def get_password_hasher():
+    global password_hash
+    if password_hash is None:
+        from pwdlib import PasswordHash
+        password_hash = PasswordHash.recommended()
+    return password_hash
+
+
+def init_worker(niceness: int) -> None:
+    # hashing yields the cpu to request handling when they compete
+    os.nice(niceness)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return get_password_hasher().verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    return get_password_hasher().hash(password)
@@ -0,0 +1,162 @@
+from typing import Union
+from sqlmodel import Session, SQLModel, select, delete
+
+from src.models import *
+from src.database import engine
+from src.archive import get_workout_sources, get_archive_options
+
+
+RECORDS: list[str] = ["weight", "reps", "estimated_1rm", "volume", "time"]
+
+
+def get_estimated_1rm(weight: float, reps: int) -> Optional[float]:
+    if not weight or not reps:
+        return None
+    if reps == 1:
+        return weight
+    # Epley formula
+    return weight * (1 + reps / 30)
+
+
+def get_set_records(weight: float, reps: int, time: str) -> dict[str, Union[float, int, str, None]]:
+    return {
+        "weight": weight or None,
+        "reps": reps or None,
+        "estimated_1rm": get_estimated_1rm(weight, reps),
+        "volume": weight * reps if weight and reps else None,
+        "time": time or None # 'HH:MM:SS' compares correctly as a string
+    }
+
+
+def fold_set_into_record(record: Personal_Record, set_id: int, weight: float, reps: int, time: str) -> bool:
+    changed: bool = False
+    for field,value in get_set_records(weight, reps, time).items():
+        current = getattr(record, field)
+        # strictly greater, so the earliest set keeps a tied record
+        if value is not None and (current is None or value > current):
+            setattr(record, field, value)
+            setattr(record, f"{field}_set_id", set_id)
+            changed = True
+    return changed
+
+
+def apply_set_rows(session: Session, username: str, exercise_sets: dict[int, list[tuple]]) -> None:
+    """Raises records with any new set that beats them, given exercise id -> (set id, weight, reps, time) rows."""
+    records: dict[int, Personal_Record] = {
+        record.exercise_id: record
+        for record in session.exec(
+            select(Personal_Record)
+            .where(
+                Personal_Record.username == username,
+                Personal_Record.exercise_id.in_(exercise_sets)
+            )
+        ).all()
+    } if exercise_sets else {}
+
+    for exercise_id,set_rows in exercise_sets.items():
+        record: Personal_Record = records.get(exercise_id)
+        if not record:
+            record = Personal_Record(username=username, exercise_id=exercise_id)
+
+        changed: bool = False
+        for set_id,weight,reps,time in set_rows:
+            changed = fold_set_into_record(record, set_id, weight, reps, time) or changed
+
+        if changed:
+            session.add(record)
+
+
+def apply_exercise_entries(session: Session, username: str, exercise_entries: list[Exercise_Entry]) -> None:
+    """Raises records with any new set that beats them. Set ids must already be assigned (flushed)."""
+    exercise_sets: dict[int, list[tuple]] = {}
+    for exercise_entry in exercise_entries:
+        exercise_sets.setdefault(exercise_entry.exercise_id, []).extend(
+            (set_entry.id, set_entry.weight, set_entry.reps, set_entry.time)
+            for set_entry in exercise_entry.set_entries
+        )
+    apply_set_rows(session, username, exercise_sets)
+
+
+def rebuild_record(session: Session, username: str, exercise_id: int) -> None:
+    # records count archived workouts too, ids never repeat across databases so folding in id order still works.
+    # the hot database comes first, an archived copy of one of its sets is left over from an interrupted move
+    sets_by_id: dict[int, tuple] = {}
+    for execution_options in get_workout_sources(session, username):
+        for set_row in session.exec(
+            select(Set_Entry.id, Set_Entry.weight, Set_Entry.reps, Set_Entry.time)
+            .join(Exercise_Entry, Exercise_Entry.id == Set_Entry.exercise_entry_id)
+            .join(Workout, Workout.id == Exercise_Entry.workout_id)
+            .where(
+                Workout.username == username,
+                Exercise_Entry.exercise_id == exercise_id
+            )
+            .order_by(Set_Entry.id),
+            execution_options=execution_options
+        ).all():
+            sets_by_id.setdefault(set_row.id, set_row)
+    set_rows: list[tuple] = [sets_by_id[set_id] for set_id in sorted(sets_by_id)]
+
+    record: Personal_Record = session.get(Personal_Record, {"username": username, "exercise_id": exercise_id})
+    if not set_rows:
+        if record:
+            session.delete(record)
+        return
+
+    if not record:
+        record = Personal_Record(username=username, exercise_id=exercise_id)
+    for field in RECORDS:
+        setattr(record, field, None)
+        setattr(record, f"{field}_set_id", None)
+
+    for set_id,weight,reps,time in set_rows:
+        fold_set_into_record(record, set_id, weight, reps, time)
+    session.add(record)
+
+
+def repair_records(session: Session, username: str, removed_sets: dict[int, set[int]]) -> None:
+    """Recomputes the records of every exercise (id -> removed set ids) that lost a record-holding set.
+    The removal must already be flushed."""
+    for exercise_id,removed_set_ids in removed_sets.items():
+        record: Personal_Record = session.get(Personal_Record, {"username": username, "exercise_id": exercise_id})
+        if not record:
+            continue
+
+        holder_ids: set[int] = {getattr(record, f"{field}_set_id") for field in RECORDS}
+        if holder_ids & removed_set_ids:
+            rebuild_record(session, username, exercise_id)
+
+
+def get_workout_set_ids(workout: Workout) -> dict[int, set[int]]:
+    set_ids: dict[int, set[int]] = {}
+    for exercise_entry in workout.exercise_entries:
+        set_ids.setdefault(exercise_entry.exercise_id, set()).update(
+            set_entry.id for set_entry in exercise_entry.set_entries
+        )
+    return set_ids
+
+
+def rebuild_records() -> None:
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.exec(delete(Personal_Record))
+
+        pairs: set[tuple[str, int]] = set()
+        archive_years: list[int] = session.exec(select(Workout_Archive.year).distinct()).all()
+        for execution_options in [{}] + [get_archive_options(session, year) for year in archive_years]:
+            pairs.update(session.exec(
+                select(Workout.username, Exercise_Entry.exercise_id)
+                .select_from(Exercise_Entry)
+                .join(Workout, Workout.id == Exercise_Entry.workout_id)
+                .where(Workout.username != None)
+                .distinct(),
+                execution_options=execution_options
+            ).all())
+        for username,exercise_id in pairs:
+            rebuild_record(session, username, exercise_id)
+
+        session.commit()
+
+
+if __name__ == "__main__":
+    rebuild_records()
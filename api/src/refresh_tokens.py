@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import time
+import jwt
+from sqlmodel import Session, SQLModel, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
+
+from src.models import *
+from src.database import engine, async_engine
+
+
+REFRESH_SWEEP_INTERVAL_SECONDS = 15 * 60
+REFRESH_SWEEP_BATCH_SIZE = 1000 # rows per delete, keeps each write transaction short
+
+
+def get_token_digest(refresh_token: str) -> bytes:
+    return hashlib.sha256(refresh_token.encode()).digest()
+
+
+def add_refresh_token(session: Session, refresh_token: str, exp: int, username: str) -> None:
+    """Does not commit."""
+    session.add(RefreshStore(token_digest=get_token_digest(refresh_token), exp=exp, username=username))
+
+
+async def get_refresh_token(session: AsyncSession, refresh_token: str) -> Optional[RefreshStore]:
+    return await session.get(RefreshStore, get_token_digest(refresh_token))
+
+
+async def delete_user_refresh_tokens(session: AsyncSession, username: str) -> None:
+    """Does not commit."""
+    await session.exec(
+        delete(RefreshStore)
+        .where(RefreshStore.username == username)
+    )
+
+
+async def purge_expired_refresh_tokens(batch_size: int = REFRESH_SWEEP_BATCH_SIZE) -> int:
+    """Deletes expired refresh tokens, committing every batch. Returns the number deleted."""
+    now: int = int(time.time())
+    deleted: int = 0
+    async with AsyncSession(async_engine) as session:
+        while True:
+            expired = (
+                select(RefreshStore.token_digest)
+                .where(RefreshStore.exp < now)
+                .limit(batch_size)
+            )
+            count: int = (await session.exec(
+                delete(RefreshStore)
+                .where(RefreshStore.token_digest.in_(expired))
+            )).rowcount
+            await session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+
+async def sweep_refresh_tokens() -> None:
+    # runs for the app's lifetime, every worker process sweeps but the deletes don't conflict
+    while True:
+        try:
+            await purge_expired_refresh_tokens()
+        except Exception as e:
+            print(e)
+        await asyncio.sleep(REFRESH_SWEEP_INTERVAL_SECONDS)
+
+
+def migrate_refresh_store() -> None:
+    """Rebuilds a refreshstore keyed by the raw token into the digest keyed table, keeping unexpired sessions."""
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE refreshstore RENAME TO refreshstore_old"))
+    SQLModel.metadata.create_all(engine)
+
+    now: int = int(time.time())
+    with Session(engine) as session:
+        rows = session.exec(text("SELECT refresh_token, username FROM refreshstore_old")).all()
+        for refresh_token,username in rows:
+            try:
+                exp: int = jwt.decode(refresh_token, options={"verify_signature": False})["exp"]
+            except (jwt.InvalidTokenError, KeyError):
+                continue
+            if exp >= now:
+                session.merge(RefreshStore(token_digest=get_token_digest(refresh_token), exp=exp, username=username))
+        session.exec(text("DROP TABLE refreshstore_old"))
+        session.commit()
+
@@ -0,0 +1,172 @@
+from sqlmodel import Session, SQLModel, select, delete
+from sqlalchemy.orm import selectinload
+
+from src.models import *
+from src.schemas.workout import Workout_Stats
+from src.time import get_start_of_period
+from src.database import engine
+from src.stats import get_workout_stats, get_stored_workout_stats, get_workouts_exercises, get_distributions_from_sets
+from src.archive import get_workout_sources
+
+
+PERIODS: list[str] = ["day", "week", "month", "year"]
+IN_CHUNK_SIZE: int = 500 # buckets per IN (...)
+
+
+def merge_set_distribution(total: dict, to_add: dict, sign: int) -> dict:
+    merged: dict[str, dict[str, float]] = {muscle: dict(sets) for muscle,sets in (total or {}).items()}
+    for muscle,sets in (to_add or {}).items():
+        if muscle not in merged:
+            merged[muscle] = {"primary": 0.0, "secondary": 0.0}
+        merged[muscle]["primary"] += sign * sets["primary"]
+        merged[muscle]["secondary"] += sign * sets["secondary"]
+    return merged
+
+
+def add_rollup_stats(session: Session, rollup: Stats_Rollup, stats: Workout_Stats, sign: int) -> None:
+    rollup.workout_count += sign * stats.workout_count
+    rollup.exercise_count += sign * stats.exercise_count
+    rollup.sets += sign * stats.sets
+    rollup.reps += sign * stats.reps
+    rollup.volume += sign * stats.volume
+    # reassign instead of mutating so the JSON column is marked dirty
+    rollup.set_distribution = merge_set_distribution(rollup.set_distribution, (stats.distributions or {}).get("set_distribution", {}), sign)
+
+    if rollup.workout_count <= 0:
+        if rollup in session:
+            session.delete(rollup)
+    else:
+        session.add(rollup)
+
+
+def apply_workout_stats(session: Session, username: str, date: int, stats: Workout_Stats, sign: int = 1) -> None:
+    """Adds (sign=1) or removes (sign=-1) a workout's stats from every rollup bucket it falls in.
+    Does not commit, so the change lands in the same transaction as the workout write."""
+    apply_workouts_stats(session, username, [(date, stats)], sign)
+
+
+def get_rollups(session: Session, username: str, keys: list[tuple[str, int]]) -> dict[tuple[str, int], Stats_Rollup]:
+    """The user's stored rollups for (period, bucket) keys, by key."""
+    # period IN and bucket IN rather than a (period, bucket) IN, which sqlite only searches on username
+    periods: list[str] = sorted({period for period,_ in keys})
+    buckets: list[int] = sorted({bucket for _,bucket in keys})
+    wanted: set[tuple[str, int]] = set(keys)
+    rollups: dict[tuple[str, int], Stats_Rollup] = {}
+    for i in range(0, len(buckets), IN_CHUNK_SIZE):
+        rollups.update(
+            ((rollup.period, rollup.bucket), rollup)
+            for rollup in session.exec(
+                select(Stats_Rollup)
+                .where(
+                    Stats_Rollup.username == username,
+                    Stats_Rollup.period.in_(periods),
+                    Stats_Rollup.bucket.in_(buckets[i:i + IN_CHUNK_SIZE])
+                )
+            ).all()
+            if (rollup.period, rollup.bucket) in wanted
+        )
+    return rollups
+
+
+def apply_workouts_stats(session: Session, username: str, workouts_stats: list[tuple[int, Workout_Stats]], sign: int = 1) -> None:
+    """Adds (sign=1) or removes (sign=-1) many (date, stats) from the rollups with one query and one update per bucket. Does not commit."""
+    stats_by_key: dict[tuple[str, int], list[Workout_Stats]] = {}
+    for date,stats in workouts_stats:
+        for period in PERIODS:
+            stats_by_key.setdefault((period, get_start_of_period(period, date)), []).append(stats)
+
+    rollups: dict[tuple[str, int], Stats_Rollup] = get_rollups(session, username, list(stats_by_key))
+    for (period, bucket),bucket_stats in stats_by_key.items():
+        rollup: Stats_Rollup = rollups.get((period, bucket)) or Stats_Rollup(username=username, period=period, bucket=bucket, set_distribution={})
+        add_rollup_stats(session, rollup, combine_workout_stats(bucket_stats) if len(bucket_stats) > 1 else bucket_stats[0], sign)
+
+
+def combine_workout_stats(workouts_stats: list[Workout_Stats]) -> Workout_Stats:
+    """Sums several workouts' stats so a batch can be applied to each rollup bucket once."""
+    combined: Workout_Stats = Workout_Stats(workout_count=0, exercise_count=0, sets=0, reps=0, volume=0, distributions={})
+    set_distribution: dict = {}
+    for stats in workouts_stats:
+        combined.workout_count += stats.workout_count
+        combined.exercise_count += stats.exercise_count
+        combined.sets += stats.sets
+        combined.reps += stats.reps
+        combined.volume += stats.volume
+        set_distribution = merge_set_distribution(set_distribution, (stats.distributions or {}).get("set_distribution", {}), 1)
+    combined.distributions = {"set_distribution": set_distribution}
+    return combined
+
+
+def get_rollup_stats(session: Session, username: str, period: str, date: int) -> Workout_Stats:
+    rollup: Stats_Rollup = session.get(Stats_Rollup, {"username": username, "period": period, "bucket": get_start_of_period(period, date)})
+    if not rollup:
+        return Workout_Stats(
+            workout_count=0,
+            exercise_count=0,
+            sets=0,
+            reps=0,
+            volume=0,
+            distributions=get_distributions_from_sets({})
+        )
+
+    return Workout_Stats(
+        workout_count=rollup.workout_count,
+        exercise_count=rollup.exercise_count,
+        sets=rollup.sets,
+        reps=rollup.reps,
+        volume=rollup.volume,
+        distributions=get_distributions_from_sets(rollup.set_distribution)
+    )
+
+
+def rebuild_rollups() -> None:
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.exec(delete(Stats_Rollup))
+
+        usernames: set[str] = set(session.exec(
+            select(Workout.username)
+            .where(Workout.username != None)
+            .distinct()
+        ).all())
+        # a user may have nothing left in the hot database
+        usernames.update(session.exec(select(Workout_Archive.username)).all())
+
+        for username in usernames:
+            workout_ids: set[int] = set()
+            for execution_options in get_workout_sources(session, username):
+                workouts: list[Workout] = session.exec(
+                    select(Workout)
+                    .where(Workout.username == username)
+                    .options(
+                        selectinload(Workout.exercise_entries)
+                        .selectinload(Exercise_Entry.set_entries)
+                    ),
+                    execution_options=execution_options
+                ).all()
+                exercises: dict[int, Exercise] = get_workouts_exercises(session, workouts)
+
+                workouts_stats: list[tuple[int, Workout_Stats]] = []
+                for workout in workouts:
+                    # the hot database comes first, an archived copy of one of its workouts is left over from an interrupted move
+                    if workout.id in workout_ids:
+                        continue
+                    workout_ids.add(workout.id)
+                    if execution_options:
+                        # archived workouts are read only here, update_exercise_muscles keeps their stored stats current
+                        stats: Workout_Stats = get_stored_workout_stats(session, workout, username, exercises)
+                    else:
+                        stats: Workout_Stats = get_workout_stats(session, workout, username, exercises)
+                        workout.stats = stats.model_dump()
+                    workouts_stats.append((workout.date, stats))
+                apply_workouts_stats(session, username, workouts_stats)
+
+                # keep the identity map from holding every user's history at once
+                session.flush()
+                session.expunge_all()
+
+        session.commit()
+
+
+if __name__ == "__main__":
+    rebuild_rollups()
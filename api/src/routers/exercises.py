@@ -1,59 +1,68 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from typing import Annotated, Optional, List
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import selectinload
 from src.auth import get_current_active_user
 from src.models import *
-from src.database import get_db
+from src.schemas.workout import Exercise_Entry_Read, Exercise_History, Exercise_History_Entry
+from src.database import get_db, get_read_db
+from src.pagination import encode_cursor, get_workouts_before_cursor, validate_limit
+from src.routers.workouts import update_exercise_muscles
+from src.versions import bump_data_version, check_etag
+from src.sync import add_tombstone
+from src.archive import get_workouts_page, get_page_sources, has_archived_exercise_entries
 
 
 router = APIRouter()
 
 
-def muscle_in_db(session: Session, muscle: str) -> bool:
-    return session.exec(
+async def muscle_in_db(session: AsyncSession, muscle: str) -> bool:
+    return (await session.exec(
         select(Muscle)
         .where(Muscle.name == muscle)
-    ).first() is not None
+    )).first() is not None
 
 
 @router.post("/exercises/me/", response_model=Exercise, status_code=status.HTTP_201_CREATED)
-def create_exercise(
+async def create_exercise(
     exercise: Exercise, 
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> Exercise:
-    exercise_in_db: Exercise = session.exec(
+    exercise_in_db: Exercise = (await session.exec(
         select(Exercise)
         .where(Exercise.name == exercise.name and Exercise.username == current_user.username)
-    ).first()
+    )).first()
     if exercise_in_db:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Exercise already exists")
     
     for primary_muscle in exercise.primary_muscles:
-        if not muscle_in_db(session, primary_muscle):
+        if not await muscle_in_db(session, primary_muscle):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Muscle '{primary_muscle}' does not exist")
     if exercise.secondary_muscles is not None:
         for secondary_muscle in exercise.secondary_muscles:
-            if not muscle_in_db(session, secondary_muscle):
+            if not await muscle_in_db(session, secondary_muscle):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Muscle '{secondary_muscle}' does not exist")
     
     exercise.username = current_user.username
+    exercise.modified_version = await session.run_sync(bump_data_version, current_user.username)
     session.add(exercise)
-    session.commit()
-    session.refresh(exercise)
+    await session.commit()
+    await session.refresh(exercise)
 
     return exercise
 
 
-def get_exercises(session: Session, username: str = None) -> list[Exercise]:
+async def get_exercises(session: AsyncSession, username: str = None) -> list[Exercise]:
     results = None
     if username is None:
-        results = session.exec(
+        results = await session.exec(
             select(Exercise)
             .where(Exercise.username == None)
         )
     else:
-        results = session.exec(
+        results = await session.exec(
             select(Exercise)
             .where((Exercise.username == None) | (Exercise.username == username))
         )
@@ -63,18 +72,18 @@ def get_exercises(session: Session, username: str = None) -> list[Exercise]:
     return exercises
 
 
-@router.get("/exercises/me/", response_model=List[Exercise])
-def get_user_exercises(
+@router.get("/exercises/me/", response_model=List[Exercise], dependencies=[Depends(check_etag)])
+async def get_user_exercises(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> list[Exercise]:
-    return get_exercises(session, current_user.username)
+    return await get_exercises(session, current_user.username)
 
 
-def get_exercise(session: Session, exercise_id: int, username: str = None, for_workout: bool = False) -> Exercise:
+async def get_exercise(session: AsyncSession, exercise_id: int, username: str = None, for_workout: bool = False) -> Exercise:
     results = None
     if username is None:
-        results = session.exec(
+        results = await session.exec(
             select(Exercise)
             .where(
                 Exercise.id == exercise_id,
@@ -82,12 +91,12 @@ def get_exercise(session: Session, exercise_id: int, username: str = None, for_w
             )
         )
     elif for_workout:
-        results = session.exec(
+        results = await session.exec(
             select(Exercise)
             .where(Exercise.id == exercise_id)
         )
     else:
-        results = session.exec(
+        results = await session.exec(
             select(Exercise)
             .where(
                 (Exercise.id == exercise_id) &
@@ -102,95 +111,182 @@ def get_exercise(session: Session, exercise_id: int, username: str = None, for_w
     return exercise
 
 
-@router.get("/exercises/me/{exercise_id}", response_model=Exercise)
-def get_user_exercise(
+@router.get("/exercises/me/{exercise_id}", response_model=Exercise, dependencies=[Depends(check_etag)])
+async def get_user_exercise(
     exercise_id: int,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> Exercise:
-    return get_exercise(session, exercise_id, current_user.username)
+    return await get_exercise(session, exercise_id, current_user.username)
+
+
+def get_history_exercise_entries(session: Session, page: list[tuple], exercise_id: int) -> dict[int, list[Exercise_Entry]]:
+    """The exercise's entries in a page of workouts, by workout id, each read from the database its workout is in."""
+    entries_by_workout: dict[int, list[Exercise_Entry]] = {}
+    for execution_options,workout_rows in get_page_sources(session, page):
+        exercise_entries: list[Exercise_Entry] = session.exec(
+            select(Exercise_Entry)
+            .where(
+                Exercise_Entry.exercise_id == exercise_id,
+                Exercise_Entry.workout_id.in_([row.id for row in workout_rows])
+            )
+            .options(selectinload(Exercise_Entry.set_entries))
+            .order_by(Exercise_Entry.id),
+            execution_options=execution_options
+        ).all()
+        for exercise_entry in exercise_entries:
+            entries_by_workout.setdefault(exercise_entry.workout_id, []).append(exercise_entry)
+    return entries_by_workout
+
+
+@router.get("/exercises/me/{exercise_id}/history", response_model=Exercise_History, response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def get_user_exercise_history(
+    exercise_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    response: Response,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Exercise_History:
+    validate_limit(limit)
+    await get_exercise(session, exercise_id, current_user.username, for_workout=True)
+
+    # keyset page over the workouts containing the exercise, newest first, archives included as far as the page reaches;
+    # the next page's cursor is sent back in X-Next-Cursor like the workouts listing's
+    statement = (
+        select(Workout.id, Workout.date, Workout.name)
+        .select_from(Exercise_Entry)
+        .join(Workout, Workout.id == Exercise_Entry.workout_id)
+        .where(
+            Exercise_Entry.exercise_id == exercise_id,
+            Workout.username == current_user.username
+        )
+    )
+    if cursor:
+        statement = statement.where(get_workouts_before_cursor(cursor))
+    page: list[tuple] = await session.run_sync(
+        get_workouts_page,
+        statement
+        .distinct()
+        .order_by(Workout.date.desc(), Workout.id.desc())
+        .limit(limit + 1),
+        current_user.username,
+        limit,
+        cursor
+    )
+
+    if len(page) > limit:
+        page = page[:limit]
+        _,last_row = page[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last_row.date, last_row.id)
+
+    entries_by_workout: dict[int, list[Exercise_Entry]] = await session.run_sync(get_history_exercise_entries, page, exercise_id)
+    workout_rows: list = [row for _,row in page]
+
+    history_entries: list[Exercise_History_Entry] = [
+        Exercise_History_Entry(
+            **Exercise_Entry_Read.from_orm(exercise_entry).model_dump(),
+            workout_id=row.id,
+            workout_name=row.name,
+            date=row.date
+        )
+        for row in workout_rows
+        for exercise_entry in entries_by_workout.get(row.id, [])
+    ]
+
+    return Exercise_History(exercise_entries=history_entries)
 
 
 @router.put("/exercises/me/{exercise_id}", response_model=Exercise)
-def update_exercise(
+async def update_exercise(
     exercise_id: int,
     exercise_to_add: Exercise,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> Exercise:
-    exercise: Exercise = get_exercise(session, exercise_id, current_user.username)
+    exercise: Exercise = await get_exercise(session, exercise_id, current_user.username)
     if not exercise:
         raise HTTPException(status_code = 404, detail = f"Exercise '{exercise.name}' not found")
     
-    for primary_muscle in exercise.primary_muscles:
-        if not muscle_in_db(session, primary_muscle):
+    for primary_muscle in exercise_to_add.primary_muscles:
+        if not await muscle_in_db(session, primary_muscle):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Muscle '{primary_muscle}' does not exist")
-    if exercise.secondary_muscles is not None:
-        for secondary_muscle in exercise.secondary_muscles:
-            if not muscle_in_db(session, secondary_muscle):
+    if exercise_to_add.secondary_muscles is not None:
+        for secondary_muscle in exercise_to_add.secondary_muscles:
+            if not await muscle_in_db(session, secondary_muscle):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Muscle '{secondary_muscle}' does not exist")
 
-    exercise.sqlmodel_update(exercise_to_add.model_dump())
+    if exercise.primary_muscles != exercise_to_add.primary_muscles or exercise.secondary_muscles != exercise_to_add.secondary_muscles:
+        # stored workout stats and rollups depend on the muscle mapping
+        await session.run_sync(update_exercise_muscles, exercise, exercise_to_add.primary_muscles, exercise_to_add.secondary_muscles)
+
+    exercise.modified_version = await session.run_sync(bump_data_version, current_user.username)
+    exercise.sqlmodel_update(exercise_to_add.model_dump(exclude={"id", "username", "modified_version"}))
     
     session.add(exercise)
-    session.commit()
-    session.refresh(exercise)
+    await session.commit()
+    await session.refresh(exercise)
 
     return exercise
 
 
 @router.delete("/exercises/me/{exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_exercise(
+async def delete_exercise(
     exercise_id: int, 
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> None:
-    exercise: Exercise = session.exec(
+    exercise: Exercise = (await session.exec(
         select(Exercise)
         .where(
             Exercise.id == exercise_id,
             Exercise.username == current_user.username
         )
-    ).first()
+    )).first()
     if not exercise:
         raise HTTPException(status_code = 404, detail = f"Exercise not found")
     
     try:
-        workout: Workout = session.exec(
+        version: int = await session.run_sync(bump_data_version, current_user.username)
+        await session.run_sync(add_tombstone, current_user.username, "exercise", exercise_id, version)
+
+        workout: Workout = (await session.exec(
             select(Workout)
             .where(Workout.exercise_entries.any(exercise_id=exercise_id))
-        ).first()
+        )).first()
 
-        if workout:
+        if workout or await session.run_sync(has_archived_exercise_entries, current_user.username, exercise_id):
             exercise.username = "delete"
             session.add(exercise)
         else:
-            session.delete(exercise)
+            await session.delete(exercise)
 
-        workout_template: Workout_Template = session.exec(
+        workout_template: Workout_Template = (await session.exec(
             select(Workout_Template)
             .where(Workout_Template.exercise_templates.any(exercise_id=exercise_id))
-        ).first()
+            .options(selectinload(Workout_Template.exercise_templates))
+        )).first()
         if workout_template:
             for exercise_template in workout_template.exercise_templates:
                 if exercise_template.exercise_id == exercise_id:
-                    session.delete(exercise_template)
+                    await session.delete(exercise_template)
                     workout_template.exercise_templates.remove(exercise_template)
 
+            workout_template.modified_version = version
             session.add(workout_template)
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
-    session.commit()
+    await session.commit()
 
 
 @router.get("/exercises/defaults", response_model=List[Exercise])
-def get_default_exercises(session: Annotated[Session, Depends(get_db)]) -> list[Exercise]:
-    return get_exercises(session)
+async def get_default_exercises(session: Annotated[AsyncSession, Depends(get_read_db)]) -> list[Exercise]:
+    return await get_exercises(session)
 
 
 @router.get("/exercises/defaults/{exercise_id}", response_model=Exercise)
-def get_default_exercise(exercise_id: int, session: Annotated[Session, Depends(get_db)]) -> Exercise:
-    return get_exercise(session, exercise_id)
\ No newline at end of file
+async def get_default_exercise(exercise_id: int, session: Annotated[AsyncSession, Depends(get_read_db)]) -> Exercise:
+    return await get_exercise(session, exercise_id)
\ No newline at end of file
@@ -1,18 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.models import Muscle
-from src.database import get_db
+from src.database import get_read_db
 
 
 router = APIRouter()
 
 
 @router.get("/muscles/defaults", response_model=list[str])
-def get_muscles(session: Session = Depends(get_db)) -> list[str]:
-    muscles: list[Muscle] = session.exec(
+async def get_muscles(session: AsyncSession = Depends(get_read_db)) -> list[str]:
+    muscles: list[Muscle] = (await session.exec(
         select(Muscle)
-    ).all()
+    )).all()
     if muscles is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Muscles Found")
 
@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, Response
+from pydantic import TypeAdapter
+from typing import Annotated, Optional
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from src.models import *
+from src.schemas.sync import Sync_Changes
+from src.schemas.template import Workout_Template_Read
+from src.database import get_read_db
+from src.auth import get_current_active_user
+from src.versions import get_data_version, check_etag
+from src.sync import encode_sync_token, decode_sync_token, get_tombstone_ids
+from src.schemas.workout import Workout_Read
+from src.routers.workouts import WORKOUT_READ_COLUMNS, get_workouts_read_from_rows
+from src.archive import get_workout_sources
+
+
+router = APIRouter()
+
+SYNC_CHANGES_ADAPTER: TypeAdapter = TypeAdapter(Sync_Changes)
+
+
+def get_sync_changes(session: Session, username: str, version: int, since_version: Optional[int]) -> Sync_Changes:
+    full: bool = since_version is None or since_version > version
+    if full:
+        since_version = -1 # rows never changed since sync existed have modified_version 0
+
+    # an archive is only read when it holds a workout changed since, see Workout_Archive.modified_version
+    workouts: list[Workout_Read] = []
+    workout_ids: set[int] = set()
+    for execution_options in get_workout_sources(session, username, since_version=since_version):
+        workout_rows = session.exec(
+            select(*WORKOUT_READ_COLUMNS)
+            .where(
+                Workout.username == username,
+                Workout.modified_version > since_version
+            )
+            .order_by(Workout.id),
+            execution_options=execution_options
+        ).all()
+        # the hot database comes first, see get_user_workouts_by_date
+        workout_rows = [workout_row for workout_row in workout_rows if workout_row.id not in workout_ids]
+        workout_ids.update(workout_row.id for workout_row in workout_rows)
+        workouts.extend(get_workouts_read_from_rows(session, workout_rows, username, execution_options))
+    workouts.sort(key=lambda workout_read: workout_read.id)
+
+    templates: list[Workout_Template] = session.exec(
+        select(Workout_Template)
+        .where(
+            Workout_Template.username == username,
+            Workout_Template.modified_version > since_version
+        )
+        .order_by(Workout_Template.id)
+        .options(
+            selectinload(Workout_Template.exercise_templates)
+            .selectinload(Exercise_Template.set_templates)
+        )
+    ).all()
+
+    exercises: list[Exercise] = session.exec(
+        select(Exercise)
+        .where(
+            Exercise.username == username,
+            Exercise.modified_version > since_version
+        )
+        .order_by(Exercise.id)
+    ).all()
+
+    tombstone_ids: dict[str, list[int]] = get_tombstone_ids(session, username, since_version) if not full else {}
+
+    return Sync_Changes.model_construct(
+        token=encode_sync_token(version),
+        full=full,
+        workouts=workouts,
+        templates=[Workout_Template_Read.model_validate(template) for template in templates],
+        exercises=exercises,
+        deleted_workout_ids=tombstone_ids.get("workout", []),
+        deleted_template_ids=tombstone_ids.get("template", []),
+        deleted_exercise_ids=tombstone_ids.get("exercise", [])
+    )
+
+
+@router.get("/sync", response_model=Sync_Changes, response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def sync(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    response: Response,
+    since: Optional[str] = None
+) -> Sync_Changes:
+    """Workouts, templates and custom exercises changed since the token of an earlier sync, plus the ids of deleted ones.
+    Without a token (or with one from before a database reset) everything is sent and 'full' is set."""
+    version: int = await get_data_version(session, current_user.username)
+    since_version: int = decode_sync_token(since) if since is not None else None
+    changes: Sync_Changes = await session.run_sync(get_sync_changes, current_user.username, version, since_version)
+
+    # workouts are built unvalidated, see get_workouts_read_from_rows
+    return Response(
+        content=SYNC_CHANGES_ADAPTER.dump_json(changes, exclude_none=True),
+        media_type="application/json",
+        headers=response.headers
+    )
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Annotated
-from sqlmodel import Session, select, delete
+from sqlmodel import Session, select, delete, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from src.database import get_db
+from src.database import get_db, get_read_db
 from src.time import is_valid_timestamp
 from src.auth import get_current_active_user
 from src.models import *
 from src.schemas.template import *
-from src.routers.exercises import get_exercise
+from src.exercises import resolve_exercises
+from src.versions import bump_data_version, check_etag
+from src.sync import add_tombstone
 
 
 router = APIRouter()
@@ -33,7 +36,16 @@ def validate_set_template(set_template: Set_Template, exercise: Exercise) -> Non
             raise HTTPException(status_code=400, detail="Set template has incorrectly formatted time field")
 
 
-def validate_workout_template(session: Session, template: Workout_Template_Create) -> None:
+def get_referenced_exercises(session: Session, template: Workout_Template_Create) -> dict[int, Exercise]:
+    # templates are built from default exercises only
+    return resolve_exercises(
+        session,
+        {exercise_template.exercise_id for exercise_template in template.exercise_templates},
+        defaults_only=True
+    )
+
+
+def validate_workout_template(session: Session, template: Workout_Template_Create, exercises: dict[int, Exercise]) -> None:
     if len(template.name) == 0:
         raise HTTPException(status_code=400, detail="Unnamed template")
     
@@ -41,7 +53,9 @@ def validate_workout_template(session: Session, template: Workout_Template_Creat
         raise HTTPException(status_code=400, detail="Template missing exercises")
     
     for exercise_template in template.exercise_templates:
-        exercise: Exercise = get_exercise(session, exercise_template.exercise_id)
+        exercise: Exercise = exercises.get(exercise_template.exercise_id)
+        if not exercise:
+            raise HTTPException(status_code=404, detail="Exercise not found")
 
         if not exercise_template.set_templates:
             raise HTTPException(status_code=400, detail="Empty or null set templates array")
@@ -50,92 +64,108 @@ def validate_workout_template(session: Session, template: Workout_Template_Creat
             validate_set_template(set_template, exercise)
 
 
-def get_new_exercise_templates(session: Session, template_create: Workout_Template_Create, new_template: Workout_Template) -> list[Exercise_Template]:
-    new_exercise_templates: list[Exercise_Template] = []
-
-    for exercise_template_create in template_create.exercise_templates:
-        exercise: Exercise = get_exercise(session, exercise_template_create.exercise_id)
-        if not exercise:
-            raise HTTPException(status_code=404, detail="Exercise not found")
+def insert_exercise_templates(session: Session, template_create: Workout_Template_Create, template_id: int, exercises: dict[int, Exercise]) -> None:
+    """Bulk inserts a template's exercise templates, then all of their set templates, with one executemany each.
+    The template must have no other exercise templates. Does not commit."""
+    session.exec(
+        insert(Exercise_Template),
+        params=[
+            {
+                **exercise_template_create.model_dump(exclude={"set_templates"}),
+                "workout_template_id": template_id,
+                "exercise_name": exercises[exercise_template_create.exercise_id].name
+            }
+            for exercise_template_create in template_create.exercise_templates
+        ]
+    )
+    # rows are inserted in parameter order with increasing ids, reading the ids back in id order pairs them up
+    exercise_template_ids: list[int] = session.exec(
+        select(Exercise_Template.id)
+        .where(Exercise_Template.workout_template_id == template_id)
+        .order_by(Exercise_Template.id)
+    ).all()
 
-        new_exercise_template: Exercise_Template = Exercise_Template(
-            **exercise_template_create.model_dump(exclude={"set_templates"}),
-            exercise_name=exercise.name,
-            workout_template=new_template,
-            exercise=exercise
-        )
-        session.add(new_exercise_template)
+    session.exec(
+        insert(Set_Template),
+        params=[
+            {**set_template_create.model_dump(), "exercise_template_id": exercise_template_id}
+            for exercise_template_create,exercise_template_id in zip(template_create.exercise_templates, exercise_template_ids)
+            for set_template_create in exercise_template_create.set_templates
+        ]
+    )
 
-        new_set_templates: list[Set_Template] = []
-        for set_template_create in exercise_template_create.set_templates:
-            new_set_template: Set_Template = Set_Template(
-                **set_template_create.model_dump(),
-                exercise_template=new_exercise_template
-            )
-            session.add(new_set_template)
 
-            new_set_templates.append(new_set_template)
-        new_exercise_template.set_templates = new_set_templates
+def select_user_templates(username: str):
+    # the read models include every exercise and set template, load them with the templates
+    return (
+        select(Workout_Template)
+        .where(Workout_Template.username == username)
+        .options(
+            selectinload(Workout_Template.exercise_templates)
+            .selectinload(Exercise_Template.set_templates)
+        )
+    )
 
-        new_exercise_templates.append(new_exercise_template)
 
-    return new_exercise_templates
+async def get_user_template_read(session: AsyncSession, template_id: int, username: str) -> Optional[Workout_Template]:
+    return (await session.exec(
+        select_user_templates(username)
+        .where(Workout_Template.id == template_id)
+        .execution_options(populate_existing=True) # reloads a template this session just rewrote
+    )).first()
 
 
 @router.post("/templates/me/", response_model=Workout_Template_Read, response_model_exclude_none=True)
-def create_user_template(
+async def create_user_template(
     template_create: Workout_Template_Create,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> Workout_Template_Read:
-    old_workout_template: Workout_Template = session.exec(
+    old_workout_template: Workout_Template = (await session.exec(
         select(Workout_Template)
         .where(
             Workout_Template.name == template_create.name,
             Workout_Template.username == current_user.username
         )
-    ).first()
+    )).first()
     if old_workout_template:
         raise HTTPException(status_code=400, detail="Template name is currently in use")
 
-    validate_workout_template(session, template_create)
+    exercises: dict[int, Exercise] = await session.run_sync(get_referenced_exercises, template_create)
+    validate_workout_template(session, template_create, exercises)
     
     try:
+        version: int = await session.run_sync(bump_data_version, current_user.username)
         new_template: Workout_Template = Workout_Template(
             **template_create.model_dump(exclude={"exercise_templates"}),
-            username=current_user.username
+            username=current_user.username,
+            modified_version=version
         )
         session.add(new_template)
+        await session.flush() # assigns the template id
 
-        new_exercise_templates: list[Exercise_Template] = get_new_exercise_templates(session, template_create, new_template)
+        await session.run_sync(insert_exercise_templates, template_create, new_template.id, exercises)
 
-        new_template.exercise_templates = new_exercise_templates
-
-        session.commit()
+        await session.commit()
     except HTTPException:
-        session.rollback()
+        await session.rollback()
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(e)
         raise HTTPException(status_code=500, detail="Internal server error")
     
-    return new_template
+    return await get_user_template_read(session, new_template.id, current_user.username)
 
 
-@router.get("/templates/me/", response_model=list[Workout_Template_Read], response_model_exclude_none=True)
-def get_user_templates(
+@router.get("/templates/me/", response_model=list[Workout_Template_Read], response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def get_user_templates(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> list[Workout_Template_Read]:
-    workout_templates: list[Workout_Template] = session.exec(
-        select(Workout_Template)
-        .where(Workout_Template.username == current_user.username)
-        .options(
-            selectinload(Workout_Template.exercise_templates)
-            .selectinload(Exercise_Template.set_templates)
-        )
-    ).all()
+    workout_templates: list[Workout_Template] = (await session.exec(
+        select_user_templates(current_user.username)
+    )).all()
 
     if not workout_templates:
         workout_templates = []
@@ -143,19 +173,13 @@ def get_user_templates(
     return workout_templates
 
 
-@router.get("/templates/me/{template_id}", response_model=Workout_Template_Read, response_model_exclude_none=True)
-def get_user_template(
+@router.get("/templates/me/{template_id}", response_model=Workout_Template_Read, response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def get_user_template(
     template_id: int,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> Workout_Template_Read:
-    workout_template: Workout_Template = session.exec(
-        select(Workout_Template)
-        .where(
-            Workout_Template.id == template_id,
-            Workout_Template.username == current_user.username
-        )
-    ).first()
+    workout_template: Workout_Template = await get_user_template_read(session, template_id, current_user.username)
 
     if not workout_template:
         raise HTTPException(status_code=404, detail="Template not found")
@@ -164,66 +188,70 @@ def get_user_template(
 
 
 @router.put("/templates/me/{template_id}", response_model=Workout_Template_Read, response_model_exclude_none=True)
-def update_user_template(
+async def update_user_template(
     template_id: int,
     template_create: Workout_Template_Create,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> Workout_Template_Read:
-    template: Workout_Template = session.exec(
+    template: Workout_Template = (await session.exec(
         select(Workout_Template)
         .where(
             Workout_Template.id == template_id,
             Workout_Template.username == current_user.username
         )
-    ).first()
+    )).first()
 
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    validate_workout_template(session, template_create)
+    exercises: dict[int, Exercise] = await session.run_sync(get_referenced_exercises, template_create)
+    validate_workout_template(session, template_create, exercises)
 
     try:
-        template.sqlmodel_update(template_create.model_dump())
-        template.exercise_templates.clear()
+        version: int = await session.run_sync(bump_data_version, current_user.username)
+        template.sqlmodel_update(template_create.model_dump(exclude={"exercise_templates"}))
+        template.modified_version = version
 
-        session.exec(
+        # the set templates go with their exercise templates (ON DELETE CASCADE)
+        await session.exec(
             delete(Exercise_Template)
             .where(Exercise_Template.workout_template_id == template.id)
         )
-
-        new_exercise_templates: list[Exercise_Template] = get_new_exercise_templates(session, template_create, template)
-        template.exercise_templates = new_exercise_templates
+        session.expire(template, ["exercise_templates"])
+        await session.run_sync(insert_exercise_templates, template_create, template.id, exercises)
 
         session.add(template)
-        session.commit()
+        await session.commit()
     except HTTPException:
-        session.rollback()
+        await session.rollback()
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(e)
         raise HTTPException(status_code=500, detail="Internal server error")
     
-    return template
+    return await get_user_template_read(session, template_id, current_user.username)
 
 
 @router.delete("/templates/me/{template_id}", status_code=204)
-def delete_user_template(
+async def delete_user_template(
     template_id: int,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> None:
-    template: Workout_Template = session.exec(
+    template: Workout_Template = (await session.exec(
         select(Workout_Template)
         .where(
             Workout_Template.id == template_id,
             Workout_Template.username == current_user.username
         )
-    ).first()
+    )).first()
 
     if not template:
         raise HTTPException(status_code=404, detail="Tempalte not found")
     
-    session.delete(template)
-    session.commit()
\ No newline at end of file
+    await session.delete(template)
+    version: int = await session.run_sync(bump_data_version, current_user.username)
+    await session.run_sync(add_tombstone, current_user.username, "template", template_id, version)
+    await session.commit()
@@ -1,23 +1,27 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Annotated
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import IntegrityError
 
 from src.models import *
-from src.database import get_db
+from src.database import get_db, get_read_db
 from src.auth import *
+from src.refresh_tokens import add_refresh_token, get_refresh_token, delete_user_refresh_tokens
+from src.writer import writer
 
 
 router = APIRouter()
 
 
 @router.post("/users/token")
-def login_for_tokens(
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: Annotated[Session, Depends(get_db)]
+async def login_for_tokens(
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
-    user = authenticate_user(form_data.username, form_data.password)
+    # no request session, a read slot is only held for the lookup and not while the password hashes
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -31,7 +35,7 @@ def login_for_tokens(
             "exp": datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         }
     )
-    refresh_token_exp: int = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token_exp: datetime = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     refresh_token: str = create_refresh_token(
         data={
             "sub": user.username,
@@ -39,33 +43,22 @@ def login_for_tokens(
         }
     )
 
-    results = session.exec(
-        select(RefreshStore)
-        .where(RefreshStore.refresh_token == refresh_token)
+    # logins come in bursts, the group commit writer stores a burst's tokens in one transaction
+    await writer.submit(
+        lambda write_session: add_refresh_token(write_session, refresh_token, int(refresh_token_exp.timestamp()), user.username)
     )
-    refresh_store_entry: RefreshStore = results.first()
-    if refresh_store_entry:
-        raise HTTPException(status_code=500, detail="Internal server error: identical refresh tokens created")
-
-    new_refresh_store_entry: RefreshStore = RefreshStore(refresh_token=refresh_token, exp=refresh_token_exp, username=user.username)
-    session.add(new_refresh_store_entry)
-    session.commit()
 
     return Token(access_token=access_token, refresh_token=refresh_token, token_type="bearer")
 
 
 @router.post("/users/refresh")
-def refresh_access_token(
+async def refresh_access_token(
     refresh_token: RefreshToken,
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> AccessToken:
     username: str = verify_refresh_token(refresh_token.refresh_token)
 
-    results = session.exec(
-        select(RefreshStore)
-        .where(RefreshStore.refresh_token == refresh_token.refresh_token)
-    )
-    if not results.first():
+    if not await get_refresh_token(session, refresh_token.refresh_token):
         raise HTTPException(status_code=404, detail="Refresh token not found")
 
     access_token: str = create_access_token(
@@ -76,47 +69,48 @@ def refresh_access_token(
 
 
 @router.delete("/users/refresh")
-def delete_user_session(
+async def delete_user_session(
     refresh_token: RefreshToken,
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ):
-    results = session.exec(
-        select(RefreshStore)
-        .where(RefreshStore.refresh_token == refresh_token.refresh_token)
-    )
-    refresh_store_entry: RefreshStore = results.first()
+    refresh_store_entry: RefreshStore = await get_refresh_token(session, refresh_token.refresh_token)
     if not refresh_store_entry:
         raise HTTPException(status_code=404, detail="Refresh token not found")
     
-    session.delete(refresh_store_entry)
-    session.commit()
+    await session.delete(refresh_store_entry)
+    await session.commit()
 
 
 @router.delete("/users/me/sessions")
-def delete_user_sessions(
-    session: Annotated[Session, Depends(get_db)],
+async def delete_user_sessions(
+    session: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_active_user)]
 ):
-    results = session.exec(
-        select(RefreshStore)
-        .where(RefreshStore.username == current_user.username)
-    )
-    refresh_store_entry: RefreshStore = results.first()
-    
-    session.delete(refresh_store_entry)
-    session.commit()
+    await delete_user_refresh_tokens(session, current_user.username)
+    await session.commit()
+
+
+async def add_user(session: AsyncSession, user_to_add: UserInDB) -> None:
+    session.add(user_to_add)
+    # created up front so bump_data_version always has a row to lock,
+    # a deleted user's row is kept so the versions (and etags) of a reused username keep counting up
+    if not await session.get(User_Data_Version, user_to_add.username):
+        session.add(User_Data_Version(username=user_to_add.username))
+    try:
+        await session.commit()
+    except IntegrityError:
+        # created by a concurrent request while the password was hashing
+        await session.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"User '{user_to_add.username}' already exists")
 
 
 @router.post("/users/", response_model=UsernameResponse)
-def create_user(
+async def create_user(
     user: CreateUser, 
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_db)]
 ) -> UsernameResponse:
-    results = session.exec(
-        select(UserInDB)
-        .where(UserInDB.username == user.username)
-    )
-    old_user: UserInDB = results.first()
+    # the lookup's own read session, the writer connection isn't taken until the insert so hashing holds neither
+    old_user: UserInDB = await get_user(user.username)
     if old_user:
         message = f"User '{old_user.username}' already exists"
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
@@ -125,10 +119,9 @@ def create_user(
         username=user.username,
         email=user.email,
         full_name=user.full_name,
-        hashed_password=password_hash.hash(user.password)
+        hashed_password=await get_password_hash_async(user.password)
     )
-    session.add(user_to_add)
-    session.commit()
+    await add_user(session, user_to_add)
     return { "username": user.username }
 
 
@@ -140,16 +133,18 @@ async def read_users_me(
 
 
 @router.delete("/users/me", status_code=204)
-def delete_user(
-    session: Annotated[Session, Depends(get_db)],
+async def delete_user(
+    session: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_active_user)]
 ):
-    user: UserInDB = session.exec(
+    user: UserInDB = (await session.exec(
         select(UserInDB)
         .where(UserInDB.username == current_user.username)    
-    ).first()
+    )).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    session.delete(user)
-    session.commit()
\ No newline at end of file
+    await session.delete(user)
+    await delete_user_refresh_tokens(session, current_user.username)
+    await session.commit()
+    invalidate_principal(current_user.username)
\ No newline at end of file
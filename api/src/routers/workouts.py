@@ -1,101 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import Annotated
-from sqlmodel import Session, select, delete
-import datetime
-from sqlalchemy.orm import selectinload
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from typing import Annotated, Union, AsyncIterator, Callable
+from sqlmodel import Session, select, delete, insert, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import selectinload, defer
 
 from src.models import *
 from src.schemas.workout import *
 from src.time import *
-from src.database import get_db
+from src.database import get_db, get_read_db, async_read_engine, engine
+from src.writer import writer
 from src.auth import get_current_active_user
-from src.routers.exercises import get_exercise
-from src.database import MUSCLES
+from src.exercises import resolve_exercises
+from src.stats import get_workout_stats, get_stored_workout_stats, get_workouts_exercises, get_workout_filters, get_stats_by_date, get_stats_series
+from src.rollups import apply_workout_stats, apply_workouts_stats, get_rollup_stats
+from src.records import apply_exercise_entries, apply_set_rows, repair_records, get_workout_set_ids, rebuild_record
+from src.versions import bump_data_version, check_etag
+from src.sync import add_tombstone
+from src.pagination import encode_cursor, get_workouts_before_cursor, validate_limit
+from src.imports import parse_workouts
+from src.archive import get_workout_sources, get_source_filters, get_workouts_page, get_page_sources, get_archive_years, get_archive_options, restore_workout
 
 
 router = APIRouter()
 
 
-def get_distributions(session: Session, workouts: list[Workout], username: str = None) -> dict:
-    set_distribution: dict[str, dict[str, float]] = {}
-    total_muscle_sets: float = 0.0
-
-    for MUSCLE in MUSCLES:
-        set_distribution[MUSCLE] = {
-            "primary": 0.0,
-            "secondary": 0.0
-        }
-
-    for workout in workouts:
-        for exercise_entry in workout.exercise_entries:
-            for_workout: bool = True
-            exercise: Exercise = get_exercise(session, exercise_entry.exercise_id, username, for_workout)
-            
-            for primary_muscle in exercise.primary_muscles:
-                to_add: float = 1.0 * len(exercise_entry.set_entries)
-                set_distribution[primary_muscle]["primary"] += to_add
-                total_muscle_sets += to_add
-            if exercise.secondary_muscles:
-                for secondary_muscle in exercise.secondary_muscles:
-                    to_add: float = 0.5 * len(exercise_entry.set_entries)
-                    set_distribution[secondary_muscle]["secondary"] += to_add
-                    total_muscle_sets += to_add
-    
-    if total_muscle_sets == 0:
-        return {"set_distribution": {}, "muscle_distribution": {}}
-
-    muscle_distribution: dict[str, int] = {}
-    for muscle,sets in set_distribution.items():
-        percentage: int = (int) (100 * (sets["primary"] + sets["secondary"]) / total_muscle_sets)
-        muscle_distribution[muscle] = percentage
-
-    # sort muscle_distribution by percentages
-    muscle_distribution = {m: p for m,p in sorted(muscle_distribution.items(), reverse=True, key=lambda entry: entry[1])}
-    return {
-        "set_distribution": set_distribution,
-        "muscle_distribution": muscle_distribution
-    }
-
-
-def get_stats(session: Session, workouts: list[Workout], username: str = None) -> Workout_Stats:
-    workout_count: int = len(workouts)
-    exercise_count: int = sum(
-        len(workout.exercise_entries) 
-        for workout in workouts
-    )
-    sets: int = sum(
-        len(exercise_entry.set_entries) 
-        for workout in workouts 
-        for exercise_entry in workout.exercise_entries
-    )
-    reps: int = sum(
-        (set_entry.reps if set_entry.reps is not None else 0) 
-        for workout in workouts 
-        for exercise_entry in workout.exercise_entries 
-        for set_entry in exercise_entry.set_entries
-    )
-    volume: float = sum(
-        (set_entry.weight * set_entry.reps if set_entry.weight and set_entry.reps else 0) 
-        for workout in workouts 
-        for exercise_entry in workout.exercise_entries 
-        for set_entry in exercise_entry.set_entries
-    )
-    distributions: dict = get_distributions(session, workouts, username)
-
-    return Workout_Stats(
-        workout_count=workout_count,
-        exercise_count=exercise_count,
-        sets=sets,
-        reps=reps,
-        volume=volume,
-        distributions=distributions
-    )
-
-
-def get_workout_stats(session: Session, workout: Workout, username: str = None) -> Workout_Stats:
-    return get_stats(session, [workout], username)
-
-
 def invalid_set_entry(exercise: Exercise, set_entry: Set_Entry) -> bool:
     return not (
         (exercise.weight != set_entry.weight) or
@@ -104,7 +35,7 @@ def invalid_set_entry(exercise: Exercise, set_entry: Set_Entry) -> bool:
     )
 
 
-def validate_workout(session: Session, workout: Workout) -> None:
+def validate_workout(session: Session, workout: Workout, exercises: dict[int, Exercise] = None) -> None:
     # workout
     if not is_valid_timestamp(workout.date, is_date=True):
         raise HTTPException(status_code=400, detail="Incorrectly formatted date")
@@ -120,11 +51,11 @@ def validate_workout(session: Session, workout: Workout) -> None:
     if len(workout.exercise_entries) == 0:
         raise HTTPException(status_code=400, detail="Empty exercise entries array")
     
+    if exercises is None:
+        exercises = get_referenced_exercises(session, [workout])
+
     for pos,exercise_entry in enumerate(workout.exercise_entries):
-        exercise: Exercise = session.exec(
-            select(Exercise)
-            .where(Exercise.id == exercise_entry.exercise_id)
-        ).first()
+        exercise: Exercise = exercises.get(exercise_entry.exercise_id)
         if not exercise:
             raise HTTPException(status_code=400, detail="Invalid exercise(id) submitted")
 
@@ -139,263 +70,662 @@ def validate_workout(session: Session, workout: Workout) -> None:
                 raise HTTPException(status_code=400, detail="Incorrectly formatted set entry times")
 
 
-def get_new_exercise_entries(session: Session, workout_create: Workout_Create, new_workout: Workout) -> list[Exercise_Entry]:
-    new_exercise_entries: list[Exercise_Entry] = []
-    for exercise_entry_create in workout_create.exercise_entries:
-        exercise: Exercise = session.get(Exercise, exercise_entry_create.exercise_id)
-        if not exercise:
-            raise HTTPException(status_code=404, detail="Exercise not found")
+def get_referenced_exercises(session: Session, workouts: list[Workout_Create]) -> dict[int, Exercise]:
+    return resolve_exercises(session, {
+        exercise_entry.exercise_id
+        for workout in workouts
+        for exercise_entry in workout.exercise_entries
+    })
+
+
+def insert_rows(session: Session, model: type[SQLModel], params: list[dict], *filters) -> list[int]:
+    """Inserts rows with one executemany and returns their ids in parameter order, filters must match only the new rows.
+    Rows are inserted in parameter order with increasing ids, reading the ids back in id order pairs them up
+    (RETURNING only keeps parameter order on sqlite by inserting row by row)."""
+    session.exec(insert(model), params=params)
+    return session.exec(
+        select(model.id)
+        .where(*filters)
+        .order_by(model.id)
+    ).all()
+
+
+def insert_exercise_entries(session: Session, workouts: list[Workout_Create], workout_ids: list[int], exercises: dict[int, Exercise]) -> dict[int, list[tuple]]:
+    """Bulk inserts the workouts' exercise entries, then all of their sets, with one executemany each. Does not commit.
+    The workouts must have no other entries. Returns exercise id -> (set id, weight, reps, time) of the inserted sets,
+    for the personal records."""
+    exercise_entry_ids: list[int] = insert_rows(
+        session,
+        Exercise_Entry,
+        [
+            {
+                **exercise_entry.model_dump(exclude={"set_entries"}),
+                "workout_id": workout_id,
+                "exercise_name": exercises[exercise_entry.exercise_id].name
+            }
+            for workout,workout_id in zip(workouts, workout_ids)
+            for exercise_entry in workout.exercise_entries
+        ],
+        Exercise_Entry.workout_id.in_(workout_ids)
+    )
 
-        new_exercise_entry: Exercise_Entry = Exercise_Entry(
-            **exercise_entry_create.model_dump(exclude={"set_entries"}),
-            exercise_name=exercise.name,
-            workout=new_workout,
-            exercise=exercise
-        )
-        session.add(new_exercise_entry)
+    exercise_entries: list[Exercise_Entry_Create] = [
+        exercise_entry
+        for workout in workouts
+        for exercise_entry in workout.exercise_entries
+    ]
+    set_entry_ids: list[int] = insert_rows(
+        session,
+        Set_Entry,
+        [
+            {**set_entry.model_dump(), "exercise_entry_id": exercise_entry_id}
+            for exercise_entry,exercise_entry_id in zip(exercise_entries, exercise_entry_ids)
+            for set_entry in exercise_entry.set_entries
+        ],
+        Set_Entry.exercise_entry_id.in_(select(Exercise_Entry.id).where(Exercise_Entry.workout_id.in_(workout_ids)))
+    )
 
-        new_set_entries: list[Set_Entry] = []
-        for set_entry_create in exercise_entry_create.set_entries:
-            new_set_entry: Set_Entry = Set_Entry(
-                **set_entry_create.model_dump(), 
-                exercise_entry=new_exercise_entry
+    set_entries: list[tuple[int, Set_Entry_Create]] = [
+        (exercise_entry.exercise_id, set_entry)
+        for exercise_entry in exercise_entries
+        for set_entry in exercise_entry.set_entries
+    ]
+    exercise_sets: dict[int, list[tuple]] = {}
+    for (exercise_id,set_entry),set_entry_id in zip(set_entries, set_entry_ids):
+        exercise_sets.setdefault(exercise_id, []).append((set_entry_id, set_entry.weight, set_entry.reps, set_entry.time))
+    return exercise_sets
+
+
+def update_exercise_muscles(session: Session, exercise: Exercise, primary_muscles: list[str], secondary_muscles: Optional[list[str]]) -> None:
+    """Changes an exercise's muscles and recomputes the stored stats and rollups of every workout that uses it,
+    archived ones included. Must run on a writer session (those attach every archive). Does not commit."""
+    # (archive year or None for the hot database, its execution options, its workouts using the exercise)
+    sources: list[tuple[Optional[int], dict, list[Workout]]] = []
+    for year in [None] + session.exec(select(Workout_Archive.year).distinct()).all():
+        execution_options: dict = get_archive_options(session, year) if year is not None else {}
+        sources.append((year, execution_options, session.exec(
+            select(Workout)
+            .where(
+                Workout.exercise_entries.any(exercise_id=exercise.id),
+                *get_source_filters(execution_options)
             )
-            session.add(new_set_entry)
-            new_set_entries.append(new_set_entry)
-        new_exercise_entry.set_entries = new_set_entries
+            .options(
+                selectinload(Workout.exercise_entries)
+                .selectinload(Exercise_Entry.set_entries)
+            ),
+            execution_options=execution_options
+        ).all()))
+    workouts: list[Workout] = [workout for _,_,source_workouts in sources for workout in source_workouts]
+    exercises: dict[int, Exercise] = get_workouts_exercises(session, workouts)
+    old_stats: dict[int, Workout_Stats] = {
+        workout.id: get_stored_workout_stats(session, workout, workout.username, exercises)
+        for workout in workouts
+    }
 
-        new_exercise_entries.append(new_exercise_entry)
-    return new_exercise_entries
+    versions: dict[str, int] = {
+        username: bump_data_version(session, username)
+        for username in {workout.username for workout in workouts if workout.username}
+    }
+
+    exercise.primary_muscles = primary_muscles
+    exercise.secondary_muscles = secondary_muscles
+    # the map shares the session's instance of the exercise, so it already sees the new muscles
+    exercises[exercise.id] = exercise
+
+    for year,execution_options,source_workouts in sources:
+        for workout in source_workouts:
+            stats: Workout_Stats = get_workout_stats(session, workout, workout.username, exercises)
+            if workout.username:
+                apply_workout_stats(session, workout.username, workout.date, stats)
+                apply_workout_stats(session, workout.username, workout.date, old_stats[workout.id], sign=-1)
+
+            if year is None:
+                workout.stats = stats.model_dump()
+                if workout.username:
+                    workout.modified_version = versions[workout.username]
+                session.add(workout)
+                continue
+
+            # an archived workout's ORM instance would flush into the hot database, its row is updated in the archive
+            values: dict = {"stats": stats.model_dump()}
+            if workout.username:
+                values["modified_version"] = versions[workout.username]
+            session.exec(
+                update(Workout.__table__)
+                .where(Workout.__table__.c.id == workout.id)
+                .values(**values),
+                execution_options=execution_options
+            )
+            if workout.username:
+                # the catalog tells sync which archives hold changed workouts
+                workout_archive: Workout_Archive = session.get(Workout_Archive, {"username": workout.username, "year": year})
+                if workout_archive:
+                    workout_archive.modified_version = versions[workout.username]
+                    session.add(workout_archive)
+
+
+def insert_workout(session: Session, workout: Workout_Create, username: str, exercises: dict[int, Exercise]) -> int:
+    """Write job for the group commit writer, returns the new workout's id."""
+    version: int = bump_data_version(session, username)
+    stats: Workout_Stats = get_workout_stats(session, workout, username, exercises)
+    new_workout: Workout = Workout(
+        **workout.model_dump(exclude={"exercise_entries", "username"}),
+        username=username,
+        stats=stats.model_dump(),
+        modified_version=version
+    )
+    session.add(new_workout)
+    session.flush() # assigns the workout id
+
+    exercise_sets: dict[int, list[tuple]] = insert_exercise_entries(session, [workout], [new_workout.id], exercises)
+    apply_workout_stats(session, username, new_workout.date, stats)
+    apply_set_rows(session, username, exercise_sets)
+    return new_workout.id
 
 
 @router.post("/workouts/me/", response_model=Workout_Read, status_code=status.HTTP_201_CREATED, response_model_exclude_none=True)
-def create_workout(
+async def create_workout(
     workout: Workout_Create, 
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> Workout_Read:
 
-    validate_workout(session, workout)
+    exercises: dict[int, Exercise] = await session.run_sync(get_referenced_exercises, [workout])
+    validate_workout(session, workout, exercises)
+    # hand the read connection back while the write waits its turn, the exercises stay loaded
+    await session.commit()
 
+    # concurrent creates are committed together by the group commit writer
     try:
-        new_workout: Workout = Workout(
-            **workout.model_dump(exclude={"exercise_entries", "username"}),
-            username=current_user.username
+        workout_id: int = await writer.submit(
+            lambda write_session: insert_workout(write_session, workout, current_user.username, exercises)
         )
-        session.add(new_workout)
-
-        new_exercises_entries: list[Exercise_Entry] = get_new_exercise_entries(session, workout, new_workout)
-
-        new_workout.exercise_entries = new_exercises_entries
-
-        session.commit()
     except HTTPException:
-        session.rollback()
         raise
     except Exception as e:
-        session.rollback()
         print(e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-    workout_response: Workout = session.exec(
+    workout_response: Workout = (await session.exec(
         select(Workout)
-        .where(Workout.id == new_workout.id)
+        .where(Workout.id == workout_id)
         .options(
             selectinload(Workout.exercise_entries)
             .selectinload(Exercise_Entry.set_entries)
         )
-    ).first()
+    )).first()
 
     if not workout_response:
         raise HTTPException(status_code=404, detail="Failed to retrieve created workout")
 
-    workout_response.stats = get_workout_stats(session, workout_response, current_user.username)
     return workout_response
 
 
-def get_user_workouts_by_date(session: Session, username: str, start_date: int = None, end_date: int = None) -> list[Workout_Read]:
-    if start_date:
-        if not is_valid_timestamp(start_date, is_date=True):
-            raise HTTPException(status_code=400, detail="Invalid start date")
-    if end_date:
-        if not is_valid_timestamp(end_date, is_date=True):
-            raise HTTPException(status_code=400, detail="Invalid end date")
-    
-    if not start_date and not end_date:
-        statement = (
-            select(Workout)
-            .where(Workout.username == username)
-            .options(
-                selectinload(Workout.exercise_entries)
-                .selectinload(Exercise_Entry.set_entries)
-            )
+IMPORT_BATCH_SIZE: int = 1000 # workouts per transaction
+
+
+def insert_workouts(session: Session, username: str, workouts: list[Workout_Create], exercises: dict[int, Exercise], version: int) -> int:
+    """Bulk inserts validated workouts with one statement per table and applies their rollups. Does not commit."""
+    workouts_stats: list[Workout_Stats] = [get_workout_stats(session, workout, username, exercises) for workout in workouts]
+
+    # the batch's version is new, only its workouts carry it
+    workout_ids: list[int] = insert_rows(
+        session,
+        Workout,
+        [
+            {
+                **workout.model_dump(exclude={"exercise_entries", "username"}),
+                "username": username,
+                "stats": stats.model_dump(),
+                "modified_version": version
+            }
+            for workout,stats in zip(workouts, workouts_stats)
+        ],
+        Workout.username == username,
+        Workout.modified_version == version
+    )
+    # personal records are rebuilt once per exercise after the whole import
+    exercise_sets: dict[int, list[tuple]] = insert_exercise_entries(session, workouts, workout_ids, exercises)
+
+    apply_workouts_stats(session, username, [(workout.date, stats) for workout,stats in zip(workouts, workouts_stats)])
+
+    return sum(len(set_rows) for set_rows in exercise_sets.values())
+
+
+def import_user_workouts(session: Session, username: str, body: str, content_type: str) -> Workout_Import_Result:
+    result: Workout_Import_Result = Workout_Import_Result()
+    try:
+        workouts: list[tuple[int, Workout_Create]] = parse_workouts(body, content_type, result.rejected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    exercises: dict[int, Exercise] = get_referenced_exercises(session, [workout for _,workout in workouts])
+
+    valid: list[tuple[int, Workout_Create]] = []
+    for row,workout in workouts:
+        try:
+            validate_workout(session, workout, exercises)
+            valid.append((row, workout))
+        except HTTPException as e:
+            result.rejected.append(Workout_Import_Rejection(row=row, detail=e.detail))
+
+    imported_exercise_ids: set[int] = set()
+    for start in range(0, len(valid), IMPORT_BATCH_SIZE):
+        batch: list[tuple[int, Workout_Create]] = valid[start:start + IMPORT_BATCH_SIZE]
+        batch_workouts: list[Workout_Create] = [workout for _,workout in batch]
+        try:
+            version: int = bump_data_version(session, username)
+            result.accepted_sets += insert_workouts(session, username, batch_workouts, exercises, version)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(e)
+            result.rejected.extend(Workout_Import_Rejection(row=row, detail="Internal Server Error") for row,_ in batch)
+            continue
+
+        result.accepted += len(batch)
+        imported_exercise_ids.update(
+            exercise_entry.exercise_id
+            for workout in batch_workouts
+            for exercise_entry in workout.exercise_entries
         )
-    elif start_date and not end_date:
-        statement = (
-            select(Workout)
-            .where(
-                Workout.username == username,
-                Workout.date >= start_date
-            )
-            .options(
-                selectinload(Workout.exercise_entries)
-                .selectinload(Exercise_Entry.set_entries)
-            )
+
+    if result.accepted:
+        for exercise_id in imported_exercise_ids:
+            rebuild_record(session, username, exercise_id)
+        bump_data_version(session, username)
+        session.commit()
+
+    result.rejected.sort(key=lambda rejection: rejection.row)
+    return result
+
+
+# the listing reads plain columns instead of ORM objects and builds its responses unvalidated,
+# see get_workouts_read_from_rows
+WORKOUT_READ_COLUMNS: tuple = (
+    Workout.id,
+    Workout.name,
+    Workout.username,
+    Workout.description,
+    Workout.date,
+    Workout.start_time,
+    Workout.duration,
+    Workout.stats
+)
+WORKOUTS_READ_ADAPTER: TypeAdapter = TypeAdapter(list[Workout_Read])
+IN_CHUNK_SIZE: int = 500 # ids per IN (...), same as selectinload
+
+
+def get_user_workouts_by_date(session: Session, username: str, start_date: int = None, end_date: int = None) -> list[Workout_Read]:
+    filters: list = get_workout_filters(username, start_date, end_date)
+    workouts_read: list[Workout_Read] = []
+    workout_ids: set[int] = set()
+    # archives are only attached when the range reaches into their year
+    for execution_options in get_workout_sources(session, username, start_date, end_date):
+        workout_rows = session.exec(
+            select(*WORKOUT_READ_COLUMNS)
+            .where(*filters)
+            .order_by(Workout.id),
+            execution_options=execution_options
+        ).all()
+        # the hot database comes first, an archived copy of one of its workouts is left over from an interrupted move
+        workout_rows = [workout_row for workout_row in workout_rows if workout_row.id not in workout_ids]
+        workout_ids.update(workout_row.id for workout_row in workout_rows)
+        workouts_read.extend(get_workouts_read_from_rows(session, workout_rows, username, execution_options))
+
+    # each database's workouts are in id order, the sort only has to merge them
+    workouts_read.sort(key=lambda workout_read: workout_read.id)
+    return workouts_read
+
+
+def get_workouts_read_from_rows(session: Session, workout_rows: list, username: str, execution_options: dict = None) -> list[Workout_Read]:
+    """Builds Workout_Reads from WORKOUT_READ_COLUMNS rows with one query per table (per IN_CHUNK_SIZE workouts),
+    reading the entries from the database execution_options points at (see src/archive.py), the hot one by default.
+    Every value comes straight from the database, so the models are constructed without validation,
+    serialize them with WORKOUTS_READ_ADAPTER rather than returning them through a response_model."""
+    execution_options = execution_options or {}
+    workouts_read: list[Workout_Read] = []
+    workouts_by_id: dict[int, Workout_Read] = {}
+    for id,name,workout_username,description,date,start_time,duration,stats in workout_rows:
+        workout_read: Workout_Read = Workout_Read.model_construct(
+            id=id,
+            name=name,
+            username=workout_username,
+            description=description,
+            date=date,
+            start_time=start_time,
+            duration=duration,
+            exercise_entries=[],
+            stats=Workout_Stats.model_construct(**stats) if stats is not None else None
         )
-    elif not start_date and end_date:
-        statement = (
-            select(Workout)
-            .where(
-                Workout.username == username,
-                Workout.date <= end_date
+        workouts_read.append(workout_read)
+        workouts_by_id[id] = workout_read
+
+    workout_ids: list[int] = list(workouts_by_id)
+    exercise_entries_by_id: dict[int, Exercise_Entry_Read] = {}
+    for i in range(0, len(workout_ids), IN_CHUNK_SIZE):
+        exercise_entry_rows = session.exec(
+            select(Exercise_Entry.id, Exercise_Entry.workout_id, Exercise_Entry.exercise_id, Exercise_Entry.exercise_name, Exercise_Entry.description)
+            .where(Exercise_Entry.workout_id.in_(workout_ids[i:i + IN_CHUNK_SIZE]))
+            .order_by(Exercise_Entry.id),
+            execution_options=execution_options
+        ).all()
+        for id,workout_id,exercise_id,exercise_name,description in exercise_entry_rows:
+            exercise_entry_read: Exercise_Entry_Read = Exercise_Entry_Read.model_construct(
+                id=id,
+                exercise_id=exercise_id,
+                exercise_name=exercise_name,
+                description=description,
+                set_entries=[]
             )
-            .options(
-                selectinload(Workout.exercise_entries)
-                .selectinload(Exercise_Entry.set_entries)
+            workouts_by_id[workout_id].exercise_entries.append(exercise_entry_read)
+            exercise_entries_by_id[id] = exercise_entry_read
+
+    exercise_entry_ids: list[int] = list(exercise_entries_by_id)
+    for i in range(0, len(exercise_entry_ids), IN_CHUNK_SIZE):
+        set_entry_rows = session.exec(
+            select(Set_Entry.id, Set_Entry.exercise_entry_id, Set_Entry.weight, Set_Entry.reps, Set_Entry.time)
+            .where(Set_Entry.exercise_entry_id.in_(exercise_entry_ids[i:i + IN_CHUNK_SIZE]))
+            .order_by(Set_Entry.id),
+            execution_options=execution_options
+        ).all()
+        for id,exercise_entry_id,weight,reps,time in set_entry_rows:
+            exercise_entries_by_id[exercise_entry_id].set_entries.append(
+                Set_Entry_Read.model_construct(weight=weight, reps=reps, time=time, id=id)
             )
+
+    # stats are stored at write time, only older workouts without them need computing
+    # resolve their exercises once instead of once per workout
+    missing_stats: list[Workout_Read] = [workout_read for workout_read in workouts_read if workout_read.stats is None]
+    if missing_stats:
+        exercises: dict[int, Exercise] = get_workouts_exercises(session, missing_stats)
+        for workout_read in missing_stats:
+            workout_read.stats = get_workout_stats(session, workout_read, username, exercises)
+
+    return workouts_read
+
+
+def get_workouts_json(workouts_read: list[Workout_Read], response: Response) -> Response:
+    # keeps the headers dependencies set on the injected response (ETag, X-Next-Cursor),
+    # FastAPI drops them when a route returns its own Response
+    return Response(
+        content=WORKOUTS_READ_ADAPTER.dump_json(workouts_read, exclude_none=True),
+        media_type="application/json",
+        headers=response.headers
+    )
+
+
+def get_workout_summaries(session: Session, workouts: list[Workout], execution_options: dict = None) -> list[Workout_Summary]:
+    exercise_names: dict[int, list[str]] = {workout.id: [] for workout in workouts}
+    if workouts:
+        rows = session.exec(
+            select(Exercise_Entry.workout_id, Exercise_Entry.exercise_name)
+            .where(Exercise_Entry.workout_id.in_(exercise_names))
+            .order_by(Exercise_Entry.id),
+            execution_options=execution_options or {}
+        ).all()
+        for workout_id,exercise_name in rows:
+            exercise_names[workout_id].append(exercise_name)
+
+    return [
+        Workout_Summary(
+            **workout.model_dump(exclude={"stats"}),
+            exercise_names=exercise_names[workout.id]
         )
+        for workout in workouts
+    ]
+
+
+def build_workouts_page(session: Session, page: list[tuple], build: Callable[[Session, list, dict], list]) -> list:
+    """Builds the responses of a get_workouts_page page with one build(session, rows, execution_options) call
+    per database its rows came from, in page order."""
+    built: dict[int, Union[Workout_Read, Workout_Summary]] = {}
+    for execution_options,rows in get_page_sources(session, page):
+        built.update((result.id, result) for result in build(session, rows, execution_options))
+    return [built[row.id] for _,row in page]
+
+
+def run_import(username: str, body: str, content_type: str) -> Workout_Import_Result:
+    """Runs an import in its own session on the sync writer engine, for a worker thread."""
+    with Session(engine, expire_on_commit=False) as session:
+        return import_user_workouts(session, username, body, content_type)
+
+
+@router.post("/workouts/me/import", response_model=Workout_Import_Result)
+async def import_workouts(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)]
+) -> Workout_Import_Result:
+    try:
+        body: str = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8")
+
+    # parsing, validating and computing stats for thousands of workouts is seconds of python, through run_sync it runs
+    # on the event loop between statements and stalls every other request. a worker thread only holds the GIL for
+    # a switch interval at a time
+    return await asyncio.to_thread(run_import, current_user.username, body, request.headers.get("content-type", ""))
+
+
+@router.get("/workouts/me/", response_model=list[Union[Workout_Read, Workout_Summary]], response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def get_user_workouts(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    view: str = "full"
+) -> list[Union[Workout_Read, Workout_Summary]]:
+    if view not in ["full", "summary"]:
+        raise HTTPException(status_code=400, detail="View must be one of 'full' or 'summary'")
+    if limit is None and cursor is None and view == "full":
+        return get_workouts_json(await session.run_sync(get_user_workouts_by_date, current_user.username), response)
+    if limit is not None:
+        validate_limit(limit)
+
+    # newest first, paged by keyset on (date, id); the next page's cursor is sent back in X-Next-Cursor
+    if view == "full":
+        statement = select(*WORKOUT_READ_COLUMNS)
     else:
-        statement = (
-            select(Workout)
-            .where(
-                Workout.username == username,
-                Workout.date >= start_date,
-                Workout.date <= end_date
-            )
-            .options(
-                selectinload(Workout.exercise_entries)
-                .selectinload(Exercise_Entry.set_entries)
+        statement = select(Workout).options(defer(Workout.stats))
+    statement = (
+        statement
+        .where(Workout.username == current_user.username)
+        .order_by(Workout.date.desc(), Workout.id.desc())
+    )
+    if cursor:
+        statement = statement.where(get_workouts_before_cursor(cursor))
+    if limit is not None:
+        statement = statement.limit(limit + 1)
+
+    page: list[tuple] = await session.run_sync(get_workouts_page, statement, current_user.username, limit, cursor)
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        _,last_workout = page[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last_workout.date, last_workout.id)
+
+    if view == "summary":
+        return await session.run_sync(build_workouts_page, page, get_workout_summaries)
+    return get_workouts_json(await session.run_sync(
+        build_workouts_page,
+        page,
+        lambda sync_session, workout_rows, execution_options: get_workouts_read_from_rows(sync_session, workout_rows, current_user.username, execution_options)
+    ), response)
+
+
+EXPORT_CHUNK_SIZE: int = 100
+
+
+async def export_user_workouts(username: str) -> AsyncIterator[str]:
+    # own session: the stream outlives the route, and the request's session with it. not read_session(), the request still holds its slot
+    async with AsyncSession(async_read_engine) as session:
+        # oldest first: the archives from their oldest year on, then the hot database
+        archive_years: list[int] = await session.run_sync(get_archive_years, username)
+        sources: list[dict] = [await session.run_sync(get_archive_options, year) for year in reversed(archive_years)] + [{}]
+        for execution_options in sources:
+            result = await session.stream(
+                select(*WORKOUT_READ_COLUMNS)
+                .where(Workout.username == username, *get_source_filters(execution_options))
+                .order_by(Workout.date, Workout.id)
+                .execution_options(yield_per=EXPORT_CHUNK_SIZE),
+                execution_options=execution_options
             )
-        )
-    
-    workouts: list[Workout] = session.exec(statement).all()
-    if not workouts:
-        return []
-    
-    workouts_read: list[Workout_Read] = []
-    for workout in workouts:
-        workout_read: Workout_Read = Workout_Read(
-            **workout.dict(exclude={"exercise_entries", "stats"}),
-            exercise_entries=[Exercise_Entry_Read.from_orm(e) for e in workout.exercise_entries],
-            stats=get_workout_stats(session, workout, username)
-        )
-        workouts_read.append(workout_read)
-
-    return workouts_read
+            async for workout_rows in result.partitions():
+                for workout_read in await session.run_sync(get_workouts_read_from_rows, workout_rows, username, execution_options):
+                    yield workout_read.model_dump_json(exclude_none=True) + "\n"
 
 
-@router.get("/workouts/me/", response_model=list[Workout_Read], response_model_exclude_none=True)
-def get_user_workouts(
+@router.get("/workouts/me/export")
+async def export_workouts(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
-) -> list[Workout_Read]:
-    return get_user_workouts_by_date(session, current_user.username, start_date=None, end_date=None)
+    format: str = "ndjson"
+) -> StreamingResponse:
+    if format != "ndjson":
+        raise HTTPException(status_code=400, detail="Format must be 'ndjson'")
+
+    return StreamingResponse(
+        export_user_workouts(current_user.username),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="workouts.ndjson"'}
+    )
 
 
-@router.get("/workouts/me/stats", response_model=Workout_Stats)
-def get_user_stats_by_query(
+@router.get("/workouts/me/stats", response_model=Workout_Stats, dependencies=[Depends(check_etag)])
+async def get_user_stats_by_query(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)],
+    session: Annotated[AsyncSession, Depends(get_read_db)],
     start_date: Optional[int] = None,
     end_date: Optional[int] = None
 ) -> Workout_Stats:
-    workouts: list[Workout] = get_user_workouts_by_date(session, current_user.username, start_date=start_date, end_date=end_date)
+    return await session.run_sync(get_stats_by_date, current_user.username, start_date=start_date, end_date=end_date)
 
-    stats: Workout_Stats = get_stats(session, workouts, current_user.username)
-    return stats
 
-
-@router.get("/workouts/me/stats/this-week", response_model=Workout_Stats)
-def get_user_stats_this_week(
+@router.get("/workouts/me/stats/this-week", response_model=Workout_Stats, dependencies=[Depends(check_etag)])
+async def get_user_stats_this_week(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> Workout_Stats:
-    date: datetime.date = datetime.date.today()
-    day_of_week: int = get_day_of_the_week(int(date.strftime("%Y%m%d")))
-    start_of_week: datetime.date = date - datetime.timedelta(days=day_of_week)
-    start_of_week_int: int = int(start_of_week.strftime("%Y%m%d"))
+    return await session.run_sync(get_rollup_stats, current_user.username, "week", get_date_today())
 
-    workouts: list[Workout] = get_user_workouts_by_date(session, current_user.username, start_date=start_of_week_int)
 
-    stats: Workout_Stats = get_stats(session, workouts, current_user.username)
-    return stats
+@router.get("/workouts/me/stats/this-month", response_model=Workout_Stats, dependencies=[Depends(check_etag)])
+async def get_user_stats_this_month(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)]
+) -> Workout_Stats:
+    return await session.run_sync(get_rollup_stats, current_user.username, "month", get_date_today())
 
 
-@router.get("/workouts/me/stats/this-month", response_model=Workout_Stats)
-def get_user_stats_this_month(
+@router.get("/workouts/me/stats/this-year", response_model=Workout_Stats, dependencies=[Depends(check_etag)])
+async def get_user_stats_this_year(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> Workout_Stats:
-    date: int = get_date_today()
-    start_of_month = date - get_day(date) + 1
+    return await session.run_sync(get_rollup_stats, current_user.username, "year", get_date_today())
 
-    workouts: list[Workout] = get_user_workouts_by_date(session, current_user.username, start_date=start_of_month)
 
-    stats: Workout_Stats = get_stats(session, workouts, current_user.username)
-    return stats
+@router.get("/workouts/me/stats/series", response_model=list[Workout_Stats_Bucket], dependencies=[Depends(check_etag)])
+async def get_user_stats_series(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    start_date: Optional[int] = None,
+    end_date: Optional[int] = None,
+    bucket: str = "week"
+) -> list[Workout_Stats_Bucket]:
+    if bucket not in ["day", "week", "month"]:
+        raise HTTPException(status_code=400, detail="Bucket must be one of 'day', 'week' or 'month'")
 
+    return await session.run_sync(get_stats_series, current_user.username, start_date=start_date, end_date=end_date, period=bucket)
 
-@router.get("/workouts/me/stats/this-year", response_model=Workout_Stats)
-def get_user_stats_this_year(
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
-) -> Workout_Stats:
-    date: int = get_date_today()
-    start_of_year: int = date - create_date(month=get_month(date)-1,day=get_day(date)-1)
 
-    workouts: list[Workout] = get_user_workouts_by_date(session, current_user.username, start_date=start_of_year)
+@router.get("/workouts/me/records", response_model=list[Personal_Record_Read], response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def get_user_records(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)]
+) -> list[Personal_Record_Read]:
+    records = (await session.exec(
+        select(Personal_Record, Exercise.name)
+        .join(Exercise, Exercise.id == Personal_Record.exercise_id)
+        .where(Personal_Record.username == current_user.username)
+        .order_by(Exercise.name)
+    )).all()
+
+    return [
+        Personal_Record_Read(**record.model_dump(), exercise_name=exercise_name)
+        for record,exercise_name in records
+    ]
+
+
+def get_workout(session: Session, workout_id: int, username: str) -> Workout:
+    """Finds the workout in the hot database, then in the archives. An archived workout is read only,
+    writes call restore_workout first so they always get the hot database's."""
+    for execution_options in get_workout_sources(session, username):
+        workout: Workout = session.exec (
+            select(Workout)
+            .where(
+                Workout.id == workout_id,
+                Workout.username == username
+            )
+            .options(
+                selectinload(Workout.exercise_entries)
+                .selectinload(Exercise_Entry.set_entries)
+            ),
+            execution_options=execution_options
+        ).first()
+        if workout:
+            return workout
 
-    stats: Workout_Stats = get_stats(session, workouts, current_user.username)
-    return stats
+    raise HTTPException(status_code=404, detail="Workout not found")
 
 
-@router.get("/workouts/me/{workout_id}", response_model=Workout_Read, response_model_exclude_none=True)
-def get_user_workout(
+@router.get("/workouts/me/{workout_id}", response_model=Workout_Read, response_model_exclude_none=True, dependencies=[Depends(check_etag)])
+async def get_user_workout(
     workout_id: int,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
+    session: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> Workout_Read:
-    workout: Workout = session.exec (
-        select(Workout)
-        .where(
-            Workout.id == workout_id,
-            Workout.username == current_user.username
-        )
-        .options(
-            selectinload(Workout.exercise_entries)
-            .selectinload(Exercise_Entry.set_entries)
-        )
-    ).first()
-    if not workout:
-        raise HTTPException(status_code=404, detail="Workout not found")
-    
-    return workout
+    return await session.run_sync(get_workout, workout_id, current_user.username)
 
 
-@router.put("/workouts/me/{workout_id}", response_model=Workout_Read, response_model_exclude_none=True)
-def update_user_workout(
-    workout_id: int,
-    workout_create: Workout_Create,
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
-) -> Workout_Read:
-    workout: Workout = get_user_workout(workout_id=workout_id, current_user=current_user, session=session)
+def update_workout(session: Session, workout_id: int, workout_create: Workout_Create, username: str) -> Workout_Read:
+    # an archived workout is moved back first, it commits on its own
+    restore_workout(session, workout_id, username)
+    # first, so a concurrent write to the user's data waits here before this one reads the workout
+    version: int = bump_data_version(session, username)
+    workout: Workout = get_workout(session, workout_id, username)
 
-    validate_workout(session, workout_create)
+    exercises: dict[int, Exercise] = get_referenced_exercises(session, [workout_create])
+    validate_workout(session, workout_create, exercises)
 
     try:
-        workout.sqlmodel_update(workout_create.model_dump())
-        workout.exercise_entries.clear()
+        old_date: int = workout.date
+        old_stats: Workout_Stats = get_stored_workout_stats(session, workout, username)
+        old_set_ids: dict[int, set[int]] = get_workout_set_ids(workout)
+
+        workout.sqlmodel_update(workout_create.model_dump(exclude={"username", "exercise_entries"}))
+        workout.modified_version = version
 
+        # the sets go with their entries (ON DELETE CASCADE)
         session.exec(
             delete(Exercise_Entry)
             .where(Exercise_Entry.workout_id == workout_id)
         )
+        session.expire(workout, ["exercise_entries"])
+        exercise_sets: dict[int, list[tuple]] = insert_exercise_entries(session, [workout_create], [workout_id], exercises)
 
-        new_exercise_entries: list[Exercise_Entry] = get_new_exercise_entries(session, workout_create, workout)
-        workout.exercise_entries = new_exercise_entries
+        stats: Workout_Stats = get_workout_stats(session, workout_create, username, exercises)
+        workout.stats = stats.model_dump()
+        # add before removing so a shared bucket never drops to zero and gets deleted mid-transaction
+        apply_workout_stats(session, username, workout.date, stats)
+        apply_workout_stats(session, username, old_date, old_stats, sign=-1)
 
         session.add(workout)
+        session.flush()
+        repair_records(session, username, old_set_ids)
+        apply_set_rows(session, username, exercise_sets)
+
+        # read back inside the transaction, the new entries load with it
+        workout_read: Workout_Read = Workout_Read.model_validate(workout)
         session.commit()
     except HTTPException:
         session.rollback()
@@ -405,17 +735,202 @@ def update_user_workout(
         print(e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-    workout.stats = get_workout_stats(session, workout, current_user.username)
-    return workout
+    return workout_read
 
 
-@router.delete("/workouts/me/{workout_id}", status_code=204)
-def delete_user_workout(
+@router.put("/workouts/me/{workout_id}", response_model=Workout_Read, response_model_exclude_none=True)
+async def update_user_workout(
     workout_id: int,
+    workout_create: Workout_Create,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    session: Annotated[Session, Depends(get_db)]
-) -> None:
-    workout: Workout = get_user_workout(workout_id=workout_id, current_user=current_user, session=session)
+    session: Annotated[AsyncSession, Depends(get_db)]
+) -> Workout_Read:
+    return await session.run_sync(update_workout, workout_id, workout_create, current_user.username)
+
+
+def get_reorder_start(current_ids: list[int], order: list[int], kind: str) -> int:
+    """Validates a new id order and returns the first position it changes."""
+    if sorted(order) != sorted(current_ids):
+        raise HTTPException(status_code=400, detail=f"{kind} order must list every remaining {kind.lower()} id once")
+    for pos,(current_id,ordered_id) in enumerate(zip(current_ids, order)):
+        if current_id != ordered_id:
+            return pos
+    return len(current_ids)
+
+
+def update_set_entries(exercise_entry: Exercise_Entry, exercise_entry_update: Exercise_Entry_Update, removed_set_ids: set[int]) -> bool:
+    """Applies an entry's set changes in place, collecting removed or rewritten set ids. Returns whether any set changed."""
+    set_entries: dict[int, Set_Entry] = {set_entry.id: set_entry for set_entry in exercise_entry.set_entries}
+    changed: bool = False
+
+    for set_entry_id in exercise_entry_update.remove_set_entry_ids:
+        set_entry: Set_Entry = set_entries.pop(set_entry_id, None)
+        if not set_entry:
+            raise HTTPException(status_code=404, detail="Set entry not found")
+        exercise_entry.set_entries.remove(set_entry)
+        removed_set_ids.add(set_entry_id)
+        changed = True
+
+    for set_entry_update in exercise_entry_update.update_set_entries:
+        set_entry: Set_Entry = set_entries.get(set_entry_update.id)
+        if not set_entry:
+            raise HTTPException(status_code=404, detail="Set entry not found")
+        old_values: tuple = (set_entry.weight, set_entry.reps, set_entry.time)
+        set_entry.sqlmodel_update(set_entry_update.model_dump(exclude={"id"}))
+        if (set_entry.weight, set_entry.reps, set_entry.time) != old_values:
+            # its old values may have held a personal record
+            removed_set_ids.add(set_entry.id)
+            changed = True
+
+    if exercise_entry_update.set_entry_order is not None:
+        # ordered by id, so sets from the first moved one on are re-inserted
+        current_sets: list[Set_Entry] = sorted(exercise_entry.set_entries, key=lambda set_entry: set_entry.id)
+        start: int = get_reorder_start([set_entry.id for set_entry in current_sets], exercise_entry_update.set_entry_order, "Set entry")
+        for set_entry_id in exercise_entry_update.set_entry_order[start:]:
+            set_entry: Set_Entry = set_entries[set_entry_id]
+            exercise_entry.set_entries.remove(set_entry)
+            exercise_entry.set_entries.append(Set_Entry(weight=set_entry.weight, reps=set_entry.reps, time=set_entry.time))
+            removed_set_ids.add(set_entry_id)
+            changed = True
+
+    for set_entry_create in exercise_entry_update.add_set_entries:
+        exercise_entry.set_entries.append(Set_Entry(**set_entry_create.model_dump()))
+        changed = True
+
+    return changed
+
+
+def patch_workout(session: Session, workout_id: int, workout_update: Workout_Update, username: str) -> Workout_Read:
+    """Applies only the listed changes, leaving unchanged entries, sets and derived data alone."""
+    # an archived workout is moved back first, it commits on its own
+    restore_workout(session, workout_id, username)
+    # first, so a concurrent write to the user's data waits here before this one reads the workout
+    version: int = bump_data_version(session, username)
+    workout: Workout = get_workout(session, workout_id, username)
+
+    exercise_ids: set[int] = {exercise_entry.exercise_id for exercise_entry in workout.exercise_entries}
+    exercise_ids.update(exercise_entry.exercise_id for exercise_entry in workout_update.add_exercise_entries)
+    exercises: dict[int, Exercise] = resolve_exercises(session, exercise_ids)
+
+    try:
+        old_date: int = workout.date
+        old_stats: Workout_Stats = get_stored_workout_stats(session, workout, username, exercises)
+        removed_sets: dict[int, set[int]] = {} # exercise id -> removed or rewritten set ids
+        changed_exercise_entries: list[Exercise_Entry] = []
+
+        # nothing is written until every change has been applied and validated
+        with session.no_autoflush:
+            workout.sqlmodel_update(workout_update.model_dump(
+                include={"name", "description", "date", "start_time", "duration"},
+                exclude_unset=True
+            ))
+            workout.modified_version = version
+
+            exercise_entries: dict[int, Exercise_Entry] = {exercise_entry.id: exercise_entry for exercise_entry in workout.exercise_entries}
+            for exercise_entry_id in workout_update.remove_exercise_entry_ids:
+                exercise_entry: Exercise_Entry = exercise_entries.pop(exercise_entry_id, None)
+                if not exercise_entry:
+                    raise HTTPException(status_code=404, detail="Exercise entry not found")
+                workout.exercise_entries.remove(exercise_entry)
+                removed_sets.setdefault(exercise_entry.exercise_id, set()).update(set_entry.id for set_entry in exercise_entry.set_entries)
+
+            for exercise_entry_update in workout_update.update_exercise_entries:
+                exercise_entry: Exercise_Entry = exercise_entries.get(exercise_entry_update.id)
+                if not exercise_entry:
+                    raise HTTPException(status_code=404, detail="Exercise entry not found")
+                if exercise_entry_update.description is not None:
+                    exercise_entry.description = exercise_entry_update.description
+                if update_set_entries(exercise_entry, exercise_entry_update, removed_sets.setdefault(exercise_entry.exercise_id, set())):
+                    changed_exercise_entries.append(exercise_entry)
+
+            if workout_update.exercise_entry_order is not None:
+                # ordered by id, so entries from the first moved one on are re-inserted, their sets only move
+                current_entries: list[Exercise_Entry] = sorted(workout.exercise_entries, key=lambda exercise_entry: exercise_entry.id)
+                start: int = get_reorder_start([exercise_entry.id for exercise_entry in current_entries], workout_update.exercise_entry_order, "Exercise entry")
+                for exercise_entry_id in workout_update.exercise_entry_order[start:]:
+                    exercise_entry: Exercise_Entry = exercise_entries[exercise_entry_id]
+                    moved_exercise_entry: Exercise_Entry = Exercise_Entry(
+                        exercise_id=exercise_entry.exercise_id,
+                        exercise_name=exercise_entry.exercise_name,
+                        description=exercise_entry.description
+                    )
+                    moved_exercise_entry.set_entries = list(exercise_entry.set_entries)
+                    workout.exercise_entries.remove(exercise_entry)
+                    workout.exercise_entries.append(moved_exercise_entry)
+                    if exercise_entry in changed_exercise_entries:
+                        changed_exercise_entries[changed_exercise_entries.index(exercise_entry)] = moved_exercise_entry
+
+            for exercise_entry_create in workout_update.add_exercise_entries:
+                exercise: Exercise = exercises.get(exercise_entry_create.exercise_id)
+                if not exercise:
+                    raise HTTPException(status_code=400, detail="Invalid exercise(id) submitted")
+                new_exercise_entry: Exercise_Entry = Exercise_Entry(
+                    **exercise_entry_create.model_dump(exclude={"set_entries"}),
+                    exercise_name=exercise.name,
+                    set_entries=[Set_Entry(**set_entry_create.model_dump()) for set_entry_create in exercise_entry_create.set_entries]
+                )
+                workout.exercise_entries.append(new_exercise_entry)
+                changed_exercise_entries.append(new_exercise_entry)
+
+            validate_workout(session, workout, exercises)
+
+            stats: Workout_Stats = get_workout_stats(session, workout, username, exercises)
+            if workout.date != old_date or stats.model_dump() != old_stats.model_dump():
+                workout.stats = stats.model_dump()
+                # add before removing so a shared bucket never drops to zero and gets deleted mid-transaction
+                apply_workout_stats(session, username, workout.date, stats)
+                apply_workout_stats(session, username, old_date, old_stats, sign=-1)
+
+        session.add(workout)
+        session.flush()
+        repair_records(session, username, removed_sets)
+        apply_exercise_entries(session, username, changed_exercise_entries)
+
+        workout_read: Workout_Read = Workout_Read.model_validate(workout)
+        session.commit()
+    except HTTPException:
+        session.rollback()
+        raise
+    except Exception as e:
+        session.rollback()
+        print(e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    return workout_read
+
+
+@router.patch("/workouts/me/{workout_id}", response_model=Workout_Read, response_model_exclude_none=True)
+async def patch_user_workout(
+    workout_id: int,
+    workout_update: Workout_Update,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_db)]
+) -> Workout_Read:
+    return await session.run_sync(patch_workout, workout_id, workout_update, current_user.username)
+
+
+def delete_workout(session: Session, workout_id: int, username: str) -> None:
+    # an archived workout is moved back first, it commits on its own
+    restore_workout(session, workout_id, username)
+    # first, so a concurrent write to the user's data waits here before this one reads the workout
+    version: int = bump_data_version(session, username)
+    workout: Workout = get_workout(session, workout_id, username)
+
+    stats: Workout_Stats = get_stored_workout_stats(session, workout, username)
+    apply_workout_stats(session, username, workout.date, stats, sign=-1)
+    set_ids: dict[int, set[int]] = get_workout_set_ids(workout)
     
     session.delete(workout)
-    session.commit()
\ No newline at end of file
+    session.flush()
+    repair_records(session, username, set_ids)
+    add_tombstone(session, username, "workout", workout_id, version)
+    session.commit()
+
+
+@router.delete("/workouts/me/{workout_id}", status_code=204)
+async def delete_user_workout(
+    workout_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_db)]
+) -> None:
+    await session.run_sync(delete_workout, workout_id, current_user.username)
\ No newline at end of file
@@ -0,0 +1,18 @@
+from sqlmodel import SQLModel
+from typing import List
+
+from src.models import Exercise
+from src.schemas.workout import Workout_Read
+from src.schemas.template import Workout_Template_Read
+
+
+class Sync_Changes(SQLModel):
+    token: str # pass back as 'since' on the next sync
+    full: bool # every row is included, replace the local copy instead of merging into it
+    workouts: List[Workout_Read] = []
+    templates: List[Workout_Template_Read] = []
+    exercises: List[Exercise] = [] # custom exercises only
+    # apply deletions before the changed rows, sqlite can reuse a deleted row's id
+    deleted_workout_ids: List[int] = []
+    deleted_template_ids: List[int] = []
+    deleted_exercise_ids: List[int] = []
@@ -11,6 +11,10 @@ class Workout_Stats(SQLModel):
     distributions: Optional[dict] = None
 
 
+class Workout_Stats_Bucket(Workout_Stats):
+    bucket: int # 'YYYYMMDD', first day of the bucket
+
+
 class Set_Entry_Create(SQLModel):
     weight: Optional[float] = None
     reps: Optional[int] = None
@@ -33,11 +37,41 @@ class Workout_Create(SQLModel):
     exercise_entries: List[Exercise_Entry_Create]
 
 
+class Set_Entry_Update(SQLModel):
+    id: int
+    weight: Optional[float] = None
+    reps: Optional[int] = None
+    time: Optional[str] = None # 'HH:MM:SS'
+
+
+class Exercise_Entry_Update(SQLModel):
+    id: int
+    description: Optional[str] = None # left unchanged when not sent
+    add_set_entries: List[Set_Entry_Create] = [] # appended after the existing sets
+    remove_set_entry_ids: List[int] = []
+    update_set_entries: List[Set_Entry_Update] = [] # replaces weight, reps and time of each set
+    set_entry_order: Optional[List[int]] = None # every remaining set id in its new order, added sets go last
+
+
+class Workout_Update(SQLModel):
+    # fields that aren't sent are left unchanged
+    name: Optional[str] = None
+    description: Optional[str] = None
+    date: Optional[int] = None # 'YYYYMMDD'
+    start_time: Optional[str] = None # 'HH:MM:SS' time of day when workout started
+    duration: Optional[str] = None # 'HH:MM:SS', duration of workout
+    add_exercise_entries: List[Exercise_Entry_Create] = [] # appended after the existing entries
+    remove_exercise_entry_ids: List[int] = []
+    update_exercise_entries: List[Exercise_Entry_Update] = []
+    exercise_entry_order: Optional[List[int]] = None # every remaining entry id in its new order, added entries go last
+
+
 class Set_Entry_Read(Set_Entry_Create):
-    pass
+    id: Optional[int] = None
 
 
 class Exercise_Entry_Read(SQLModel):
+    id: Optional[int] = None
     exercise_id: int
     exercise_name: str
     description: str
@@ -53,4 +87,46 @@ class Workout_Read(SQLModel):
     start_time: str # 'HH:MM:SS' time of day when workout started
     duration: str # 'HH:MM:SS', duration of workout
     exercise_entries: List[Exercise_Entry_Read] = []
-    stats: Optional[Workout_Stats] = None
\ No newline at end of file
+    stats: Optional[Workout_Stats] = None
+
+
+class Workout_Summary(SQLModel):
+    id: int
+    name: str
+    username: Optional[str]
+    description: Optional[str]
+    date: int # 'YYYYMMDD'
+    start_time: str # 'HH:MM:SS' time of day when workout started
+    duration: str # 'HH:MM:SS', duration of workout
+    exercise_names: List[str] = []
+
+
+class Personal_Record_Read(SQLModel):
+    exercise_id: int
+    exercise_name: str
+    weight: Optional[float] = None
+    reps: Optional[int] = None
+    estimated_1rm: Optional[float] = None
+    volume: Optional[float] = None # lbs
+    time: Optional[str] = None # 'HH:MM:SS'
+
+
+class Exercise_History_Entry(Exercise_Entry_Read):
+    workout_id: int
+    workout_name: str
+    date: int # 'YYYYMMDD'
+
+
+class Exercise_History(SQLModel):
+    exercise_entries: List[Exercise_History_Entry] = []
+
+
+class Workout_Import_Rejection(SQLModel):
+    row: int # workout position in a JSON array, line of NDJSON, or first CSV line of the workout
+    detail: str
+
+
+class Workout_Import_Result(SQLModel):
+    accepted: int = 0 # workouts
+    accepted_sets: int = 0
+    rejected: List[Workout_Import_Rejection] = []
@@ -0,0 +1,261 @@
+from fastapi import HTTPException
+from sqlmodel import Session, select
+from sqlalchemy import func
+
+from src.models import *
+from src.schemas.workout import Workout_Stats, Workout_Stats_Bucket
+from src.time import is_valid_timestamp, get_start_of_period
+from src.database import MUSCLES
+from src.exercises import resolve_exercises
+from src.archive import get_workout_sources, get_source_filters
+
+
+def get_exercises_by_ids(session: Session, exercise_ids: set[int]) -> dict[int, Exercise]:
+    exercises: dict[int, Exercise] = resolve_exercises(session, exercise_ids)
+    if len(exercises) != len(exercise_ids):
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    return exercises
+
+
+def get_workouts_exercises(session: Session, workouts: list[Workout]) -> dict[int, Exercise]:
+    exercise_ids: set[int] = {
+        exercise_entry.exercise_id
+        for workout in workouts
+        for exercise_entry in workout.exercise_entries
+    }
+    return get_exercises_by_ids(session, exercise_ids)
+
+
+def get_distributions(session: Session, workouts: list[Workout], username: str = None, exercises: dict[int, Exercise] = None) -> dict:
+    if exercises is None:
+        exercises = get_workouts_exercises(session, workouts)
+
+    exercise_sets: dict[int, int] = {}
+    for workout in workouts:
+        for exercise_entry in workout.exercise_entries:
+            exercise_sets[exercise_entry.exercise_id] = exercise_sets.get(exercise_entry.exercise_id, 0) + len(exercise_entry.set_entries)
+
+    return get_distributions_by_exercise(exercises, exercise_sets)
+
+
+def get_distributions_by_exercise(exercises: dict[int, Exercise], exercise_sets: dict[int, int]) -> dict:
+    set_distribution: dict[str, dict[str, float]] = {}
+    total_muscle_sets: float = 0.0
+
+    for MUSCLE in MUSCLES:
+        set_distribution[MUSCLE] = {
+            "primary": 0.0,
+            "secondary": 0.0
+        }
+
+    for exercise_id,sets in exercise_sets.items():
+        exercise: Exercise = exercises[exercise_id]
+
+        for primary_muscle in exercise.primary_muscles:
+            to_add: float = 1.0 * sets
+            set_distribution[primary_muscle]["primary"] += to_add
+            total_muscle_sets += to_add
+        if exercise.secondary_muscles:
+            for secondary_muscle in exercise.secondary_muscles:
+                to_add: float = 0.5 * sets
+                set_distribution[secondary_muscle]["secondary"] += to_add
+                total_muscle_sets += to_add
+    
+    return get_distributions_from_sets(set_distribution, total_muscle_sets)
+
+
+def get_distributions_from_sets(set_distribution: dict[str, dict[str, float]], total_muscle_sets: float = None) -> dict:
+    if total_muscle_sets is None:
+        total_muscle_sets = sum(
+            sets["primary"] + sets["secondary"]
+            for sets in set_distribution.values()
+        )
+
+    if total_muscle_sets == 0:
+        return {"set_distribution": {}, "muscle_distribution": {}}
+
+    muscle_distribution: dict[str, int] = {}
+    for muscle,sets in set_distribution.items():
+        percentage: int = (int) (100 * (sets["primary"] + sets["secondary"]) / total_muscle_sets)
+        muscle_distribution[muscle] = percentage
+
+    # sort muscle_distribution by percentages
+    muscle_distribution = {m: p for m,p in sorted(muscle_distribution.items(), reverse=True, key=lambda entry: entry[1])}
+    return {
+        "set_distribution": set_distribution,
+        "muscle_distribution": muscle_distribution
+    }
+
+
+def get_stats(session: Session, workouts: list[Workout], username: str = None, exercises: dict[int, Exercise] = None) -> Workout_Stats:
+    if exercises is None:
+        exercises = get_workouts_exercises(session, workouts)
+
+    workout_count: int = len(workouts)
+    exercise_count: int = 0
+    sets: int = 0
+    reps: int = 0
+    volume: float = 0
+    exercise_sets: dict[int, int] = {}
+
+    # a plain python pass rather than a NumPy kernel (numpy is no dependency), the per exercise set counts collected along the way
+    for workout in workouts:
+        exercise_count += len(workout.exercise_entries)
+        for exercise_entry in workout.exercise_entries:
+            set_entries: list[Set_Entry] = exercise_entry.set_entries
+            sets += len(set_entries)
+            exercise_sets[exercise_entry.exercise_id] = exercise_sets.get(exercise_entry.exercise_id, 0) + len(set_entries)
+
+            for set_entry in set_entries:
+                if set_entry.reps:
+                    reps += set_entry.reps
+                    if set_entry.weight:
+                        volume += set_entry.weight * set_entry.reps
+
+    return Workout_Stats(
+        workout_count=workout_count,
+        exercise_count=exercise_count,
+        sets=sets,
+        reps=reps,
+        volume=volume,
+        distributions=get_distributions_by_exercise(exercises, exercise_sets)
+    )
+
+
+def get_workout_stats(session: Session, workout: Workout, username: str = None, exercises: dict[int, Exercise] = None) -> Workout_Stats:
+    return get_stats(session, [workout], username, exercises)
+
+
+def get_stored_workout_stats(session: Session, workout: Workout, username: str = None, exercises: dict[int, Exercise] = None) -> Workout_Stats:
+    # workouts written before stats were stored at write time have no stats yet
+    if workout.stats is not None:
+        return Workout_Stats(**workout.stats)
+    return get_workout_stats(session, workout, username, exercises)
+
+
+def get_workout_filters(username: str, start_date: int = None, end_date: int = None) -> list:
+    if start_date:
+        if not is_valid_timestamp(start_date, is_date=True):
+            raise HTTPException(status_code=400, detail="Invalid start date")
+    if end_date:
+        if not is_valid_timestamp(end_date, is_date=True):
+            raise HTTPException(status_code=400, detail="Invalid end date")
+
+    filters: list = [Workout.username == username]
+    if start_date:
+        filters.append(Workout.date >= start_date)
+    if end_date:
+        filters.append(Workout.date <= end_date)
+    return filters
+
+
+def get_stats_by_date(session: Session, username: str, start_date: int = None, end_date: int = None) -> Workout_Stats:
+    """Same result as get_stats over get_user_workouts_by_date, but aggregated by the database
+    so no workout, exercise entry or set entry objects are loaded."""
+    filters: list = get_workout_filters(username, start_date, end_date)
+
+    # summed over the hot database and any archive the range reaches into
+    workout_count: int = 0
+    rows: list = []
+    for execution_options in get_workout_sources(session, username, start_date, end_date):
+        workout_count += session.exec(
+            select(func.count(Workout.id))
+            .where(*filters, *get_source_filters(execution_options)),
+            execution_options=execution_options
+        ).one()
+
+        # one row per exercise: (exercise_id, exercise entries, sets, reps, volume)
+        rows.extend(session.exec(
+            select(
+                Exercise_Entry.exercise_id,
+                func.count(func.distinct(Exercise_Entry.id)),
+                func.count(Set_Entry.id),
+                func.coalesce(func.sum(Set_Entry.reps), 0),
+                func.coalesce(func.sum(func.coalesce(Set_Entry.weight, 0) * func.coalesce(Set_Entry.reps, 0)), 0)
+            )
+            .join(Workout, Workout.id == Exercise_Entry.workout_id)
+            .outerjoin(Set_Entry, Set_Entry.exercise_entry_id == Exercise_Entry.id)
+            .where(*filters, *get_source_filters(execution_options))
+            .group_by(Exercise_Entry.exercise_id),
+            execution_options=execution_options
+        ).all())
+
+    exercise_sets: dict[int, int] = {}
+    for exercise_id,_,sets,_,_ in rows:
+        exercise_sets[exercise_id] = exercise_sets.get(exercise_id, 0) + sets
+    exercises: dict[int, Exercise] = get_exercises_by_ids(session, set(exercise_sets))
+
+    return Workout_Stats(
+        workout_count=workout_count,
+        exercise_count=sum(row[1] for row in rows),
+        sets=sum(row[2] for row in rows),
+        reps=sum(row[3] for row in rows),
+        volume=sum(row[4] for row in rows),
+        distributions=get_distributions_by_exercise(exercises, exercise_sets)
+    )
+
+
+def get_stats_series(session: Session, username: str, start_date: int = None, end_date: int = None, period: str = "week") -> list[Workout_Stats_Bucket]:
+    """Stats for every day/week/month bucket in the range that has workouts, oldest first,
+    from one aggregate pass grouped by date and exercise."""
+    filters: list = get_workout_filters(username, start_date, end_date)
+
+    # rows from the hot database and any archive the range reaches into, the buckets add them up
+    workout_counts: list = []
+    rows: list = []
+    for execution_options in get_workout_sources(session, username, start_date, end_date):
+        workout_counts.extend(session.exec(
+            select(Workout.date, func.count(Workout.id))
+            .where(*filters, *get_source_filters(execution_options))
+            .group_by(Workout.date),
+            execution_options=execution_options
+        ).all())
+
+        # one row per (date, exercise): (date, exercise_id, exercise entries, sets, reps, volume)
+        rows.extend(session.exec(
+            select(
+                Workout.date,
+                Exercise_Entry.exercise_id,
+                func.count(func.distinct(Exercise_Entry.id)),
+                func.count(Set_Entry.id),
+                func.coalesce(func.sum(Set_Entry.reps), 0),
+                func.coalesce(func.sum(func.coalesce(Set_Entry.weight, 0) * func.coalesce(Set_Entry.reps, 0)), 0)
+            )
+            .select_from(Exercise_Entry)
+            .join(Workout, Workout.id == Exercise_Entry.workout_id)
+            .outerjoin(Set_Entry, Set_Entry.exercise_entry_id == Exercise_Entry.id)
+            .where(*filters, *get_source_filters(execution_options))
+            .group_by(Workout.date, Exercise_Entry.exercise_id),
+            execution_options=execution_options
+        ).all())
+
+    exercises: dict[int, Exercise] = get_exercises_by_ids(session, {row[1] for row in rows})
+
+    buckets: dict[int, Workout_Stats_Bucket] = {}
+    bucket_exercise_sets: dict[int, dict[int, int]] = {}
+
+    def get_bucket(date: int) -> int:
+        bucket: int = get_start_of_period(period, date)
+        if bucket not in buckets:
+            buckets[bucket] = Workout_Stats_Bucket(bucket=bucket, workout_count=0, exercise_count=0, sets=0, reps=0, volume=0)
+            bucket_exercise_sets[bucket] = {}
+        return bucket
+
+    for date,workout_count in workout_counts:
+        buckets[get_bucket(date)].workout_count += workout_count
+
+    # each query sees the latest commit, a workout saved in between may only show up in the second
+    for date,exercise_id,exercise_count,sets,reps,volume in rows:
+        bucket: int = get_bucket(date)
+        buckets[bucket].exercise_count += exercise_count
+        buckets[bucket].sets += sets
+        buckets[bucket].reps += reps
+        buckets[bucket].volume += volume
+
+        exercise_sets: dict[int, int] = bucket_exercise_sets[bucket]
+        exercise_sets[exercise_id] = exercise_sets.get(exercise_id, 0) + sets
+
+    for bucket,exercise_sets in bucket_exercise_sets.items():
+        buckets[bucket].distributions = get_distributions_by_exercise(exercises, exercise_sets)
+
+    return [buckets[bucket] for bucket in sorted(buckets)]
@@ -0,0 +1,62 @@
+from fastapi import HTTPException
+from sqlmodel import Session, SQLModel, select
+from sqlalchemy import inspect, text
+
+from src.models import *
+from src.database import engine
+
+
+SYNC_KINDS: list[str] = ["workout", "template", "exercise"]
+SYNCED_TABLES: list[type[SQLModel]] = [Workout, Workout_Template, Exercise]
+
+
+def encode_sync_token(version: int) -> str:
+    return str(version)
+
+
+def decode_sync_token(token: str) -> int:
+    try:
+        version: int = int(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if version < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return version
+
+
+def add_tombstone(session: Session, username: str, kind: str, row_id: int, version: int) -> None:
+    """Records a deleted row for sync. Does not commit."""
+    # merge, sqlite can give a deleted row's id to a new row that is later deleted too
+    session.merge(Tombstone(username=username, kind=kind, row_id=row_id, version=version))
+
+
+def get_tombstone_ids(session: Session, username: str, since: int) -> dict[str, list[int]]:
+    tombstone_ids: dict[str, list[int]] = {kind: [] for kind in SYNC_KINDS}
+    rows = session.exec(
+        select(Tombstone.kind, Tombstone.row_id)
+        .where(
+            Tombstone.username == username,
+            Tombstone.version > since
+        )
+        .order_by(Tombstone.version)
+    ).all()
+    for kind,row_id in rows:
+        tombstone_ids[kind].append(row_id)
+    return tombstone_ids
+
+
+def add_sync_columns() -> None:
+    SQLModel.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        inspector = inspect(connection) # on the open connection, the writer pool has only the one
+        for table in SYNCED_TABLES:
+            columns: list[str] = [column["name"] for column in inspector.get_columns(table.__tablename__)]
+            if "modified_version" not in columns:
+                # existing rows get 0, so they are only sent by a full sync
+                connection.execute(text(f"ALTER TABLE {table.__tablename__} ADD COLUMN modified_version INTEGER NOT NULL DEFAULT 0"))
+
+    # create_all only builds indexes along with new tables
+    for index in Workout.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
@@ -137,4 +137,39 @@ def get_day_of_the_week(date: int) -> int:
 
     # 0-6, 0 = Sunday, 1 = Monday, ..., 6 = Saturday
     day_of_week: int = (year_code + month_code + century_code + date_number - leap_year_modifier) % days_in_a_week
-    return day_of_week
\ No newline at end of file
+    return day_of_week
+
+
+def to_datetime_date(date: int) -> datetime.date:
+    year, month, day = get_YYYYMMDD(date)
+    # offset from the first of the month so loosely validated days (e.g. Feb 31) still resolve
+    return datetime.date(year, month, 1) + datetime.timedelta(days=day-1)
+
+
+def from_datetime_date(date: datetime.date) -> int:
+    return int(date.strftime("%Y%m%d"))
+
+
+def get_start_of_week(date: int) -> int:
+    day_of_week: int = get_day_of_the_week(date)
+    start_of_week: datetime.date = to_datetime_date(date) - datetime.timedelta(days=day_of_week)
+    return from_datetime_date(start_of_week)
+
+
+def get_start_of_month(date: int) -> int:
+    return date - get_day(date) + 1
+
+
+def get_start_of_year(date: int) -> int:
+    return create_date(year=get_year(date), month=1, day=1)
+
+
+def get_start_of_period(period: str, date: int) -> int:
+    match period:
+        case "day": return date
+        case "week": return get_start_of_week(date)
+        case "month": return get_start_of_month(date)
+        case "year": return get_start_of_year(date)
+
+        case _:
+            raise ValueError(f"Unknown period '{period}'")
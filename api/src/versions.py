@@ -0,0 +1,57 @@
+import hashlib
+from fastapi import HTTPException, Depends, Request, Response, status
+from typing import Annotated
+from sqlmodel import Session, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.models import *
+from src.database import get_read_db
+from src.auth import get_current_active_user
+from src.time import get_date_today
+
+
+async def get_data_version(session: AsyncSession, username: str) -> int:
+    version: int = (await session.exec(
+        select(User_Data_Version.version)
+        .where(User_Data_Version.username == username)
+    )).first()
+    return version if version is not None else 0
+
+
+def bump_data_version(session: Session, username: str) -> int:
+    """Call before committing any change to a user's workouts, templates or exercises. Does not commit.
+    Returns the new version, stamp it on every changed row's modified_version.
+    The update locks the user's version row until commit, so on postgres it also serializes the user's writes:
+    call it before reading the rows a write recomputes stats, rollups or records from."""
+    version: int = session.exec(
+        update(User_Data_Version)
+        .where(User_Data_Version.username == username)
+        .values(version=User_Data_Version.version + 1)
+        .returning(User_Data_Version.version)
+    ).scalar_one()
+    return version
+
+
+def get_etag(username: str, version: int) -> str:
+    # username keeps a shared browser cache from matching another user's data,
+    # today's date expires the relative stats endpoints (this-week, ...) at midnight
+    tag: str = hashlib.sha256(f"{username}:{version}:{get_date_today()}".encode()).hexdigest()[:32]
+    return f'"{tag}"'
+
+
+async def check_etag(
+    request: Request,
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    session: Annotated[AsyncSession, Depends(get_read_db)]
+) -> None:
+    """Route dependency for user data reads: sets the ETag and answers 304 before the route runs any queries."""
+    etag: str = get_etag(current_user.username, await get_data_version(session, current_user.username))
+
+    if_none_match: str = request.headers.get("if-none-match")
+    if if_none_match:
+        tags: list[str] = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
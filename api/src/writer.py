@@ -0,0 +1,95 @@
+import asyncio
+import queue
+import threading
+from typing import Callable, TypeVar
+from sqlmodel import Session
+from sqlalchemy import Engine
+
+from src.database import engine, IS_SQLITE, POSTGRES_WRITE_POOL_SIZE
+
+
+# postgres already flushes concurrent commits together, and a batch holding several users' version rows
+# (see bump_data_version) deadlocks against another replica's batch locking them in a different order
+WRITER_MAX_BATCH = 64 if IS_SQLITE else 1 # jobs per commit
+# sqlite has one writer connection, postgres commits one job per thread side by side
+WRITER_THREADS = 1 if IS_SQLITE else POSTGRES_WRITE_POOL_SIZE
+
+T = TypeVar("T")
+
+
+def resolve_future(future: asyncio.Future, result, error: BaseException) -> None:
+    # the request may have been cancelled meanwhile (client disconnected), its write still stands
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class GroupCommitWriter:
+    """Runs write jobs on its own threads, committing every job that queued up meanwhile in one transaction,
+    so concurrent writes share a commit (and its fsync) instead of taking turns on the writer connection.
+    The jobs' statements don't wait for turns of the event loop, nor do the loop's requests wait on the jobs' python."""
+
+    def __init__(self, engine: Engine, max_batch: int = WRITER_MAX_BATCH, thread_count: int = WRITER_THREADS):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.thread_count = thread_count
+        self.jobs: queue.SimpleQueue = queue.SimpleQueue()
+        self.threads: list[threading.Thread] = []
+        self.threads_lock: threading.Lock = threading.Lock()
+
+    def submit(self, job: Callable[[Session], T]) -> "asyncio.Future[T]":
+        """Queues job(session), the future resolves once its transaction commits.
+        Jobs are sync functions given a sync session, run on a writer thread. They must not commit or roll back,
+        and should return plain values rather than rows of the writer's session.
+        An exception from one job rolls back only that job."""
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.jobs.put((job, future))
+        if not self.threads:
+            with self.threads_lock:
+                if not self.threads:
+                    self.threads = [
+                        threading.Thread(target=self.run, name=f"group-commit-writer-{i}", daemon=True)
+                        for i in range(self.thread_count)
+                    ]
+                    for thread in self.threads:
+                        thread.start()
+        return future
+
+    def run(self) -> None:
+        while True:
+            batch: list[tuple[Callable, asyncio.Future]] = [self.jobs.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            self.run_batch(batch)
+
+    def run_batch(self, batch: list[tuple[Callable, asyncio.Future]]) -> None:
+        outcomes: list[tuple[asyncio.Future, object, BaseException]] = []
+        with Session(self.engine, expire_on_commit=False) as session:
+            try:
+                for job,future in batch:
+                    try:
+                        with session.begin_nested():
+                            result = job(session)
+                        outcomes.append((future, result, None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                outcomes = [(future, None, e) for _,future in batch]
+
+        for future,result,error in outcomes:
+            # each future belongs to the event loop of the request that submitted it
+            try:
+                future.get_loop().call_soon_threadsafe(resolve_future, future, result, error)
+            except RuntimeError:
+                pass # that loop has closed, nothing awaits the future anymore
+
+
+writer: GroupCommitWriter = GroupCommitWriter(engine)
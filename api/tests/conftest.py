@@ -0,0 +1,165 @@
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Iterator
+
+import httpx
+import pytest
+from sqlalchemy import Engine, create_engine, make_url
+
+
+# run as 'pytest' from the api directory. every test using database_url runs once on a throwaway sqlite database and,
+# when TEST_POSTGRES_URL names a postgres server (e.g. 'postgresql+psycopg://postgres@localhost:5432'),
+# once more on a database created on it for the session and dropped afterwards
+TEST_POSTGRES_URL: str = os.getenv("TEST_POSTGRES_URL")
+API_DIRECTORY: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_REPLICAS = 2 # writes through both contend across processes
+SERVER_TIMEOUT_SECONDS = 60
+POLL_INTERVAL_SECONDS = 0.01
+TEST_PASSWORD = "test_password"
+SEEDED_USERS: list[str] = [
+    "crud",
+    "imports",
+    "paging",
+    "sync",
+    "concurrent_0",
+    "concurrent_1",
+    "concurrent_2",
+    "concurrent_3",
+    "stats_0",
+    "stats_1",
+    "stats_2",
+]
+
+# src.auth needs a key and src.database builds its engines when they're imported. tests that import src pass their
+# own engine or session, the module's engines stay unconnected
+os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.gettempdir()}/lifting_log_tests_unused.db"
+
+
+def get_env(database_url: str) -> dict:
+    return {**os.environ, "DATABASE_URL": database_url}
+
+
+def run_python_module(database_url: str, module: str) -> subprocess.CompletedProcess:
+    """Runs 'python -m module' from the api directory on the database, as the container and maintenance jobs do."""
+    return subprocess.run(
+        [sys.executable, "-m", module],
+        env=get_env(database_url),
+        cwd=API_DIRECTORY,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str) -> tuple[subprocess.Popen, str]:
+    """Starts the app as start_backend.sh does, returns once '/' answers 200."""
+    port: int = get_free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=get_env(database_url),
+        cwd=API_DIRECTORY
+    )
+    base_url: str = f"http://127.0.0.1:{port}"
+    start: float = time.perf_counter()
+    while True:
+        try:
+            if httpx.get(base_url).status_code == 200:
+                return server, base_url
+        except httpx.TransportError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode} before serving")
+        if time.perf_counter() - start > SERVER_TIMEOUT_SECONDS:
+            server.terminate()
+            raise RuntimeError(f"server didn't serve '/' within {SERVER_TIMEOUT_SECONDS}s")
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+@pytest.fixture(scope="session", params=["sqlite", "postgresql"])
+def database_url(request: pytest.FixtureRequest, tmp_path_factory: pytest.TempPathFactory) -> Iterator[str]:
+    """A migrated throwaway database on each backend."""
+    if request.param == "sqlite":
+        url: str = f"sqlite:///{tmp_path_factory.mktemp('sqlite')}/database.db"
+        run_python_module(url, "src.migrations")
+        yield url
+        return
+
+    if not TEST_POSTGRES_URL:
+        pytest.skip("set TEST_POSTGRES_URL to also run on postgres")
+    # the server's default database may be SQL_ASCII, which psycopg answers in bytes
+    server_engine: Engine = create_engine(TEST_POSTGRES_URL, isolation_level="AUTOCOMMIT", connect_args={"client_encoding": "utf8"})
+    database: str = f"lifting_log_test_{secrets.token_hex(4)}"
+    with server_engine.connect() as connection:
+        connection.exec_driver_sql(f"CREATE DATABASE {database} ENCODING 'UTF8' TEMPLATE template0")
+    try:
+        url: str = make_url(TEST_POSTGRES_URL).set(database=database).render_as_string(hide_password=False)
+        run_python_module(url, "src.migrations")
+        yield url
+    finally:
+        with server_engine.connect() as connection:
+            connection.exec_driver_sql(f"DROP DATABASE IF EXISTS {database} WITH (FORCE)")
+        server_engine.dispose()
+
+
+@pytest.fixture
+def run_module(database_url: str) -> Callable[[str], subprocess.CompletedProcess]:
+    """Returns run_module(module), which runs 'python -m module' on the database and fails the test if it exits non zero."""
+    return lambda module: run_python_module(database_url, module)
+
+
+@pytest.fixture(scope="session")
+def servers(database_url: str) -> Iterator[list[str]]:
+    """Base URLs of SERVER_REPLICAS servers on the database."""
+    started: list[tuple[subprocess.Popen, str]] = []
+    try:
+        for _ in range(SERVER_REPLICAS):
+            started.append(start_server(database_url))
+        yield [base_url for _,base_url in started]
+    finally:
+        for server,_ in started:
+            server.terminate()
+            server.wait()
+
+
+@pytest.fixture(scope="session")
+def users(servers: list[str]) -> dict[str, str]:
+    """Access tokens of SEEDED_USERS, signed up through the first server."""
+    tokens: dict[str, str] = {}
+    with httpx.Client(base_url=servers[0]) as client:
+        for username in SEEDED_USERS:
+            client.post("/users/", json={"username": username, "password": TEST_PASSWORD}).raise_for_status()
+            response = client.post("/users/token", data={"username": username, "password": TEST_PASSWORD})
+            response.raise_for_status()
+            tokens[username] = response.json()["access_token"]
+    return tokens
+
+
+@pytest.fixture
+def get_client(servers: list[str], users: dict[str, str]) -> Iterator[Callable[..., httpx.Client]]:
+    """Returns get_client(username, replica=0), an httpx client signed in as a seeded user."""
+    clients: list[httpx.Client] = []
+
+    def get_user_client(username: str, replica: int = 0) -> httpx.Client:
+        client: httpx.Client = httpx.Client(
+            base_url=servers[replica % len(servers)],
+            headers={"Authorization": f"Bearer {users[username]}"},
+            timeout=SERVER_TIMEOUT_SECONDS
+        )
+        clients.append(client)
+        return client
+
+    yield get_user_client
+    for client in clients:
+        client.close()
@@ -0,0 +1,91 @@
+import json
+import subprocess
+import threading
+from typing import Callable
+
+import httpx
+from sqlmodel import Session, create_engine, select
+from sqlalchemy import Engine
+
+from src.models import Stats_Rollup, Personal_Record
+
+
+CONCURRENT_USERS: list[str] = ["concurrent_0", "concurrent_1", "concurrent_2", "concurrent_3"]
+THREADS_PER_USER = 2 # on different replicas, so a user's writes contend across processes
+WRITES_PER_THREAD = 15
+
+
+def get_concurrent_workout(date: int, exercise_id: int, sets: int) -> dict:
+    return {
+        "name": "Concurrent",
+        "date": date,
+        "start_time": "10:00:00",
+        "duration": "01:00:00",
+        "exercise_entries": [{"exercise_id": exercise_id, "set_entries": [{"weight": 60.0 + 2.5 * i, "reps": 5 + i} for i in range(sets)]}]
+    }
+
+
+def get_stored_rows(database_url: str) -> set[str]:
+    engine: Engine = create_engine(database_url)
+    try:
+        with Session(engine) as session:
+            return {
+                json.dumps(row.model_dump(), sort_keys=True)
+                for model in [Stats_Rollup, Personal_Record]
+                for row in session.exec(select(model)).all()
+            }
+    finally:
+        engine.dispose()
+
+
+def test_concurrent_writes(
+    get_client: Callable[..., httpx.Client],
+    database_url: str,
+    run_module: Callable[[str], subprocess.CompletedProcess]
+) -> None:
+    """Creates, rewrites, patches and deletes workouts from several threads per user spread over the replicas,
+    then checks the stored rollups and personal records against a rebuild from the workouts."""
+    failures: list[str] = []
+    workout_counts: dict[str, int] = {username: 0 for username in CONCURRENT_USERS}
+    lock: threading.Lock = threading.Lock()
+
+    def write(client: httpx.Client, username: str, thread: int) -> None:
+        workout_ids: list[int] = []
+        for i in range(WRITES_PER_THREAD):
+            date: int = 20240101 + (i % 12) * 100 + thread
+            calls: list[tuple] = [("POST", "/workouts/me/", get_concurrent_workout(date, 1 + i % 5, 1 + i % 3))]
+            if workout_ids and i % 3 == 0:
+                calls.append(("PUT", f"/workouts/me/{workout_ids[-1]}", get_concurrent_workout(date, 1 + (i + 1) % 5, 2)))
+            if workout_ids and i % 4 == 0:
+                calls.append(("PATCH", f"/workouts/me/{workout_ids[0]}", {"date": date}))
+            if len(workout_ids) > 2 and i % 5 == 0:
+                calls.append(("DELETE", f"/workouts/me/{workout_ids.pop(1)}", None))
+            for method,path,body in calls:
+                response = client.request(method, path, json=body)
+                if response.status_code >= 300:
+                    failures.append(f"{method} {path} {response.status_code}: {response.text}")
+                elif method == "POST":
+                    workout_ids.append(response.json()["id"])
+        with lock:
+            workout_counts[username] += len(workout_ids)
+
+    threads: list[threading.Thread] = [
+        threading.Thread(target=write, args=(get_client(username, i + thread), username, thread))
+        for i,username in enumerate(CONCURRENT_USERS)
+        for thread in range(THREADS_PER_USER)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == []
+
+    for username in CONCURRENT_USERS:
+        assert get_client(username).get("/workouts/me/stats").json()["workout_count"] == workout_counts[username]
+
+    stored: set[str] = get_stored_rows(database_url)
+    run_module("src.rollups")
+    run_module("src.records")
+    rebuilt: set[str] = get_stored_rows(database_url)
+    assert sorted(stored - rebuilt) == []
+    assert sorted(rebuilt - stored) == []
@@ -0,0 +1,22 @@
+import subprocess
+from typing import Callable
+
+from sqlmodel import Session, create_engine, select
+from sqlalchemy import Engine
+
+from src.models import Schema_Migration
+from src.migrations import MIGRATIONS
+
+
+def test_migrations_are_idempotent(database_url: str, run_module: Callable[[str], subprocess.CompletedProcess]) -> None:
+    # the fixture already migrated the database, a second run must find nothing left to do
+    migrated: subprocess.CompletedProcess = run_module("src.migrations")
+    assert "Applying migration" not in migrated.stdout
+
+    engine: Engine = create_engine(database_url)
+    try:
+        with Session(engine) as session:
+            versions: list[int] = sorted(session.exec(select(Schema_Migration.version)).all())
+    finally:
+        engine.dispose()
+    assert versions == [version for version,_,_ in MIGRATIONS]
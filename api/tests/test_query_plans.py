@@ -0,0 +1,120 @@
+import re
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.models import *
+from src.schemas.workout import Workout_Create
+from src.database import get_db, get_read_db, EXERCISES
+from src.auth import get_current_active_user
+from src.exercises import resolve_exercises
+from src.routers.workouts import insert_workout
+from src.main import app
+
+
+# sqlite's plans only, postgres picks its plans from table statistics a throwaway database doesn't have
+CHECKED_ENDPOINTS: list[str] = [
+    "/workouts/me/",
+    "/workouts/me/?limit=20",
+    "/workouts/me/?limit=20&view=summary",
+    "/workouts/me/1",
+    "/workouts/me/stats?start_date=20240101&end_date=20241231",
+    "/workouts/me/stats/this-year",
+    "/workouts/me/stats/series?start_date=20240101&end_date=20241231",
+    "/workouts/me/records",
+    "/exercises/me/",
+    "/exercises/me/1/history",
+    "/exercises/defaults",
+    "/templates/me/",
+    "/templates/me/1",
+    "/sync",
+    "/sync?since=1",
+]
+# small fixed tables, scanning them is fine
+UNCHECKED_TABLES: list[str] = [Muscle.__tablename__]
+FULL_SCAN = re.compile(r"^SCAN (\w+)$") # 'SCAN t USING INDEX ...' walks an index and isn't a full table scan
+
+PLAN_USERNAME = "query_plans"
+
+
+def add_plan_data(engine: Engine) -> None:
+    with Session(engine) as session:
+        session.add(UserInDB(username=PLAN_USERNAME, hashed_password=""))
+        session.add(User_Data_Version(username=PLAN_USERNAME))
+        for exercise in EXERCISES:
+            session.add(Exercise(**exercise))
+        session.flush()
+
+        workout: Workout_Create = Workout_Create(
+            name="Plan",
+            date=20240102,
+            start_time="10:00:00",
+            duration="01:00:00",
+            exercise_entries=[{"exercise_id": 1, "set_entries": [{"weight": 100.0, "reps": 5}]}]
+        )
+        insert_workout(session, workout, PLAN_USERNAME, resolve_exercises(session, [1]))
+
+        workout_template: Workout_Template = Workout_Template(name="Plan", username=PLAN_USERNAME)
+        session.add(workout_template)
+        session.flush()
+        exercise_template: Exercise_Template = Exercise_Template(workout_template_id=workout_template.id, exercise_id=1)
+        session.add(exercise_template)
+        session.flush()
+        session.add(Set_Template(exercise_template_id=exercise_template.id, reps=5))
+        session.commit()
+
+
+@pytest.fixture(scope="module")
+def plan_engine(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Engine]:
+    """A sqlite database with the current schema and a user's workout and template, the app's routes run on it."""
+    path: Path = tmp_path_factory.mktemp("query_plans") / "database.db"
+    engine: Engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    add_plan_data(engine)
+    yield engine
+    engine.dispose()
+
+
+def get_endpoint_statements(plan_engine: Engine, endpoint: str) -> dict[str, tuple]:
+    """Requests the endpoint and returns the SELECTs it ran with their parameters."""
+    statements: dict[str, tuple] = {}
+    # unpooled, each request runs on its own event loop and a connection can't outlive it
+    async_engine: AsyncEngine = create_async_engine(f"sqlite+aiosqlite:///{plan_engine.url.database}", poolclass=NullPool)
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def capture_statement(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.setdefault(statement, parameters)
+
+    async def get_plan_db():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_plan_db
+    app.dependency_overrides[get_read_db] = get_plan_db
+    app.dependency_overrides[get_current_active_user] = lambda: User(username=PLAN_USERNAME)
+    try:
+        response = TestClient(app).get(endpoint)
+        assert response.status_code == 200, response.text
+    finally:
+        app.dependency_overrides.clear()
+    return statements
+
+
+@pytest.mark.parametrize("endpoint", CHECKED_ENDPOINTS)
+def test_no_full_table_scans(plan_engine: Engine, endpoint: str) -> None:
+    full_scans: list[str] = []
+    with plan_engine.connect() as connection:
+        for statement,parameters in get_endpoint_statements(plan_engine, endpoint).items():
+            for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all():
+                match = FULL_SCAN.match(row.detail)
+                if match and match.group(1) not in UNCHECKED_TABLES:
+                    full_scans.append(f"{row.detail}: {' '.join(statement.split())}")
+    assert full_scans == []
@@ -0,0 +1,89 @@
+import math
+import random
+from typing import Iterator, Optional
+
+import pytest
+from sqlmodel import Session, create_engine
+from sqlalchemy import Engine
+
+from src.models import Exercise
+from src.schemas.workout import Workout_Create
+from src.database import EXERCISES
+from src.exercises import resolve_exercises
+from src.stats import get_stats, get_stats_by_date
+from src.routers.workouts import insert_workout, get_user_workouts_by_date
+
+
+# get_stats_by_date aggregates in SQL, get_stats over the same workouts loaded into memory must agree with it
+# on random histories and open, half open, closed and empty date ranges
+STATS_USERS: list[str] = ["stats_0", "stats_1", "stats_2"]
+WORKOUTS_PER_USER = 150
+RANGES_PER_USER = 20
+SEED = 3
+
+
+def get_random_date(rng: random.Random) -> int:
+    return rng.randint(2022, 2025) * 10000 + rng.randint(1, 12) * 100 + rng.randint(1, 28)
+
+
+def get_random_workout(rng: random.Random, exercises: dict[int, Exercise]) -> Workout_Create:
+    exercise_entries: list[dict] = []
+    for exercise_id in rng.sample(list(exercises), rng.randint(1, 6)):
+        exercise: Exercise = exercises[exercise_id]
+        exercise_entries.append({
+            "exercise_id": exercise_id,
+            "set_entries": [
+                {
+                    # multiples of 2.5 add up exactly in both SQL and python floats
+                    "weight": rng.randint(0, 80) * 2.5 if exercise.weight else None,
+                    "reps": rng.randint(1, 15) if exercise.reps else None,
+                    "time": f"00:0{rng.randint(0, 9)}:{rng.randint(10, 59)}" if exercise.time else None
+                }
+                for _ in range(rng.randint(1, 6))
+            ]
+        })
+    return Workout_Create(
+        name="Stats",
+        date=get_random_date(rng),
+        start_time="10:00:00",
+        duration="01:00:00",
+        exercise_entries=exercise_entries
+    )
+
+
+def get_random_range(rng: random.Random) -> tuple[Optional[int], Optional[int]]:
+    start_date: int = get_random_date(rng)
+    end_date: int = get_random_date(rng)
+    return rng.choice([
+        (None, None),
+        (start_date, None),
+        (None, end_date),
+        (min(start_date, end_date), max(start_date, end_date)),
+        (start_date, start_date),
+        (max(start_date, end_date), min(start_date, end_date)) # empty
+    ])
+
+
+@pytest.fixture
+def session(database_url: str, users: dict[str, str]) -> Iterator[Session]:
+    """Session on the shared database, whose seeded users get the random histories."""
+    engine: Engine = create_engine(database_url)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.mark.parametrize("username", STATS_USERS)
+def test_stats_by_date_match_stats(session: Session, username: str) -> None:
+    rng: random.Random = random.Random(f"{SEED}:{username}")
+    exercises: dict[int, Exercise] = resolve_exercises(session, set(range(1, len(EXERCISES) + 1)))
+    for _ in range(WORKOUTS_PER_USER):
+        insert_workout(session, get_random_workout(rng, exercises), username, exercises)
+    session.commit()
+
+    for start_date,end_date in [get_random_range(rng) for _ in range(RANGES_PER_USER)]:
+        sql_stats: dict = get_stats_by_date(session, username, start_date=start_date, end_date=end_date).model_dump()
+        workouts = get_user_workouts_by_date(session, username, start_date, end_date)
+        python_stats: dict = get_stats(session, workouts, username, exercises).model_dump()
+        assert math.isclose(sql_stats.pop("volume"), python_stats.pop("volume")), (start_date, end_date)
+        assert sql_stats == python_stats, (start_date, end_date)
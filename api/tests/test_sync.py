@@ -0,0 +1,68 @@
+from typing import Callable
+
+import httpx
+
+
+CUSTOM_EXERCISE: dict = {"name": "Test Curl", "primary_muscles": ["Biceps"], "secondary_muscles": ["Forearms"], "weight": True, "reps": True, "time": False}
+
+
+def get_sync_workout(date: int, exercise_id: int) -> dict:
+    return {
+        "name": "Sync",
+        "date": date,
+        "start_time": "10:00:00",
+        "duration": "01:00:00",
+        "exercise_entries": [{"exercise_id": exercise_id, "set_entries": [{"weight": 20.0, "reps": 10}]}]
+    }
+
+
+def test_sync(get_client: Callable[..., httpx.Client]) -> None:
+    client: httpx.Client = get_client("sync")
+    exercise_id: int = client.post("/exercises/me/", json=CUSTOM_EXERCISE).json()["id"]
+    kept_id: int = client.post("/workouts/me/", json=get_sync_workout(20240101, exercise_id)).json()["id"]
+    deleted_id: int = client.post("/workouts/me/", json=get_sync_workout(20240102, 1)).json()["id"]
+    template_id: int = client.post("/templates/me/", json={
+        "name": "Sync", "exercise_templates": [{"exercise_id": 1, "set_templates": [{"reps": 5}, {"rep_range_start": 8, "rep_range_end": 12}]}]
+    }).json()["id"]
+
+    full: dict = client.get("/sync").json()
+    assert full["full"]
+    assert [workout["id"] for workout in full["workouts"]] == [kept_id, deleted_id]
+    assert [template["id"] for template in full["templates"]] == [template_id]
+    assert [exercise["id"] for exercise in full["exercises"]] == [exercise_id]
+
+    assert client.get("/sync", params={"since": full["token"]}).json()["workouts"] == []
+    client.patch(f"/workouts/me/{kept_id}", json={"name": "Renamed"}).raise_for_status()
+    assert client.delete(f"/workouts/me/{deleted_id}").status_code == 204
+    assert client.delete(f"/templates/me/{template_id}").status_code == 204
+
+    changes: dict = client.get("/sync", params={"since": full["token"]}).json()
+    assert not changes["full"]
+    assert [(workout["id"], workout["name"]) for workout in changes["workouts"]] == [(kept_id, "Renamed")]
+    assert changes["deleted_workout_ids"] == [deleted_id]
+    assert changes["deleted_template_ids"] == [template_id]
+    assert client.get("/sync", params={"since": "-1"}).status_code == 400
+
+
+def test_exercise_history(get_client: Callable[..., httpx.Client]) -> None:
+    client: httpx.Client = get_client("sync")
+    exercise_id: int = client.post("/exercises/me/", json={**CUSTOM_EXERCISE, "name": "History Curl"}).json()["id"]
+    workout_ids: list[int] = [
+        client.post("/workouts/me/", json=get_sync_workout(20240201 + i, exercise_id)).json()["id"]
+        for i in range(5)
+    ]
+
+    entries: list[dict] = []
+    cursor: str = None
+    while True:
+        response: httpx.Response = client.get(f"/exercises/me/{exercise_id}/history", params={"limit": 2} | ({"cursor": cursor} if cursor else {}))
+        entries.extend(response.json()["exercise_entries"])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [entry["workout_id"] for entry in entries] == workout_ids[::-1]
+
+    # the workouts keep their entries of a deleted exercise
+    assert client.delete(f"/exercises/me/{exercise_id}").status_code == 204
+    assert client.get(f"/exercises/me/{exercise_id}").status_code == 404
+    assert client.get(f"/workouts/me/{workout_ids[0]}").json()["exercise_entries"][0]["exercise_name"] == "History Curl"
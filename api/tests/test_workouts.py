@@ -0,0 +1,107 @@
+import json
+from typing import Callable
+
+import httpx
+
+
+def get_test_workout(date: int, exercise_id: int, sets: int, weight: float = 60.0) -> dict:
+    return {
+        "name": f"Test {date}",
+        "date": date,
+        "start_time": "10:00:00",
+        "duration": "01:00:00",
+        "exercise_entries": [
+            {"exercise_id": exercise_id, "set_entries": [{"weight": weight + 2.5 * i, "reps": 5 + i} for i in range(sets)]},
+            {"exercise_id": 26, "set_entries": [{"time": "00:01:00"}]} # planks, time only
+        ]
+    }
+
+
+def get_volume(workout: dict) -> float:
+    return sum(
+        set_entry["weight"] * set_entry["reps"]
+        for exercise_entry in workout["exercise_entries"]
+        for set_entry in exercise_entry["set_entries"]
+        if set_entry.get("weight") and set_entry.get("reps")
+    )
+
+
+def test_create_update_delete(get_client: Callable[..., httpx.Client]) -> None:
+    client: httpx.Client = get_client("crud")
+    created = client.post("/workouts/me/", json=get_test_workout(20240105, 1, 3))
+    assert created.status_code == 201
+    workout: dict = created.json()
+    assert [len(entry["set_entries"]) for entry in workout["exercise_entries"]] == [3, 1]
+    assert client.get(f"/workouts/me/{workout['id']}").json() == workout
+
+    replaced = client.put(f"/workouts/me/{workout['id']}", json=get_test_workout(20240105, 5, 4, 80.0))
+    assert replaced.status_code == 200
+    assert replaced.json()["exercise_entries"][0]["exercise_id"] == 5
+
+    patched = client.patch(f"/workouts/me/{workout['id']}", json={"name": "Patched", "date": 20240320})
+    assert patched.status_code == 200
+    assert (patched.json()["name"], patched.json()["date"]) == ("Patched", 20240320)
+
+    stats: dict = client.get("/workouts/me/stats").json()
+    assert (stats["workout_count"], stats["exercise_count"], stats["sets"]) == (1, 2, 5)
+    assert stats["volume"] == get_volume(get_test_workout(20240105, 5, 4, 80.0))
+    assert client.get("/workouts/me/stats?start_date=20240101&end_date=20240131").json()["workout_count"] == 0
+    assert client.get("/workouts/me/records").json()[0]["weight"] == 87.5
+
+    assert client.delete(f"/workouts/me/{workout['id']}").status_code == 204
+    assert client.get(f"/workouts/me/{workout['id']}").status_code == 404
+    assert client.get("/workouts/me/stats").json()["workout_count"] == 0
+    assert client.get("/workouts/me/records").json() == []
+
+
+def test_import(get_client: Callable[..., httpx.Client]) -> None:
+    client: httpx.Client = get_client("imports")
+    workouts: list[dict] = [get_test_workout(20230101 + (i % 12) * 100 + i % 28, 1 + i % 5, 1 + i % 4) for i in range(40)]
+    lines: list[str] = [json.dumps(workout) for workout in workouts] + [json.dumps(get_test_workout(20230101, 999999, 1))]
+    imported = client.post("/workouts/me/import", content="\n".join(lines), headers={"Content-Type": "application/x-ndjson"})
+    assert imported.status_code == 200
+    result: dict = imported.json()
+    assert result["accepted"] == 40
+    assert result["accepted_sets"] == sum(1 + i % 4 + 1 for i in range(40))
+    assert [rejection["row"] for rejection in result["rejected"]] == [41]
+
+    stats: dict = client.get("/workouts/me/stats").json()
+    assert stats["workout_count"] == 40
+    assert stats["volume"] == sum(get_volume(workout) for workout in workouts)
+    series: list[dict] = client.get("/workouts/me/stats/series?start_date=20230101&end_date=20231231&bucket=month").json()
+    assert [bucket["workout_count"] for bucket in series if bucket["workout_count"]] == [4] * 4 + [3] * 8
+
+    exported: list[str] = client.get("/workouts/me/export").text.splitlines()
+    assert len(exported) == 40
+    assert [json.loads(line)["date"] for line in exported] == sorted(workout["date"] for workout in workouts)
+
+
+def test_paging(get_client: Callable[..., httpx.Client]) -> None:
+    client: httpx.Client = get_client("paging")
+    # every date twice, so pages break between workouts on the same day
+    workouts: list[dict] = [get_test_workout(20240101 + i // 2, 1, 1) for i in range(25)]
+    client.post("/workouts/me/import", json=workouts).raise_for_status()
+    everything: list[dict] = client.get("/workouts/me/").json()
+    newest_first: list[int] = [workout["id"] for workout in sorted(everything, key=lambda workout: (workout["date"], workout["id"]), reverse=True)]
+
+    for view in ["full", "summary"]:
+        ids: list[int] = []
+        cursor: str = None
+        while True:
+            params: dict = {"limit": 7, "view": view} | ({"cursor": cursor} if cursor else {})
+            response = client.get("/workouts/me/", params=params)
+            assert response.status_code == 200
+            ids.extend(workout["id"] for workout in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert ids == newest_first
+
+
+def test_etag(get_client: Callable[..., httpx.Client]) -> None:
+    client: httpx.Client = get_client("paging")
+    etag: str = client.get("/workouts/me/stats").headers["ETag"]
+    assert client.get("/workouts/me/stats", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/workouts/me/", json=get_test_workout(20240601, 1, 1)).raise_for_status()
+    assert client.get("/workouts/me/stats", headers={"If-None-Match": etag}).status_code == 200